@@ -0,0 +1,835 @@
+import argparse
+import json
+import os
+import re
+
+import structure
+from file_index import ROOT, source_files
+from regex_rules import apply_bundle
+from ts_literals import mask_literals
+
+# Inventory of the admin panel API routes the apps call, and where those calls
+# are likely to cost more requests than they need.
+#
+# Every fetch call site in the customer, partner and admin sources is matched
+# to its route file under admin panel/app/api (static segments before [param]
+# before [...catch-all], as Next.js resolves them). URLs are read the same way
+# the API_URL rules write them: `${API_URL}/api/...`, a leftover
+# http://localhost:3000 base, or a relative /api/... in the admin panel; a URL
+# held in a variable is followed to its last assignment before the call. Each
+# source first goes through the regex packs of fix_fetch_quotes.py and
+# replace_api_properly.py (URL_PACKS), so a URL the migration left quoted as
+# '${API_URL}/api/...' or with mismatched quotes is read as those rules will
+# write it, and the two cannot drift apart.
+#
+# Each call site also gets a trigger, found by walking out through the
+# functions around it (and through the calls of a local function that wraps
+# the fetch): mount (an effect with []), effect (an effect with dependencies),
+# render (a component or hook body, or an effect with no dependency list),
+# event, poll (setInterval), or call when nothing says. The report flags:
+#
+#   loop      a fetch run once per item of a for/while loop or .map/.forEach
+#   render    a fetch run on every render of a component
+#   repeated  one GET route loaded more than once while a page comes up, from
+#             the page, its layouts and the components they import
+#   poll      a route fetched on a timer
+#   missing   a call to a route file that does not export the method
+
+API_ROOT = 'admin panel/app/api'
+
+# Sources of each app and where its '@/' imports point
+APPS = {
+    'customer': ('customer/src', 'customer/src'),
+    'partner': ('partner/src', 'partner/src'),
+    'admin': ('admin panel/app', 'admin panel'),
+}
+
+FETCHERS = ('fetch', 'fetchWithTimeout', 'fastFetch')
+LOOP_METHODS = ('map', 'forEach', 'flatMap', 'filter', 'reduce', 'some', 'every', 'find', 'findIndex')
+EFFECTS = ('useEffect', 'useLayoutEffect')
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS')
+LOAD_TRIGGERS = ('mount', 'render', 'effect')
+RESOLVE_EXTENSIONS = ('.tsx', '.ts', '.jsx', '.js')
+# An expression goes on past a line break that one of these ends or starts
+CONTINUES = set('=+-*/%?:|&,.<>(!')
+KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with', 'else'}
+
+CALL = re.compile(r'(?<![\w$.])(' + '|'.join(FETCHERS) + r')\s*\(')
+ARROW = re.compile(r'=>')
+FUNCTION = re.compile(r'\bfunction\b\s*\*?\s*([\w$]*)\s*(?:<[^>(]*>)?\s*\(')
+METHOD_SHORTHAND = re.compile(r'(?m)^[ \t]*(?:(?:public|private|protected|static|async|readonly)\s+)*([\w$]+)\s*\(')
+LOOP = re.compile(r'\b(for|while)\s*\(|\bdo\s*\{')
+ROUTE_EXPORT = re.compile(r'export\s+(?:async\s+)?function\s+(' + '|'.join(METHODS) + r')\b'
+                          r'|export\s+const\s+(' + '|'.join(METHODS) + r')\b')
+IMPORT = re.compile(r'''\bfrom\s*['"]([^'"]+)['"]|\bimport\s*\(\s*['"]([^'"]+)['"]\s*\)|\bimport\s+['"]([^'"]+)['"]''')
+METHOD_OPTION = re.compile(r'''\bmethod\s*:\s*['"`](\w+)['"`]''')
+LOCAL_BASE = re.compile(r'^https?://(?:localhost|127\.0\.0\.1)(?::\d+)?$')
+
+# A type annotation on a declaration, kept to one line so it cannot run into
+# the statements before it
+ANNOTATION = r'[^=;(){}\n]*'
+
+# The regex_rules packs that write `${API_URL}/...` URLs (replace_api_properly.py,
+# fix_fetch_quotes.py), run over each source before it is read
+URL_PACKS = ('replace_api_properly', 'fix_fetch_quotes')
+
+# Stands for an interpolated expression in a URL
+PARAM = '\0'
+
+
+def normalize_urls(filepath, content):
+    # The text as the API_URL rules would leave it, so a URL they repair is read
+    # the way they will write it; they keep every line where it was. A rewrite
+    # the structure check would roll back is not used, as it would not be written
+    fixed = content
+    for pack in URL_PACKS:
+        fixed = apply_bundle(fixed, pack)
+    if fixed != content and structure.regression(filepath, content, fixed) is not None:
+        return content
+    return fixed
+
+
+def line_of(content, offset):
+    return content.count('\n', 0, offset) + 1
+
+
+class Source:
+    # One parsed file: the masked text, its brackets and its functions
+    def __init__(self, path, content):
+        self.path = path
+        self.content = content
+        self.mask = mask_literals(content, path.endswith(('x', '.js')))
+        self.pairs = {}
+        self.openers = {}
+        stack = []
+        for i, ch in enumerate(self.mask):
+            if ch in '([{':
+                stack.append(i)
+            elif ch in ')]}' and stack:
+                j = stack.pop()
+                self.pairs[j] = i
+                self.openers[i] = j
+        self.functions = sorted(self._functions(), key=lambda f: f.body[0])
+        self.loops = list(self._loops())
+
+    def _skip_space(self, i, step=1):
+        mask = self.mask
+        while 0 <= i < len(mask) and mask[i].isspace():
+            i += step
+        return i
+
+    def _expression_end(self, i):
+        # End of the expression starting at i: the first comma, semicolon or
+        # closer at its own nesting level, or a line break that ends the
+        # statement (much of this code leaves semicolons out)
+        mask = self.mask
+        start = i
+        while i < len(mask):
+            ch = mask[i]
+            if ch in '([{' and i in self.pairs:
+                i = self.pairs[i] + 1
+                continue
+            if ch in ',;)]}':
+                return i
+            if ch == '\n' and mask[start:i].strip():
+                last = mask[start:i].rstrip()[-1]
+                following = mask[i:].lstrip()[:1]
+                if last not in CONTINUES and following not in CONTINUES:
+                    return i
+            i += 1
+        return i
+
+    def _body(self, i):
+        # (start, end) of the function body starting at or after i
+        i = self._skip_space(i)
+        if i < len(self.mask) and self.mask[i] == '{' and i in self.pairs:
+            return i, self.pairs[i]
+        return i, self._expression_end(i)
+
+    def _functions(self):
+        mask = self.mask
+        for m in ARROW.finditer(mask):
+            p = self._skip_space(m.start() - 1, -1)
+            if p < 0:
+                continue
+            if mask[p] == ')' and p in self.openers:
+                start = self.openers[p]
+            elif mask[p] in '$_' or mask[p].isalnum():
+                start = p
+                while start > 0 and (mask[start - 1] in '$_' or mask[start - 1].isalnum()):
+                    start -= 1
+            else:
+                # A return type between the parameters and the arrow
+                close = mask.rfind(')', 0, p)
+                if close == -1 or close not in self.openers or not mask[close + 1:p].lstrip().startswith(':'):
+                    continue
+                start = self.openers[close]
+            before = mask[max(0, start - 6):start]
+            if before.rstrip().endswith('async'):
+                start = mask.rfind('async', 0, start)
+            yield Function(self, start, self._body(m.end()), None)
+
+        for m in FUNCTION.finditer(mask):
+            paren = m.end() - 1
+            if paren not in self.pairs:
+                continue
+            brace = mask.find('{', self.pairs[paren])
+            if brace == -1 or brace not in self.pairs:
+                continue
+            start = m.start()
+            if mask[max(0, start - 6):start].rstrip().endswith('async'):
+                start = mask.rfind('async', 0, start)
+            yield Function(self, start, (brace, self.pairs[brace]), m.group(1) or None)
+
+        for m in METHOD_SHORTHAND.finditer(mask):
+            name = m.group(1)
+            paren = m.end() - 1
+            if name in KEYWORDS or paren not in self.pairs:
+                continue
+            after = self._skip_space(self.pairs[paren] + 1)
+            if after < len(mask) and mask[after] == ':':
+                after = mask.find('{', after)
+            if after == -1 or after >= len(mask) or mask[after] != '{' or after not in self.pairs:
+                continue
+            yield Function(self, m.start(1), (after, self.pairs[after]), name)
+
+    def _loops(self):
+        mask = self.mask
+        for m in LOOP.finditer(mask):
+            if m.group(1):
+                paren = m.end() - 1
+                if paren not in self.pairs:
+                    continue
+                start, end = self._body(self.pairs[paren] + 1)
+            else:
+                start = m.end() - 1
+                end = self.pairs.get(start, start)
+            yield m.group(1) or 'do', m.start(), end
+
+    def enclosing_open(self, i):
+        # The innermost bracket opened before i and still open at i
+        depth = 0
+        mask = self.mask
+        i -= 1
+        while i >= 0:
+            ch = mask[i]
+            if ch in ')]}':
+                depth += 1
+            elif ch in '([{':
+                if depth == 0:
+                    return i
+                depth -= 1
+            i -= 1
+        return None
+
+    def callee(self, paren):
+        # (name, is_method) of the call whose argument list opens at paren
+        base = max(0, paren - 80)
+        m = re.search(r'([\w$]+)\s*(?:<[^<>()]*>)?\s*$', self.mask[base:paren])
+        if not m:
+            return None, False
+        start = base + m.start(1)
+        return m.group(1), self.mask[max(0, start - 20):start].rstrip().endswith('.')
+
+    def chain(self, i):
+        # Functions around offset i, innermost first
+        return [f for f in reversed(self.functions) if f.body[0] <= i <= f.body[1]]
+
+    def in_loop(self, i):
+        # The loop that runs offset i once per item, or None; a function
+        # between the two (an event handler in a .map) breaks the link
+        chain = self.chain(i)
+        inner = chain[0] if chain else None
+        for kind, start, end in self.loops:
+            if start < i <= end and (inner is None or inner.body[0] < start):
+                return kind
+        if inner is not None and inner.context[0] == 'call' and inner.context[2] and inner.context[1] in LOOP_METHODS:
+            return f'.{inner.context[1]}'
+        return None
+
+    def effect_deps(self, paren):
+        # The dependency list of the effect whose call opens at paren: None when
+        # there is none, else its text
+        close = self.pairs.get(paren)
+        if close is None:
+            return None
+        inside = self.mask[paren + 1:close]
+        depth = 0
+        for k, ch in enumerate(inside):
+            if ch in '([{':
+                depth += 1
+            elif ch in ')]}':
+                depth -= 1
+            elif ch == ',' and depth == 0:
+                deps = self.content[paren + 2 + k:close].strip().rstrip(',').strip()
+                return deps or None
+        return None
+
+    def interval(self, paren):
+        close = self.pairs.get(paren)
+        if close is None:
+            return None
+        m = re.search(r',\s*([\d_]+)\s*$', self.content[paren:close])
+        return int(m.group(1).replace('_', '')) if m else None
+
+
+class Function:
+    def __init__(self, source, start, body, name):
+        self.source = source
+        self.start = start
+        self.body = body
+        self.name = name
+        self.context = self._context()
+
+    def _context(self):
+        # What runs this function: ('name', name), ('call', callee, is_method,
+        # paren), ('attr', name), ('prop', name) or ('other',)
+        if self.name:
+            return ('name', self.name)
+        source = self.source
+        mask = source.mask
+        p = source._skip_space(self.start - 1, -1)
+        if p < 0:
+            return ('other',)
+        ch = mask[p]
+        if ch == '=' and mask[p - 1:p] not in ('=', '!', '<', '>'):
+            m = re.search(r'([\w$]+)\s*(?::' + ANNOTATION + r')?$', mask[max(0, p - 120):p])
+            if m:
+                return ('name', m.group(1))
+        if ch == ':':
+            m = re.search(r'([\w$]+)\s*$', mask[max(0, p - 60):p])
+            if m:
+                return ('prop', m.group(1))
+        if ch == '{':
+            m = re.search(r'([\w$-]+)=$', mask[max(0, p - 60):p])
+            if m:
+                return ('attr', m.group(1))
+        if ch in '(,':
+            paren = source.enclosing_open(self.start)
+            if paren is not None and mask[paren] == '(':
+                name, is_method = source.callee(paren)
+                if name:
+                    return ('call', name, is_method, paren)
+        return ('other',)
+
+    @property
+    def is_component(self):
+        # Components and hooks run their body on every render
+        name = self.context[1] if self.context[0] == 'name' else None
+        if not name or name in METHODS:
+            # GET, POST, ... are route handlers
+            return False
+        return name[0].isupper() or re.match(r'use[A-Z]', name) is not None
+
+
+class Route:
+    def __init__(self, path, methods):
+        self.path = path
+        self.methods = methods
+        self.segments = path.split('/')[1:]
+
+    @property
+    def url(self):
+        return '/' + '/'.join(self.segments)
+
+    def match(self, segments):
+        # A rank to compare matching routes by (higher is more specific), or None
+        return _match(self.segments, segments)
+
+
+def _match(pattern, segments):
+    if not pattern:
+        return () if not segments else None
+    head = pattern[0]
+    if head.startswith('[[...'):
+        options = [_match(pattern[1:], segments[k:]) for k in range(len(segments) + 1)]
+        ranks = [(0,) + rank for rank in options if rank is not None]
+        return max(ranks) if ranks else None
+    if not segments:
+        return None
+    if head.startswith('[...'):
+        options = [_match(pattern[1:], segments[k:]) for k in range(1, len(segments) + 1)]
+        ranks = [(1,) + rank for rank in options if rank is not None]
+        return max(ranks) if ranks else None
+    if head.startswith('['):
+        rest = _match(pattern[1:], segments[1:])
+        return None if rest is None else (2,) + rest
+    if PARAM in segments[0] or head != segments[0]:
+        return None
+    rest = _match(pattern[1:], segments[1:])
+    return None if rest is None else (3,) + rest
+
+
+def load_routes(api_root=API_ROOT):
+    routes = []
+    base = os.path.dirname(api_root)
+    for filepath in source_files(api_root):
+        if os.path.basename(filepath) not in ('route.ts', 'route.js'):
+            continue
+        parts = os.path.relpath(os.path.dirname(filepath), base).replace(os.sep, '/').split('/')
+        # Route groups, (name), do not appear in the URL
+        path = '/' + '/'.join(part for part in parts if not (part.startswith('(') and part.endswith(')')))
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+        methods = sorted({a or b for a, b in ROUTE_EXPORT.findall(mask_literals(content, False))})
+        routes.append(Route(path, methods))
+    return routes
+
+
+def find_route(routes, segments):
+    best = None
+    for route in routes:
+        rank = route.match(segments)
+        if rank is not None and (best is None or rank > best[0]):
+            best = (rank, route)
+    return best[1] if best else None
+
+
+def _template_url(source, start, end):
+    # The template literal content[start:end] (backticks included) with each
+    # ${...} replaced by PARAM
+    content = source.content
+    parts = []
+    i = start + 1
+    while i < end - 1:
+        if content.startswith('${', i) and i + 1 in source.pairs:
+            parts.append(PARAM)
+            i = source.pairs[i + 1] + 1
+            continue
+        parts.append(content[i])
+        i += 1
+    return ''.join(parts)
+
+
+def _strip(content, start, end):
+    while start < end and content[start].isspace():
+        start += 1
+    while end > start and content[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _url_value(source, start, end):
+    # The URL an expression evaluates to, with PARAM for the parts only known
+    # at run time, or None when it is not built from literals
+    start, end = _strip(source.content, start, end)
+    if start == end:
+        return None
+    parts = []
+    depth = 0
+    piece = start
+    mask = source.mask
+    for k in range(start, end):
+        ch = mask[k]
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif ch == '+' and depth == 0:
+            parts.append((piece, k))
+            piece = k + 1
+    parts.append((piece, end))
+
+    url = []
+    literal = False
+    for a, b in parts:
+        a, b = _strip(source.content, a, b)
+        piece = source.content[a:b]
+        if piece[:1] == '`' and piece[-1:] == '`':
+            url.append(_template_url(source, a, b))
+            literal = True
+        elif piece[:1] in '\'"' and piece[-1:] == piece[:1] and len(piece) > 1:
+            url.append(piece[1:-1])
+            literal = True
+        else:
+            url.append(PARAM)
+    return ''.join(url) if literal else None
+
+
+def _assigned_url(source, name, before):
+    # Follows a URL held in a variable to its last assignment before offset before
+    mask = source.mask
+    found = None
+    for m in re.finditer(r'(?<![\w$.])' + re.escape(name) + r'\s*(?::' + ANNOTATION + r')?=(?![=>])', mask[:before]):
+        found = m
+    if found is None:
+        return None
+    start = found.end()
+    end = source._expression_end(start)
+    # A conditional assignment gives its branches; the first that names a route is used
+    text = source.mask[start:end]
+    if '?' in text and ':' in text:
+        q = start + text.index('?')
+        c = start + text.rindex(':')
+        for a, b in ((q + 1, c), (c + 1, end)):
+            url = _url_value(source, a, b)
+            if url and '/api/' in url:
+                return url
+    return _url_value(source, start, end)
+
+
+def split_url(url):
+    # ('api', segments) for one of our routes, ('external', url) for another
+    # host, or ('unresolved', url)
+    at = url.find('/api/')
+    if at == -1:
+        if url.startswith('http'):
+            return 'external', url
+        return 'unresolved', url
+    base = url[:at]
+    if base and base.strip(PARAM) and not LOCAL_BASE.match(base):
+        return ('external' if '://' in base else 'unresolved'), url
+    path = re.split(r'[?#]', url[at:], 1)[0]
+    return 'api', [segment for segment in path.split('/')[1:] if segment != '']
+
+
+def display(url):
+    return url.replace(PARAM, '${…}')
+
+
+class CallSite:
+    def __init__(self, app, source, offset, method, url):
+        self.app = app
+        self.path = source.path
+        self.source = source
+        self.offset = offset
+        self.line = line_of(source.content, offset)
+        self.method = method
+        self.url = url
+        self.kind, self.detail = ('unresolved', None) if url is None else split_url(url)
+        self.route = None
+        self.triggers = set()
+        self.loop = None
+        self.smells = []
+
+    @property
+    def where(self):
+        return f'{self.path}:{self.line}'
+
+    def to_json(self):
+        return {
+            'app': self.app,
+            'file': self.path,
+            'line': self.line,
+            'method': self.method,
+            'url': display(self.url) if self.url else None,
+            'kind': self.kind,
+            'route': self.route.path if self.route else None,
+            'triggers': sorted(self.triggers),
+            'smells': self.smells,
+        }
+
+
+def _call_trigger(source, callee, paren):
+    # The trigger of a function handed to callee, or None when callee says nothing
+    if callee in EFFECTS:
+        deps = source.effect_deps(paren)
+        if deps is None:
+            return 'render'
+        return 'mount' if re.fullmatch(r'\[\s*\]', deps) else f'effect {deps}'
+    if callee == 'setInterval':
+        ms = source.interval(paren)
+        return f'poll {ms / 1000:g}s' if ms else 'poll'
+    if callee == 'addEventListener':
+        return 'event'
+    return None
+
+
+def _triggers(source, offset, seen, depth=0):
+    # How often the code at offset runs; returns (triggers, loop kind or None)
+    loop = source.in_loop(offset)
+    for f in source.chain(offset):
+        context = f.context
+        kind = context[0]
+        if kind == 'call':
+            trigger = _call_trigger(source, context[1], context[3])
+            if trigger is not None:
+                return {trigger}, loop
+        elif kind in ('attr', 'prop') and context[1].startswith('on'):
+            return {'event'}, loop
+        elif kind in ('prop', 'other'):
+            # Only defined here (a method of a returned object, a returned
+            # callback); it runs when something calls it
+            return {'call'}, loop
+        elif kind == 'name':
+            if f.is_component:
+                return {'render'}, loop
+            return _callers(source, f, seen, depth, loop)
+    return {'module'}, loop
+
+
+def _callers(source, function, seen, depth, loop):
+    # Triggers of a named local function, from the places it is called or passed
+    name = function.context[1]
+    if depth >= 4 or (source.path, name) in seen:
+        return {'call'}, loop
+    seen = seen | {(source.path, name)}
+    triggers = set()
+    for m in re.finditer(r'(?:(?<=this\.)|(?<![\w$.]))' + re.escape(name) + r'(?![\w$])', source.mask):
+        if function.start <= m.start() <= function.body[1]:
+            continue
+        after = source._skip_space(m.end())
+        if after < len(source.mask) and source.mask[after] in '=:' and source.mask[after:after + 2] not in ('==', '=>'):
+            # Another declaration or a property key, not a use
+            continue
+        if re.search(r'\bon\w*=\{\s*$', source.mask[max(0, m.start() - 60):m.start()]):
+            triggers.add('event')
+            continue
+        paren = source.enclosing_open(m.start())
+        if paren is not None and source.mask[paren] == '(' and source.mask[source._skip_space(m.end())] in ',)':
+            # Passed by name: setInterval(load, 5000), addEventListener('x', handler)
+            trigger = _call_trigger(source, source.callee(paren)[0], paren)
+            if trigger is not None:
+                triggers.add(trigger)
+                continue
+        found, inner_loop = _triggers(source, m.start(), seen, depth + 1)
+        triggers |= found
+        loop = loop or inner_loop
+    if len(triggers) > 1:
+        triggers.discard('call')
+    return (triggers or {'call'}), loop
+
+
+def call_sites(app, source):
+    sites = []
+    content = source.content
+    for m in CALL.finditer(source.mask):
+        paren = m.end() - 1
+        close = source.pairs.get(paren)
+        if close is None:
+            continue
+        first_end = source._expression_end(paren + 1)
+        url = _url_value(source, paren + 1, first_end)
+        if url is None:
+            name = content[paren + 1:first_end].strip()
+            if re.fullmatch(r'[\w$]+', name):
+                url = _assigned_url(source, name, m.start())
+        options = content[first_end:close]
+        method = 'GET'
+        found = METHOD_OPTION.search(options)
+        if found:
+            method = found.group(1).upper()
+        elif re.search(r'\bmethod\b', options):
+            method = '?'
+        site = CallSite(app, source, m.start(), method, url)
+        site.triggers, site.loop = _triggers(source, m.start(), frozenset())
+        sites.append(site)
+    return sites
+
+
+def resolve_import(spec, importer, alias_root):
+    if spec.startswith('@/'):
+        base = os.path.join(alias_root, spec[2:])
+    elif spec.startswith('.'):
+        base = os.path.normpath(os.path.join(os.path.dirname(importer), spec))
+    else:
+        return None
+    candidates = [base] if base.endswith(RESOLVE_EXTENSIONS) else []
+    candidates += [base + ext for ext in RESOLVE_EXTENSIONS]
+    candidates += [os.path.join(base, 'index' + ext) for ext in RESOLVE_EXTENSIONS]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def is_page(path):
+    path = path.replace(os.sep, '/')
+    name = os.path.basename(path)
+    if '/app/' in path and os.path.splitext(name)[0] == 'page':
+        return '/api/' not in path
+    return '/pages/' in path and '/pages/api/' not in path and not name.startswith('_')
+
+
+def layouts(page):
+    # The app router layouts wrapping a page, outermost last
+    found = []
+    directory = os.path.dirname(page)
+    while '/app' in directory.replace(os.sep, '/'):
+        for ext in RESOLVE_EXTENSIONS:
+            candidate = os.path.join(directory, 'layout' + ext)
+            if os.path.isfile(candidate):
+                found.append(candidate)
+        if os.path.basename(directory) == 'app':
+            break
+        directory = os.path.dirname(directory)
+    return found
+
+
+class Inventory:
+    def __init__(self, apps=tuple(APPS), api_root=API_ROOT):
+        self.routes = load_routes(api_root)
+        self.sources = {}
+        self.sites = []
+        self.pages = {}
+        for app in apps:
+            directory, alias_root = APPS[app]
+            files = source_files(directory, RESOLVE_EXTENSIONS, skip_dts=True)
+            for filepath in files:
+                self._load(app, filepath)
+            for filepath in files:
+                if is_page(filepath):
+                    self.pages[filepath] = (app, self._closure(filepath, alias_root))
+        for site in self.sites:
+            if site.kind == 'api':
+                site.route = find_route(self.routes, site.detail)
+        self._flag()
+
+    def _load(self, app, filepath):
+        if filepath in self.sources:
+            return self.sources[filepath]
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            self.sources[filepath] = None
+            return None
+        source = Source(filepath, normalize_urls(filepath, content))
+        self.sources[filepath] = source
+        if CALL.search(source.mask):
+            self.sites.extend(call_sites(app, source))
+        return source
+
+    def _closure(self, page, alias_root):
+        # The page, its layouts and every local module they import
+        seen = []
+        stack = [page] + layouts(page)
+        while stack:
+            filepath = stack.pop()
+            if filepath in seen:
+                continue
+            seen.append(filepath)
+            source = self._load(_app_of(filepath), filepath)
+            if source is None:
+                continue
+            for spec in IMPORT.findall(source.content):
+                resolved = resolve_import(next(s for s in spec if s), filepath, alias_root)
+                if resolved and resolved not in seen:
+                    stack.append(resolved)
+        return seen
+
+    def _flag(self):
+        for site in self.sites:
+            if site.loop:
+                site.smells.append(('loop', f'{site.method} once per item of {site.loop}'))
+            if 'render' in site.triggers:
+                site.smells.append(('render', f'{site.method} on every render'))
+            for trigger in site.triggers:
+                if trigger.startswith('poll'):
+                    site.smells.append(('poll', f'{site.method} {trigger}'))
+            if site.route is not None and site.method in METHODS and site.route.methods \
+                    and site.method not in site.route.methods:
+                site.smells.append(('missing', f'{site.route.path} exports {", ".join(site.route.methods)}'))
+
+        by_file = {}
+        for site in self.sites:
+            by_file.setdefault(site.path, []).append(site)
+        self.repeated = []
+        for page, (app, modules) in sorted(self.pages.items()):
+            loads = {}
+            for module in modules:
+                for site in by_file.get(module, []):
+                    if site.route is not None and site.method == 'GET' \
+                            and any(t.startswith(LOAD_TRIGGERS) for t in site.triggers):
+                        loads.setdefault(site.route.path, []).append(site)
+            for route, sites in sorted(loads.items()):
+                if len(sites) > 1:
+                    self.repeated.append((page, route, sites))
+
+    def usage(self):
+        # {route path: [sites]} for every route, called or not
+        used = {route.path: [] for route in self.routes}
+        for site in self.sites:
+            if site.route is not None:
+                used[site.route.path].append(site)
+        return used
+
+    def report(self, top=None):
+        api = [site for site in self.sites if site.kind == 'api']
+        unmatched = [site for site in api if site.route is None]
+        used = self.usage()
+        called = sum(1 for sites in used.values() if sites)
+        lines = [f'{len(self.sites)} fetch call sites in {len({s.path for s in self.sites})} files, '
+                 f'{called} of {len(self.routes)} routes called']
+
+        lines.append('\nRoutes by call sites')
+        rows = sorted(((path, sites) for path, sites in used.items() if sites), key=lambda item: (-len(item[1]), item[0]))
+        width = max([len(path) for path, _ in rows] + [5])
+        methods = {route.path: route.methods for route in self.routes}
+        for path, sites in rows[:top]:
+            apps = _counts(site.app for site in sites)
+            triggers = _counts(t for site in sites for t in site.triggers)
+            lines.append(f'  {path:<{width}} {len(sites):>3}  {",".join(methods[path]) or "-":<18} {apps:<28} {triggers}')
+
+        unused = sorted(path for path, sites in used.items() if not sites)
+        if unused:
+            lines.append(f'\nRoutes no app calls ({len(unused)})')
+            lines.extend(f'  {path}' for path in unused)
+
+        lines.append('\nHot spots')
+        for smell in ('loop', 'render', 'poll', 'missing'):
+            for site in self.sites:
+                for kind, note in site.smells:
+                    if kind == smell:
+                        lines.append(f'  {kind:<8} {site.where}  {display(site.url or "?")}  {note}')
+        # Pages sharing a layout repeat the same loads; each set is listed once
+        groups = {}
+        for page, route, sites in self.repeated:
+            groups.setdefault((route, tuple(sites)), []).append(page)
+        for (route, sites), pages in sorted(groups.items(), key=lambda item: (-len(item[0][1]), -len(item[1]), item[0][0])):
+            files = {site.path for site in sites}
+            shown = pages[0] if len(pages) == 1 else f'{len(pages)} pages ({pages[0]}, ...)'
+            lines.append(f'  repeated GET {route} loaded {len(sites)} times from {len(files)} files on {shown}')
+            for site in sites:
+                lines.append(f'             {site.where} ({", ".join(sorted(site.triggers))})')
+
+        if unmatched:
+            lines.append(f'\nCalls with no route file ({len(unmatched)})')
+            for site in unmatched:
+                lines.append(f'  {site.where}  {site.method} {display(site.url)}')
+        others = [site for site in self.sites if site.kind != 'api']
+        if others:
+            lines.append(f'\nOther calls ({len(others)})')
+            for site in others:
+                lines.append(f'  {site.kind:<10} {site.where}  {display(site.url) if site.url else "?"}')
+        return lines
+
+    def to_json(self):
+        used = self.usage()
+        return {
+            'routes': {route.path: {'methods': route.methods, 'sites': len(used[route.path])} for route in self.routes},
+            'sites': [site.to_json() for site in self.sites],
+            'repeated': [{'page': page, 'route': route, 'sites': [site.where for site in sites]}
+                         for page, route, sites in self.repeated],
+        }
+
+
+def _app_of(filepath):
+    path = filepath.replace(os.sep, '/')
+    for app, (directory, alias_root) in APPS.items():
+        if path.startswith(alias_root + '/'):
+            return app
+    return ''
+
+
+def _counts(values):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return ' '.join(f'{name} {count}' for name, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Map the apps\' fetch calls to admin panel API routes and flag hot spots')
+    parser.add_argument('--apps', default=','.join(APPS), help='comma-separated apps to scan')
+    parser.add_argument('--top', type=int, help='only list this many routes')
+    parser.add_argument('--json', help='also write the inventory to this JSON file')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    inventory = Inventory(args.apps.split(','))
+    print('\n'.join(inventory.report(args.top)))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(inventory.to_json(), f, indent=2)
+        print(f'\nInventory written to {args.json}')
@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import tempfile
+import time
+
+import transforms
+from file_index import HERE, scan
+from regex_overlap import bytes_safe
+from regex_rules import REGEX_PACKS
+from rule_table import LITERAL_PACKS
+from safe_write import BatchWriter
+
+# Benchmarks the repair transforms on generated corpora of customer- and
+# partner-style pages.
+#
+# Each generated file is a page component with useState hooks, fetch calls
+# against ${API_URL} (and some left on localhost:3000), localStorage reads and
+# router calls, plus a few seeded corruptions taken from the broken forms the
+# rule packs repair. Every transform is timed over the raw bytes of the whole
+# corpus through apply_pipeline, as the scripts run it, then every single rule,
+# then one read-and-write_bytes pass through BatchWriter for the disk cost.
+# Results can be saved as a JSON baseline and later runs compared against it.
+
+BASELINE_FILE = os.path.join(HERE, 'bench_baseline.json')
+DEFAULT_SIZES = [1000]
+TOLERANCE = 0.15
+
+ENDPOINTS = [
+    'orders', 'orders/${orderId}', 'mobile/partners/${partnerId}', 'customers/${customerId}',
+    'vouchers/validate', 'pickups', 'pickups/${pickupId}/start', 'hub/drop', 'services', 'items',
+    'delivery/history', 'notifications', 'addresses', 'check-availability',
+]
+LABELS = ["Don't miss out", 'View details', 'Continue', 'Back to orders']
+ROUTES = ['/login', '/profile', '/congrats', '/not-available', '/pickups', '/delivery/history', '/hub/drop']
+STATE_NAMES = ['orders', 'loading', 'error', 'couponCode', 'discount', 'customerInfo', 'pickups',
+               'refreshing', 'activeTab', 'selectedVoucherCode', 'issueText', 'otp', 'address']
+STORAGE_KEYS = ['customerId', 'partnerId', 'token', 'hubId']
+
+# Broken forms the rules exist for, besides the literal patterns themselves
+SEEDED = [
+    "fetch(`${API_URL}/api/orders\")",
+    "fetch(`${API_URL}/api/pickups')",
+    "getItem('partnerId`)",
+    "useState('all\")",
+    "alert(\"Pickup started`)",
+    "router.push('/pickups`)",
+    "fetch('http://localhost:3000/api/orders')",
+    "fetch(\"http://localhost:3000/api/services\")",
+]
+
+
+def corruptions():
+    seeds = list(SEEDED)
+    for rules in LITERAL_PACKS.values():
+        seeds.extend(old for old, new in rules if old != new)
+    return sorted(set(seeds))
+
+
+def generate_page(rng, index, seeds, corruption_rate):
+    name = f'Page{index}'
+    lines = [
+        'import { useState, useEffect } from "react";',
+        "import { useRouter } from 'next/navigation';",
+        "import { API_URL } from '@/config/api';",
+        '',
+        f'export default function {name}() {{',
+        '  const router = useRouter();',
+    ]
+    for state in rng.sample(STATE_NAMES, rng.randint(3, 8)):
+        initial = rng.choice(['""', "''", 'false', 'true', '0', '[]', 'null', "'all'"])
+        lines.append(f'  const [{state}, set{state[0].upper()}{state[1:]}] = useState({initial});')
+    lines.append('')
+
+    for n in range(rng.randint(2, 6)):
+        endpoint = rng.choice(ENDPOINTS)
+        key = rng.choice(STORAGE_KEYS)
+        base = '${API_URL}' if rng.random() > 0.2 else 'http://localhost:3000'
+        lines += [
+            f'  const load{n} = async () => {{',
+            '    try {',
+            f"      const {key} = localStorage.getItem('{key}');",
+            f'      const response = await fetch(`{base}/api/{endpoint}`, {{',
+            "        method: 'GET',",
+            "        headers: { 'Content-Type': 'application/json' },",
+            '      });',
+            '      const data = await response.json();',
+            '      if (data.success) {',
+            '        setLoading(false);',
+            '      } else {',
+            f"        alert(data.error || 'Failed to load {endpoint.split('/')[0]}');",
+            f"        router.push('{rng.choice(ROUTES)}');",
+            '      }',
+            '    } catch (error) {',
+            f"      console.error('Error loading {endpoint.split('/')[0]}:', error);",
+            '    }',
+            '  };',
+            '',
+        ]
+
+    lines += ['  return (', '    <div className="min-h-screen bg-gray-50 pb-24">']
+    for n in range(rng.randint(4, 16)):
+        route = rng.choice(ROUTES)
+        lines += [
+            f'      <div className="flex items-center gap-3 p-4 {rng.choice(["bg-white", "bg-purple-50", "rounded-xl"])}">',
+            f"        <button onClick={{() => router.push('{route}')}} className=\"text-sm font-semibold\">",
+            f'          {rng.choice(LABELS)}',
+            '        </button>',
+            "        <p className={`text-xs ${loading ? 'opacity-50' : ''}`}>{orders.length} items</p>",
+            '      </div>',
+        ]
+    lines += ['    </div>', '  );', '}', '']
+
+    # Replace a few healthy lines with seeded corruptions
+    for _ in range(rng.randint(0, 3) if rng.random() < corruption_rate else 0):
+        i = rng.randrange(6, len(lines) - 4)
+        lines[i] = lines[i][:len(lines[i]) - len(lines[i].lstrip())] + rng.choice(seeds) + ';'
+    return '\n'.join(lines)
+
+
+def generate_corpus(directory, count, seed=0, corruption_rate=0.3):
+    rng = random.Random(seed)
+    seeds = corruptions()
+    for index in range(count):
+        app = 'customer/src/pages' if index % 2 == 0 else 'partner/src/app'
+        folder = os.path.join(directory, app, f'section{index % 37}', f'group{index % 11}')
+        os.makedirs(folder, exist_ok=True)
+        filepath = os.path.join(folder, f'Page{index}.tsx')
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(generate_page(rng, index, seeds, corruption_rate))
+
+
+def load_corpus(directory):
+    contents = []
+    for entry in scan(directory)[0]:
+        if entry.path.endswith('.tsx'):
+            with open(entry.path, 'rb') as f:
+                contents.append((entry.path, f.read()))
+    return contents
+
+
+def best_of(repeat, run):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def rates(seconds, files, size):
+    seconds = max(seconds, 1e-9)
+    return {
+        'seconds': round(seconds, 6),
+        'files_per_s': round(files / seconds, 1),
+        'mb_per_s': round(size / seconds / 1e6, 3),
+    }
+
+
+def bench_corpus(directory, repeat=3, per_rule=True):
+    contents = [content for _, content in load_corpus(directory)]
+    files = len(contents)
+    size = sum(len(content) for content in contents)
+    result = {'files': files, 'bytes': size, 'transforms': {}, 'rules': {}}
+
+    # The raw bytes, as every script now runs the transforms
+    for name in transforms.TRANSFORMS:
+        def run():
+            for content in contents:
+                transforms.apply_pipeline(content, [name])
+        result['transforms'][name] = rates(best_of(repeat, run), files, size)
+
+    if per_rule:
+        for pack, rules in LITERAL_PACKS.items():
+            for i, (old, new) in enumerate(rules):
+                old, new = old.encode('utf-8'), new.encode('utf-8')
+
+                def run():
+                    for content in contents:
+                        content.replace(old, new)
+                result['rules'][f'{pack}#{i}'] = rates(best_of(repeat, run), files, size)
+        for pack, rules in REGEX_PACKS.items():
+            for i, (pattern, replacement) in enumerate(rules):
+                if bytes_safe(pattern):
+                    regex = re.compile(pattern.encode('utf-8'))
+                    template = replacement.encode('utf-8')
+
+                    def run():
+                        for content in contents:
+                            regex.sub(template, content)
+                else:
+                    # A stage with such a rule decodes the file for its scan
+                    regex = re.compile(pattern)
+
+                    def run():
+                        for content in contents:
+                            regex.sub(replacement, content.decode('utf-8')).encode('utf-8')
+                result['rules'][f'{pack}#{i}'] = rates(best_of(repeat, run), files, size)
+
+    # Disk side of a no-op run: read every file and hand it to the writer as the scripts do
+    paths = [filepath for filepath, _ in load_corpus(directory)]
+
+    def run():
+        writer = BatchWriter()
+        for filepath in paths:
+            with open(filepath, 'rb') as f:
+                content = f.read()
+            writer.write_bytes(filepath, content, content)
+        writer.flush()
+    result['io'] = rates(best_of(repeat, run), files, size)
+    return result
+
+
+def compare(baseline, results, tolerance=TOLERANCE):
+    # Returns the lines for every timing that got slower than tolerance allows
+    regressions = []
+    for size, run in results['runs'].items():
+        old_run = baseline.get('runs', {}).get(size)
+        if old_run is None:
+            continue
+        pairs = [('io', old_run.get('io'), run['io'])]
+        for group in ('transforms', 'rules'):
+            for name, timing in run[group].items():
+                pairs.append((name, old_run.get(group, {}).get(name), timing))
+        for name, old, new in pairs:
+            if old is None or not old['mb_per_s']:
+                continue
+            ratio = new['mb_per_s'] / old['mb_per_s']
+            if ratio < 1 - tolerance:
+                regressions.append(f'{size} files: {name} {old["mb_per_s"]} -> {new["mb_per_s"]} MB/s ({(1 - ratio) * 100:.0f}% slower)')
+    return regressions
+
+
+def print_run(size, run):
+    print(f'\n{size} files, {run["bytes"] / 1e6:.1f} MB')
+    print(f'  {"transform":<28} {"files/s":>10} {"MB/s":>8}')
+    for name, timing in sorted(run['transforms'].items(), key=lambda item: item[1]['mb_per_s']):
+        print(f'  {name:<28} {timing["files_per_s"]:>10} {timing["mb_per_s"]:>8}')
+    print(f'  {"read + write_bytes (io)":<28} {run["io"]["files_per_s"]:>10} {run["io"]["mb_per_s"]:>8}')
+    if run['rules']:
+        print('  slowest rules:')
+        for name, timing in sorted(run['rules'].items(), key=lambda item: item[1]['mb_per_s'])[:10]:
+            print(f'  {name:<28} {timing["files_per_s"]:>10} {timing["mb_per_s"]:>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the repair transforms on generated corpora')
+    parser.add_argument('--files', default=','.join(str(n) for n in DEFAULT_SIZES), help='comma-separated corpus sizes, e.g. 1000,10000,100000')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='best of this many timings')
+    parser.add_argument('--no-rules', action='store_true', help='skip the per-rule timings')
+    parser.add_argument('--corpus', help='keep the generated corpora under this directory')
+    parser.add_argument('--save', nargs='?', const=BASELINE_FILE, help='write the results as a baseline')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_FILE, help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown before a timing counts as a regression')
+    args = parser.parse_args()
+
+    results = {
+        'version': 2,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'runs': {},
+    }
+    root = args.corpus or tempfile.mkdtemp(prefix='laundry-bench-')
+    try:
+        for size in [int(n) for n in args.files.split(',')]:
+            directory = os.path.join(root, str(size))
+            if not os.path.isdir(directory):
+                generate_corpus(directory, size, args.seed)
+            run = bench_corpus(directory, args.repeat, not args.no_rules)
+            results['runs'][str(size)] = run
+            print_run(size, run)
+    finally:
+        if not args.corpus:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {args.save}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('version') != results['version']:
+            # Version 1 timed the text path, which no script runs any more
+            parser.error(f'{args.compare} is from an older benchmark; save a new baseline with --save')
+        regressions = compare(baseline, results, args.tolerance)
+        for line in regressions:
+            print(f'Regression: {line}')
+        print(f'\n{len(regressions)} regressions against {args.compare}')
+        if regressions:
+            raise SystemExit(1)
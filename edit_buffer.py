@@ -0,0 +1,139 @@
+import bisect
+import io
+from array import array
+from itertools import repeat
+
+# Edits against one text, applied with a single join.
+#
+# A rule that goes through an EditBuffer records (start, end, replacement)
+# against the text it was given instead of building a new copy of it. The
+# edits are kept sorted by offset, as arrays of offsets and a list of shared
+# replacement strings, and must not overlap: an edit that touches one already
+# recorded raises EditConflict naming both rules. result() joins the untouched
+# spans and the replacements once, so a file costs its original and one output
+# however many rules fire in it. Bytes are streamed into the output from views
+# of the original: bytes.join would hold a buffer struct for every part.
+#
+# Later rules see the text as edited so far without it being built: they match
+# only in the spans no edit touches (next_start() finds the edge), which is the
+# same as scanning the edited text as long as their patterns cannot match any
+# part of a replacement already recorded. buffer.written is the set of those
+# replacements, for the rule to decide; when it cannot, flush() builds the text
+# and starts over from it.
+
+
+class EditConflict(ValueError):
+    def __init__(self, span, owner, other_span, other_owner):
+        super().__init__(f'{owner} edits {span[0]}:{span[1]}, which overlaps the edit of {other_owner} '
+                         f'at {other_span[0]}:{other_span[1]}')
+        self.span = span
+        self.owner = owner
+        self.other_span = other_span
+        self.other_owner = other_owner
+
+
+class EditBuffer:
+    def __init__(self, text):
+        self.text = text
+        self._reset()
+
+    def _reset(self):
+        # Empty until the first merge; then arrays, and per edit in owners an
+        # index into labels for the rule that recorded it
+        self.starts = self.ends = self.owners = ()
+        self.replacements = []
+        self.labels = []
+        self.written = set()
+
+    def __bool__(self):
+        return bool(self.replacements)
+
+    def __len__(self):
+        return len(self.replacements)
+
+    def merge(self, starts, ends, replacements, owner=None):
+        # Adds a batch of edits sorted by offset (one rule's matches, say),
+        # splicing them in among those already recorded
+        if not replacements:
+            return
+        if owner not in self.labels:
+            self.labels.append(owner)
+        added = self.labels.index(owner)
+        if not self.replacements:
+            # Matches of one scan cannot overlap one another
+            self.starts = array('q', starts)
+            self.ends = array('q', ends)
+            self.replacements = list(replacements)
+            self.owners = array('H', [added]) * len(self.replacements)
+            self.written.update(replacements)
+            return
+        old_starts, old_ends, old_replacements, old_owners = self.starts, self.ends, self.replacements, self.owners
+        new_starts = array('q')
+        new_ends = array('q')
+        new_replacements = []
+        new_owners = array('H')
+        last = 0
+        for start, end, replacement, i in zip(starts, ends, replacements,
+                                              map(bisect.bisect_right, repeat(old_starts), starts)):
+            if i > last:
+                new_starts.extend(old_starts[last:i])
+                new_ends.extend(old_ends[last:i])
+                new_replacements.extend(old_replacements[last:i])
+                new_owners.extend(old_owners[last:i])
+                last = i
+            # Only the edit before it and the next recorded one can overlap it
+            if new_starts and (new_starts[-1] == start or new_ends[-1] > start):
+                raise EditConflict((start, end), owner, (new_starts[-1], new_ends[-1]), self.labels[new_owners[-1]])
+            if i < len(old_starts) and old_starts[i] < end:
+                raise EditConflict((start, end), owner, (old_starts[i], old_ends[i]), self.labels[old_owners[i]])
+            new_starts.append(start)
+            new_ends.append(end)
+            new_replacements.append(replacement)
+            new_owners.append(added)
+        new_starts.extend(old_starts[last:])
+        new_ends.extend(old_ends[last:])
+        new_replacements.extend(old_replacements[last:])
+        new_owners.extend(old_owners[last:])
+        self.starts, self.ends, self.replacements, self.owners = new_starts, new_ends, new_replacements, new_owners
+        self.written.update(replacements)
+
+    def next_start(self, offset):
+        # Start of the first edit that ends after offset (len(text) + 1 if none)
+        i = bisect.bisect_right(self.ends, offset)
+        return self.starts[i] if i < len(self.starts) else len(self.text) + 1
+
+    def result(self):
+        if not self.replacements:
+            return self.text
+        text = self.text
+        if isinstance(text, bytes):
+            out = io.BytesIO()
+            view = memoryview(text)
+            last = 0
+            for start, end, replacement in zip(self.starts, self.ends, self.replacements):
+                out.write(view[last:start])
+                out.write(replacement)
+                last = end
+            out.write(view[last:])
+            return out.getvalue()
+        parts = []
+        last = 0
+        for start, end, replacement in zip(self.starts, self.ends, self.replacements):
+            parts.append(text[last:start])
+            parts.append(replacement)
+            last = end
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    def apply(self, step):
+        # Runs a step that needs the whole text (a regex with context, a rule
+        # that fires too often to keep edit by edit) on the text as edited
+        self.text = step(self.flush())
+        return self.text
+
+    def flush(self):
+        # The edited text, which later edits are then recorded against
+        if self.replacements:
+            self.text = self.result()
+            self._reset()
+        return self.text
@@ -0,0 +1,156 @@
+import json
+import os
+from collections import namedtuple
+
+from git_changes import changed_files
+
+# Source file enumeration shared by the repair scripts.
+#
+# Walks with os.scandir, never descends into dependency, native-build or
+# archive directories, and can keep a snapshot of the listing on disk. A
+# snapshot is reused as long as no directory in it has a new mtime (adding,
+# removing or renaming a file always bumps its directory's mtime), so repeated
+# runs in one session only stat the directories instead of listing them.
+#
+# Given since=REF, source_files lists only the files changed since REF, as
+# git reports them, and the tree is not walked at all. The scripts take REF
+# from their own --since option (see script_args.py).
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Checkout root; set LAUNDRY_ROOT when the scripts live outside the checkout
+ROOT = os.path.abspath(os.environ.get('LAUNDRY_ROOT') or HERE)
+
+SNAPSHOT_FILE = os.path.join(HERE, '.file_index.json')
+
+SOURCE_EXTENSIONS = ('.ts', '.tsx')
+
+IGNORED_DIRS = {
+    'node_modules', 'android', 'ios', '__MACOSX', '.next', 'out', 'dist', 'build',
+    '.git', '__pycache__', '.gradle', '.idea', '.vscode',
+}
+
+FileEntry = namedtuple('FileEntry', ['path', 'size', 'mtime_ns'])
+
+
+def root_path(*parts):
+    return os.path.join(ROOT, *parts)
+
+
+def scan(directory, ignored=IGNORED_DIRS):
+    # Returns (files, directories): every file below directory with its stat,
+    # and the mtime of every directory visited
+    files = []
+    directories = {}
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            directories[current] = os.stat(current).st_mtime_ns
+            with os.scandir(current) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in ignored:
+                    stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                files.append(FileEntry(entry.path, st.st_size, st.st_mtime_ns))
+    files.sort()
+    return files, directories
+
+
+def changed_entries(directory, paths, extensions=SOURCE_EXTENSIONS, skip_dts=False, ignored=IGNORED_DIRS):
+    # Entries for the absolute paths below directory, spelt from directory
+    # the way scan spells them
+    base = os.path.abspath(directory)
+    entries = []
+    for path in paths:
+        relative = os.path.relpath(path, base)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            continue
+        if not path.endswith(extensions) or (skip_dts and path.endswith('.d.ts')):
+            continue
+        if any(part in ignored for part in relative.split(os.sep)[:-1]):
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append(FileEntry(os.path.join(directory, relative), st.st_size, st.st_mtime_ns))
+    entries.sort()
+    return entries
+
+
+class FileIndex:
+    def __init__(self, snapshot=SNAPSHOT_FILE, ignored=IGNORED_DIRS):
+        self.snapshot = snapshot
+        self.ignored = ignored
+        self.trees = {}
+        self.dirty = False
+        if snapshot and os.path.exists(snapshot):
+            try:
+                with open(snapshot, 'r', encoding='utf-8') as f:
+                    self.trees = json.load(f).get('trees', {})
+            except ValueError:
+                self.trees = {}
+
+    def _key(self, directory):
+        return os.path.abspath(directory) + '|' + ','.join(sorted(self.ignored))
+
+    def _fresh(self, tree):
+        for path, mtime_ns in tree['directories'].items():
+            try:
+                if os.stat(os.path.join(tree['cwd'], path)).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def tree(self, directory):
+        key = self._key(directory)
+        tree = self.trees.get(key)
+        if tree is not None and tree['directory'] == directory and tree['cwd'] == os.getcwd() and self._fresh(tree):
+            return [FileEntry(*entry) for entry in tree['files']]
+
+        files, directories = scan(directory, self.ignored)
+        self.trees[key] = {
+            'directory': directory,
+            'cwd': os.getcwd(),
+            'directories': directories,
+            'files': [list(entry) for entry in files],
+        }
+        self.dirty = True
+        return files
+
+    def files(self, directory, extensions=SOURCE_EXTENSIONS, skip_dts=False):
+        return [entry for entry in self.tree(directory)
+                if entry.path.endswith(extensions) and not (skip_dts and entry.path.endswith('.d.ts'))]
+
+    def save(self):
+        if not self.snapshot or not self.dirty:
+            return
+        tmp = self.snapshot + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'trees': self.trees}, f)
+        os.replace(tmp, self.snapshot)
+        self.dirty = False
+
+
+_index = None
+
+
+def source_files(directory, extensions=SOURCE_EXTENSIONS, skip_dts=False, since=None):
+    # Paths of the source files below directory, saving the snapshot as it
+    # goes; with since, the ones changed since that git ref (GitError if git
+    # cannot resolve it)
+    if since:
+        return [entry.path for entry in changed_entries(directory, changed_files(since, ROOT), extensions, skip_dts)]
+    global _index
+    if _index is None:
+        _index = FileIndex()
+    entries = _index.files(directory, extensions, skip_dts)
+    _index.save()
+    return [entry.path for entry in entries]
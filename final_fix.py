@@ -1,23 +1,30 @@
 import os
-import re
+
+import transforms
+from file_index import ROOT, source_files
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Fix the remaining broken strings in the customer app')
+writer = BatchWriter(args.dry_run)
 
 def final_fix(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
+    with open(filepath, 'rb') as f:
         content = f.read()
     
     # Fix all remaining broken strings with backtick
-    content = re.sub(r"'([^']*)`\)", r"'\1')", content)
-    content = re.sub(r'"([^"]*)`\)', r'"\1")', content)
-    content = re.sub(r"`\)", r"`)", content)
+    fixed = transforms.final_fix(content)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+    return writer.write_bytes(filepath, fixed, content)
+
+os.chdir(ROOT)
 
 # Fix all customer app files
-for root, dirs, files in os.walk('customer/src'):
-    for file in files:
-        if file.endswith(('.tsx', '.ts')):
-            filepath = os.path.join(root, file)
-            final_fix(filepath)
+for filepath in source_files('customer/src', ('.tsx', '.ts'), since=args.since):
+    if final_fix(filepath):
+        print(f'Fixed: {filepath}')
+
+writer.flush()
+print(writer.summary())
 
 print('Final fix complete!')
@@ -1,35 +1,19 @@
 import os
-import re
+
+from file_index import ROOT
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Import API_URL and replace localhost URLs in the customer app pages', since=False)
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
 
 def fix_file(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    if 'localhost:3000' not in content:
-        return False
-    
-    # Add import if not present
-    if "from '@/config/api'" not in content and "from \"@/config/api\"" not in content:
-        # Find last import line
-        lines = content.split('\n')
-        last_import = 0
-        for i, line in enumerate(lines):
-            if line.strip().startswith('import '):
-                last_import = i
-        
-        # Insert import after last import
-        lines.insert(last_import + 1, "import { API_URL } from '@/config/api';")
-        content = '\n'.join(lines)
-    
-    # Replace all localhost:3000 patterns
-    content = re.sub(r'`http://localhost:3000/', r'`${API_URL}/', content)
-    content = re.sub(r"'http://localhost:3000/", r"`${API_URL}/", content)
-    content = re.sub(r'"http://localhost:3000/', r'`${API_URL}/', content)
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
-    return True
+    # Add import if not present and replace all localhost:3000 patterns
+    return fix_cached(filepath, ['fix_all_apis'], cache, writer)
+
+os.chdir(ROOT)
 
 # Fix all customer app files
 customer_files = [
@@ -57,4 +41,8 @@ for file in customer_files:
     else:
         print(f'Not found: {file}')
 
+writer.flush()
+cache.save()
+print(writer.summary())
+
 print('\nAll customer app files updated!')
@@ -1,40 +1,31 @@
 import os
 import glob
 
+from file_index import root_path, source_files
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Fix the quote mismatches in the partner app pages')
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
+
 def fix_file(filepath):
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        original = content
-        
         # Fix all quote mismatches
-        content = content.replace('`}', '`')
-        content = content.replace('"}', '`}')
-        content = content.replace('\'")', "')")
-        content = content.replace('`")', '`)')
-        content = content.replace("'`)", "')")
-        content = content.replace('(")', "('')")
-        content = content.replace("('partnerId`)", "('partnerId')")
-        content = content.replace('alert(")', "alert('')")
-        content = content.replace('"delivered")', "'delivered')")
-        
-        if content != original:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-            return True
-        return False
+        return fix_cached(filepath, ['fix_all_partner_quotes'], cache, writer)
     except Exception as e:
         print(f'Error: {e}')
         return False
 
-os.chdir('d:/OFFICE WORK/laundry-main/partner/src/app')
+os.chdir(root_path('partner', 'src', 'app'))
+
+for filepath in source_files('.', ('.tsx',), since=args.since):
+    if fix_file(filepath):
+        print(f'Fixed: {filepath}')
 
-for root, dirs, files in os.walk('.'):
-    for file in files:
-        if file.endswith('.tsx'):
-            filepath = os.path.join(root, file)
-            if fix_file(filepath):
-                print(f'Fixed: {filepath}')
+writer.flush()
+cache.save()
+print(writer.summary())
 
 print('\nDone!')
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import time
+
+import transforms
+from fixpoint import is_one_pass
+from prefilter import may_change
+from rule_cache import RULE_MODULES
+from safe_write import BatchWriter
+
+# Persistent manifest of files already known to be fixed under the current rules.
+#
+# Entries are keyed by path (relative to the repo root) and hold the file's size,
+# mtime and sha256 plus the fingerprints of every rule set the exact bytes are a
+# fixpoint of. A fingerprint hashes the source of the rule modules, so editing
+# any rule changes it and the old entries simply stop matching.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(HERE, '.fix_cache.json')
+
+# Recorded mtimes this close to the check time may still change within the
+# same timestamp tick, so those entries are verified by hash instead
+RACY_SECONDS = 2
+MAX_FINGERPRINTS = 16
+
+
+def rules_fingerprint(pipeline):
+    h = hashlib.sha256()
+    for name in RULE_MODULES:
+        with open(os.path.join(HERE, name), 'rb') as f:
+            h.update(f.read())
+    h.update('\0'.join(pipeline).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def file_key(filepath):
+    return os.path.relpath(os.path.abspath(filepath), HERE).replace(os.sep, '/')
+
+
+def file_digest(filepath):
+    with open(filepath, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class FixCache:
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.fingerprints = {}
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except ValueError:
+                self.entries = {}
+
+    def fingerprint(self, pipeline):
+        key = tuple(pipeline)
+        if key not in self.fingerprints:
+            self.fingerprints[key] = rules_fingerprint(pipeline)
+        return self.fingerprints[key]
+
+    def is_fixed(self, filepath, pipeline):
+        entry = self.entries.get(file_key(filepath))
+        if entry is None or self.fingerprint(pipeline) not in entry['rules']:
+            return False
+        st = os.stat(filepath)
+        if (st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime_ns']
+                and entry['checked'] - st.st_mtime_ns / 1e9 > RACY_SECONDS):
+            return True
+        if st.st_size != entry['size'] or file_digest(filepath) != entry['sha256']:
+            return False
+        # Same bytes under a new mtime: refresh the stat so the next check is cheap
+        self._store(filepath, st, entry['sha256'], entry['rules'])
+        return True
+
+    def mark_fixed(self, filepath, pipeline):
+        fingerprint = self.fingerprint(pipeline)
+        st = os.stat(filepath)
+        digest = file_digest(filepath)
+        entry = self.entries.get(file_key(filepath))
+        rules = []
+        if entry is not None and entry['sha256'] == digest:
+            rules = [fp for fp in entry['rules'] if fp != fingerprint]
+        rules = (rules + [fingerprint])[-MAX_FINGERPRINTS:]
+        self._store(filepath, st, digest, rules)
+
+    def _store(self, filepath, st, digest, rules):
+        self.entries[file_key(filepath)] = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': digest,
+            'rules': rules,
+            'checked': time.time(),
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': self.entries}, f, sort_keys=True)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def fix_cached(filepath, pipeline, cache, writer=None):
+    # Runs the pipeline over one file unless the cache knows it is already fixed;
+    # returns True if the file was rewritten
+    if cache.is_fixed(filepath, pipeline):
+        return False
+    if not may_change(filepath, pipeline):
+        if writer is not None:
+            writer.skip()
+        return False
+
+    with open(filepath, 'rb') as f:
+        content = f.read()
+
+    fixed = transforms.apply_pipeline(content, pipeline, filepath)
+
+    own = writer is None
+    if own:
+        writer = BatchWriter()
+    rejected = len(writer.rejected)
+    writer.write_bytes(filepath, fixed, content)
+    if own:
+        writer.flush()
+    if len(writer.rejected) > rejected:
+        # Rolled back: the old bytes are still there and still need fixing
+        return False
+
+    # Only bytes the rules leave alone are known to be fixed; a dry run leaves
+    # the old bytes on disk, so only an unchanged file can be marked
+    if fixed == content or (not writer.dry_run and (is_one_pass(pipeline) or transforms.apply_pipeline(fixed, pipeline, filepath) == fixed)):
+        cache.mark_fixed(filepath, pipeline)
+    return fixed != content
@@ -1,22 +1,34 @@
 import os
-import re
+
+import transforms
+from file_index import ROOT, source_files
+from prefilter import may_change
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Fix the quotes around the fetch URLs in the customer app')
+writer = BatchWriter(args.dry_run)
 
 def fix_fetch(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
+    if not may_change(filepath, ['fix_fetch']):
+        return writer.skip()
+
+    with open(filepath, 'rb') as f:
         content = f.read()
     
     # Fix fetch calls with mismatched quotes
-    content = re.sub(r"fetch\(`\$\{API_URL\}([^`]*)'", r"fetch(`${API_URL}\1`", content)
-    content = re.sub(r'fetch\(`\$\{API_URL\}([^`]*)"', r'fetch(`${API_URL}\1`', content)
+    fixed = transforms.fix_fetch(content)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+    return writer.write_bytes(filepath, fixed, content)
+
+os.chdir(ROOT)
 
 # Fix all customer app files
-for root, dirs, files in os.walk('customer/src'):
-    for file in files:
-        if file.endswith(('.tsx', '.ts')):
-            filepath = os.path.join(root, file)
-            fix_fetch(filepath)
+for filepath in source_files('customer/src', ('.tsx', '.ts'), since=args.since):
+    if fix_fetch(filepath):
+        print(f'Fixed: {filepath}')
+
+writer.flush()
+print(writer.summary())
 
 print('Fetch fixes complete!')
@@ -0,0 +1,42 @@
+import os
+
+from file_index import ROOT, source_files
+from multi_replace import apply_packs
+from prefilter import may_change
+from rule_scope import skipped_rules
+from rule_table import CUSTOMER_ORDER, PARTNER_ORDER
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Run the literal rules of every whole-tree script in one go')
+writer = BatchWriter(args.dry_run)
+
+# Runs the literal rules of every whole-tree script in one go, in the declared order
+
+def fix_file(filepath, order):
+    if not may_change(filepath, order):
+        return writer.skip()
+
+    with open(filepath, 'rb') as f:
+        content = f.read()
+
+    fixed = apply_packs(content, order, skipped_rules(filepath, order))
+
+    return writer.write_bytes(filepath, fixed, content)
+
+os.chdir(ROOT)
+
+targets = [
+    ('customer/src', ('.tsx', '.ts'), CUSTOMER_ORDER),
+    ('partner/src', ('.tsx',), PARTNER_ORDER),
+]
+
+for directory, extensions, order in targets:
+    for filepath in source_files(directory, extensions, since=args.since):
+        if fix_file(filepath, order):
+            print(f'Fixed: {filepath}')
+
+writer.flush()
+print(writer.summary())
+
+print('\nAll literal fixes applied!')
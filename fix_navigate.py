@@ -1,24 +1,35 @@
 import os
 import re
 
+import transforms
+from file_index import ROOT, source_files
+from prefilter import may_change
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Close the navigate calls left open with a backtick in the customer app')
+writer = BatchWriter(args.dry_run)
+
 def fix_navigate(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
+    if not may_change(filepath, ['fix_navigate']):
+        return writer.skip()
+
+    with open(filepath, 'rb') as f:
         content = f.read()
     
     # Fix navigate calls
-    content = content.replace("navigate('/login`)", "navigate('/login')")
-    content = content.replace('navigate("/login`)', 'navigate("/login")')
-    content = content.replace("navigate('/login`);", "navigate('/login');")
-    content = content.replace('navigate("/login`);', 'navigate("/login");')
+    fixed = transforms.fix_navigate(content)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+    return writer.write_bytes(filepath, fixed, content)
+
+os.chdir(ROOT)
 
 # Fix all customer app files
-for root, dirs, files in os.walk('customer/src'):
-    for file in files:
-        if file.endswith(('.tsx', '.ts')):
-            filepath = os.path.join(root, file)
-            fix_navigate(filepath)
+for filepath in source_files('customer/src', ('.tsx', '.ts'), since=args.since):
+    if fix_navigate(filepath):
+        print(f'Fixed: {filepath}')
+
+writer.flush()
+print(writer.summary())
 
 print('Navigate fixes complete!')
@@ -0,0 +1,213 @@
+import argparse
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import rollback
+import rule_profile
+import structure
+import transforms
+from file_index import ROOT, FileIndex, changed_entries
+from fix_cache import FixCache
+from fixpoint import is_one_pass
+from git_changes import GitError, changed_files
+from prefilter import may_change, prefilter
+from safe_write import BatchWriter
+from trigram_index import pipeline_candidates
+
+# Runs the per-file repair work for all three apps on a process pool
+
+TARGETS = {
+    'customer': ('customer/src', ['replace_api_url', 'fix_fetch', 'fix_syntax', 'fix_more_syntax', 'fix_navigate']),
+    'partner': ('partner/src', ['replace_api_url', 'fix_partner_complete']),
+    'admin': ('admin panel/app', ['replace_api_url']),
+}
+# fix_partner_all and fix_all_partner_quotes also rewrite valid template
+# literals, so they only run when asked for with --pipeline
+
+EXTENSIONS = ('.ts', '.tsx')
+
+# The module that defines API_URL keeps its localhost default
+SKIP_FILES = ('config/api.ts',)
+
+
+def collect(apps, pipeline=None, use_index=True, since=None):
+    # Returns (jobs, skipped). Sizes come from the index snapshot; they only
+    # steer the chunking. Files the trigram index rules out are never queued.
+    # With since, only the files changed since that git ref are listed, and
+    # the trees are neither walked nor indexed
+    index = FileIndex()
+    changed = changed_files(since, ROOT) if since else None
+    jobs = []
+    skipped = 0
+    for app in apps:
+        directory, default_pipeline = TARGETS[app]
+        if changed is not None:
+            entries = changed_entries(directory, changed, EXTENSIONS, skip_dts=True)
+        else:
+            entries = index.files(directory, EXTENSIONS, skip_dts=True)
+        candidates = None
+        if use_index and changed is None:
+            candidates = pipeline_candidates([directory], pipeline or default_pipeline)
+        for entry in entries:
+            if entry.path.replace(os.sep, '/').endswith(SKIP_FILES):
+                continue
+            if candidates is not None and os.path.abspath(entry.path) not in candidates:
+                skipped += 1
+                continue
+            jobs.append((app, entry.path, entry.size, pipeline or default_pipeline))
+    index.save()
+    return jobs, skipped
+
+
+def chunk_by_size(jobs, count):
+    # Largest files first, each into the lightest chunk, so chunks carry similar byte counts
+    chunks = [[] for _ in range(count)]
+    loads = [0] * count
+    for job in sorted(jobs, key=lambda job: -job[2]):
+        i = loads.index(min(loads))
+        chunks[i].append(job)
+        loads[i] += job[2]
+    return [chunk for chunk in chunks if chunk]
+
+
+def prepare(pipelines):
+    # Matchers and analyses are built here, before the pool forks, so the
+    # workers inherit them and the rule cache is written by one process
+    for pipeline in pipelines:
+        transforms.compile_pipeline(pipeline)
+        prefilter(pipeline)
+        is_one_pass(pipeline)
+
+
+def fix_file(filepath, pipeline, writer):
+    if rule_profile.active is not None:
+        rule_profile.active.begin_file()
+    if not may_change(filepath, pipeline):
+        return writer.skip(), True
+    with open(filepath, 'rb') as f:
+        content = f.read()
+
+    fixed = transforms.apply_pipeline(content, pipeline, filepath)
+
+    rejected = len(writer.rejected)
+    changed = writer.write_bytes(filepath, fixed, content)
+    if len(writer.rejected) > rejected:
+        # Reported as this file's error, naming the transform to look at
+        problem = writer.rejected[-1].problem
+        raise structure.StructureError(filepath, problem, transforms.breaking_transform(filepath, content, pipeline))
+    stable = fixed == content or is_one_pass(pipeline) or transforms.apply_pipeline(fixed, pipeline, filepath) == fixed
+    return changed, stable
+
+
+def fix_chunk(chunk, profile=False, dry_run=False):
+    # Returns (results, profile tables or None, diff text or None)
+    profiler = rule_profile.enable() if profile else None
+    diffs = io.StringIO() if dry_run else None
+    results = []
+    writer = BatchWriter(dry_run, diffs, log=None)
+    for app, filepath, size, pipeline in chunk:
+        try:
+            changed, stable = fix_file(filepath, pipeline, writer)
+            results.append((app, filepath, pipeline, changed, stable, None))
+        except Exception as e:
+            results.append((app, filepath, pipeline, False, False, str(e)))
+    writer.flush()
+    tables = None
+    if profiler is not None:
+        rule_profile.disable()
+        tables = profiler.to_json()
+    return results, tables, diffs.getvalue() if diffs is not None else None
+
+
+def run(apps, workers, pipeline=None, cache=None, profiler=None, dry_run=False, use_index=True, since=None):
+    # Returns (results, number of files the index skipped)
+    jobs, skipped = collect(apps, pipeline, use_index, since)
+    if cache is not None:
+        # Files already fixed under the current rules never reach the pool
+        jobs = [job for job in jobs if not cache.is_fixed(job[1], job[3])]
+    prepare(dict.fromkeys(tuple(job[3]) for job in jobs))
+    if not dry_run:
+        # One run journal for all the workers
+        rollback.begin()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        work = partial(fix_chunk, profile=profiler is not None, dry_run=dry_run)
+        for chunk_results, tables, diffs in pool.map(work, chunk_by_size(jobs, workers * 4)):
+            results.extend(chunk_results)
+            if tables is not None:
+                profiler.merge(tables)
+            if diffs:
+                # Each chunk's diffs go out as soon as it finishes
+                sys.stdout.write(diffs)
+                sys.stdout.flush()
+
+    # Report in app order, then path order, however the chunks finished
+    order = {app: i for i, app in enumerate(apps)}
+    results.sort(key=lambda result: (order[result[0]], result[1]))
+
+    if cache is not None:
+        for app, filepath, pipeline, changed, stable, error in results:
+            # A dry run leaves the old bytes on disk
+            if stable and not (dry_run and changed):
+                cache.mark_fixed(filepath, pipeline)
+        cache.save()
+    return results, skipped
+
+
+def print_results(results, skipped, dry_run=False):
+    # Prints one line per changed or failed file and a summary; returns the error count
+    changed = 0
+    errors = 0
+    for app, filepath, pipeline, was_changed, stable, error in results:
+        if error:
+            errors += 1
+            print(f'Error: {filepath} - {error}')
+        elif was_changed:
+            changed += 1
+            print(f'{"Would fix" if dry_run else "Fixed"}: {filepath}')
+
+    print(f'\n{len(results)} files processed, {changed} {"would be fixed" if dry_run else "fixed"}, {errors} errors, '
+          f'{skipped} ruled out by the index')
+    if changed and not dry_run and rollback.ENABLED:
+        print(f'Undo with: python rollback.py {rollback.current().run_id}')
+    return errors
+
+
+def print_profile(profiler, top, json_path=None):
+    for table in ('transforms', 'scans', 'rules'):
+        print('\n' + profiler.table(table, top))
+    if json_path:
+        profiler.save(json_path)
+        print(f'\nProfile written to {json_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Repair the customer, partner and admin sources in parallel')
+    parser.add_argument('--apps', default='customer,partner,admin', help='comma-separated apps to process')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--pipeline', help='comma-separated transforms to run instead of each app\'s default')
+    parser.add_argument('--no-cache', action='store_true', help='process every file, ignoring the fix cache')
+    parser.add_argument('--no-index', action='store_true', help='visit every file, not only the trigram index candidates')
+    parser.add_argument('--dry-run', action='store_true', help='print unified diffs instead of writing files')
+    parser.add_argument('--since', help='only process files changed since this git ref, plus untracked ones')
+    parser.add_argument('--profile', action='store_true', help='report per-rule hits and timings')
+    parser.add_argument('--profile-json', help='also write the profile to this JSON file')
+    parser.add_argument('--top', type=int, default=20, help='rows per profile table')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    apps = args.apps.split(',')
+    pipeline = args.pipeline.split(',') if args.pipeline else None
+    cache = None if args.no_cache else FixCache()
+    profiler = rule_profile.Profiler() if args.profile or args.profile_json else None
+    try:
+        results, skipped = run(apps, args.workers, pipeline, cache, profiler, args.dry_run, not args.no_index, args.since)
+    except GitError as e:
+        parser.error(f'--since {args.since}: {e}')
+    print_results(results, skipped, args.dry_run)
+    if profiler is not None:
+        print_profile(profiler, args.top, args.profile_json)
@@ -1,30 +1,26 @@
 import os
 
-os.chdir('d:/OFFICE WORK/laundry-main/partner/src')
+from file_index import root_path, source_files
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
 
-for root, dirs, files in os.walk('.'):
-    for file in files:
-        if file.endswith('.tsx') or file.endswith('.ts'):
-            filepath = os.path.join(root, file)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                original = content
-                
-                # Fix all quote issues
-                content = content.replace("'`)", "')")
-                content = content.replace('"`)', '")')
-                content = content.replace("useState(\"')", "useState(\"\")")
-                content = content.replace("useState('`)", "useState('')")
-                content = content.replace("getItem('partnerId')", "getItem('partnerId')")
-                content = content.replace("getItem(\"partnerId')", "getItem(\"partnerId\")")
-                
-                if content != original:
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    print(f'Fixed: {filepath}')
-            except Exception as e:
-                print(f'Error: {filepath} - {e}')
+args = parse_args('Fix the quote endings in the partner app')
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
+
+os.chdir(root_path('partner', 'src'))
+
+for filepath in source_files('.', ('.tsx', '.ts'), since=args.since):
+    try:
+        # Fix all quote issues
+        if fix_cached(filepath, ['fix_partner_complete'], cache, writer):
+            print(f'Fixed: {filepath}')
+    except Exception as e:
+        print(f'Error: {filepath} - {e}')
+
+writer.flush()
+cache.save()
+print(writer.summary())
 
 print('Done!')
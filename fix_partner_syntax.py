@@ -1,36 +1,23 @@
 import os
-import re
+
+from file_index import ROOT
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Fix the malformed quote patterns in the partner pages', since=False)
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
 
 def fix_file(filepath):
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        original = content
-        
         # Fix all malformed quote patterns
-        content = content.replace('`)', '")')
-        content = content.replace("'`)", "'\")")
-        content = content.replace('\'")', "')")
-        content = content.replace('`}', '"}')
-        
-        # Fix specific useState patterns
-        content = re.sub(r"useState\('all\"\)", "useState('all')", content)
-        content = re.sub(r"useState\('\"\)", "useState('')", content)
-        content = re.sub(r"getItem\('partnerId\"\)", "getItem('partnerId')", content)
-        content = re.sub(r"fetch\(`http://localhost:3000/api/mobile/partners/\$\{partnerId\}\"\)", "fetch(`http://localhost:3000/api/mobile/partners/${partnerId}`)", content)
-        content = re.sub(r"fetch\(`\$\{API_URL\}/api/orders\"\)", "fetch(`${API_URL}/api/orders`)", content)
-        
-        if content != original:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-            return True
-        return False
+        return fix_cached(filepath, ['fix_partner_syntax'], cache, writer)
     except Exception as e:
         print(f'Error fixing {filepath}: {e}')
         return False
 
-os.chdir('d:/OFFICE WORK/laundry-main')
+os.chdir(ROOT)
 
 partner_files = [
     'partner/src/app/check-availability/page.tsx',
@@ -49,4 +36,8 @@ for file in partner_files:
     else:
         print(f'Not found: {file}')
 
+writer.flush()
+cache.save()
+print(writer.summary())
+
 print('\nAll partner app files fixed!')
@@ -1,37 +1,35 @@
 import os
 import re
 
+import transforms
+from file_index import ROOT, source_files
+from prefilter import may_change
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Close the string literals left open with a backtick in the customer app')
+writer = BatchWriter(args.dry_run)
+
 def fix_syntax(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
+    if not may_change(filepath, ['fix_syntax']):
+        return writer.skip()
+
+    with open(filepath, 'rb') as f:
         content = f.read()
     
     # Fix broken strings
-    content = content.replace("useState('`)", "useState('')")
-    content = content.replace('useState("`)', 'useState("")')
-    content = content.replace("setSelectedVoucherCode('`)", "setSelectedVoucherCode('')")
-    content = content.replace("setIssueText('`)", "setIssueText('')")
-    content = content.replace("otp.join('`)", "otp.join('')")
-    content = content.replace("navigate('/congrats`)", "navigate('/congrats')")
-    content = content.replace("navigate('/not-available`)", "navigate('/not-available')")
-    content = content.replace("navigate('/profile`)", "navigate('/profile')")
-    content = content.replace("replace(/\\D/g, '`)", "replace(/\\D/g, '')")
-    content = content.replace("localStorage.getItem('customerId`)", "localStorage.getItem('customerId')")
-    content = content.replace("split(', `)", "split(', ')")
-    content = content.replace('split(" - `)', 'split(" - ")')
-    content = content.replace("', ' + address.addressLine2 : '`)", "', ' + address.addressLine2 : '')")
-    content = content.replace("console.log('Service check failed, continuing with save`)", "console.log('Service check failed, continuing with save')")
+    fixed = transforms.apply_pipeline(content, ['fix_syntax'], filepath)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
-    return True
+    return writer.write_bytes(filepath, fixed, content)
+
+os.chdir(ROOT)
 
 # Fix all customer app files
-for root, dirs, files in os.walk('customer/src'):
-    for file in files:
-        if file.endswith(('.tsx', '.ts')):
-            filepath = os.path.join(root, file)
-            fix_syntax(filepath)
-            print(f'Fixed: {filepath}')
+for filepath in source_files('customer/src', ('.tsx', '.ts'), since=args.since):
+    if fix_syntax(filepath):
+        print(f'Fixed: {filepath}')
+
+writer.flush()
+print(writer.summary())
 
 print('\nAll syntax errors fixed!')
@@ -0,0 +1,355 @@
+import argparse
+import hashlib
+import os
+import re
+
+import rule_cache
+import transforms
+from file_index import ROOT, source_files
+from regex_overlap import (Alphabet, Unsupported, build, build_sequence, can_overlap, matches_empty, parse,
+                           sre_constants, template_pieces, touches)
+from regex_rules import REGEX_PACKS, RuleTimeout
+from rule_table import LITERAL_PACKS
+from safe_write import BatchWriter
+
+# Runs a pipeline of transforms until the text stops changing, and checks the
+# rules behind a pipeline for ones that work against each other.
+#
+# A rule feeds another when the text it writes can complete a match of the
+# other. Only the characters a rule actually changes count: the parts of its
+# match it writes back as they were (common leading and trailing text, and
+# groups copied back by the replacement) stay around the change as context,
+# so useState('`) -> useState('') writes one quote after useState( and
+# before ), and only a rule whose match can take in that quote there is fed.
+# A rule whose shape is not that simple counts its whole output. The checks
+# report:
+#
+#   cycle     two rules (or one rule with itself) feeding each other, so
+#             repeated passes may never settle
+#   backward  a rule feeding one that runs before it, so one pass is not enough
+#   compete   two rules with different replacements where one changes text a
+#             match of the other takes in, so the result depends on which
+#             runs first
+#
+# A pipeline with no backward feeds settles in one pass; the runner and the
+# drivers then skip the verification pass entirely.
+
+MAX_ITERATIONS = 8
+
+
+class Step:
+    def __init__(self, name, pattern, replacement=None, output=None, guard=None):
+        self.name = name
+        self.rule = pattern
+        self.pattern = pattern if guard is None else f'(?:{pattern})|{re.escape(guard)}'
+        self.replacement = replacement
+        self.output = output
+        self.shape = None
+        self.windows = None
+        self.problem = None
+
+    @property
+    def known(self):
+        return self.shape is not None
+
+
+def pipeline_steps(pipeline):
+    steps = []
+    for transform in pipeline:
+        guard = transforms.TRANSFORM_GUARDS.get(transform)
+        for i, step in enumerate(transforms.TRANSFORM_STEPS[transform]):
+            kind = step[0]
+            if kind == 'literal':
+                rules = [(re.escape(old), new.replace('\\', '\\\\'), None)
+                         for old, new in LITERAL_PACKS[step[1]] if old != new]
+                prefix = step[1]
+            elif kind == 'regex':
+                rules = [(pattern, replacement, None) for pattern, replacement in REGEX_PACKS[step[1]]]
+                prefix = step[1]
+            else:
+                rules = [(step[1], None, step[2])]
+                prefix = f'{transform}:code{i}'
+            for j, (pattern, replacement, output) in enumerate(rules):
+                steps.append(Step(f'{prefix}#{j}', pattern, replacement, output, guard))
+    return steps
+
+
+def _shape(step, alphabet, parsed):
+    # Returns (pattern, outputs, rule): the text a new match must touch is in
+    # outputs; rule is the pattern without the transform's guard
+    fragment, groups = build(parsed, alphabet)
+    rule = build(parse(step.rule), alphabet)[0] if step.rule != step.pattern else fragment
+    if step.output is not None:
+        outputs = [build(parse(step.output), alphabet)[0]]
+    else:
+        pieces = template_pieces(step.replacement, groups)
+        literal = [isinstance(piece, str) for piece in pieces]
+        # Captured text was already in the file, so a new match has to touch the
+        # literal text around it, unless two captures (or a capture and the
+        # outside) end up side by side with nothing new between them
+        if any(literal) and literal[0] and literal[-1] and all(a or b for a, b in zip(literal, literal[1:])):
+            outputs = [build_sequence([piece], alphabet) for piece in pieces if isinstance(piece, str)]
+        else:
+            outputs = [build_sequence(pieces, alphabet)]
+    if matches_empty(fragment) or any(matches_empty(output) for output in outputs):
+        # Deleting text joins its neighbours, which no pattern-level check can follow
+        raise Unsupported('can match or produce an empty string')
+    return fragment, outputs, rule
+
+
+def _literal(item, ch):
+    return item[0] == sre_constants.LITERAL and chr(item[1]) == ch
+
+
+def _windows(step):
+    # The changes a rule makes to its match, as (old, new) pairs of touches
+    # arguments (before, changed, after, replaced): the text around a change
+    # is what the rule leaves as it was. None unless the rule is a top-level
+    # sequence whose replacement copies back some of its groups, in order
+    if step.replacement is None:
+        return None
+    parsed = parse(step.rule)
+    items = list(parsed)
+    groups = {}
+    for op, av in items:
+        if op == sre_constants.SUBPATTERN and av[0] is not None:
+            groups[av[0]] = av[-1]
+    state = getattr(parsed, 'state', None) or getattr(parsed, 'pattern', None)
+    for name, number in state.groupdict.items():
+        groups[name] = groups.get(number)
+    try:
+        pieces = template_pieces(step.replacement, groups)
+    except Unsupported:
+        return None
+    # The pattern split at the groups the replacement copies: segments[i] is
+    # the pattern between copies i - 1 and i, written[i] what replaces it
+    segments, written, copies = [[]], [''], []
+    position = 0
+    for piece in pieces:
+        if isinstance(piece, str):
+            written[-1] += piece
+            continue
+        found = next((k for k in range(position, len(items)) if items[k][0] == sre_constants.SUBPATTERN
+                      and items[k][1][-1] is piece), None)
+        if found is None:
+            return None
+        segments[-1] = items[position:found]
+        copies.append(items[found])
+        segments.append([])
+        written.append('')
+        position = found + 1
+    segments[-1] = items[position:]
+
+    windows = []
+    for i, (segment, text) in enumerate(zip(segments, written)):
+        head = 0
+        while head < len(segment) and head < len(text) and _literal(segment[head], text[head]):
+            head += 1
+        tail = 0
+        while (tail < len(segment) - head and tail < len(text) - head
+               and _literal(segment[-1 - tail], text[-1 - tail])):
+            tail += 1
+        old = segment[head:len(segment) - tail]
+        new = text[head:len(text) - tail]
+        if not old and not new:
+            continue
+        kept_before, kept_after = text[:head], text[len(text) - tail:]
+        old_before = [piece for j in range(i) for piece in (segments[j], [copies[j]])] + [kept_before]
+        old_after = [kept_after] + [piece for j in range(i + 1, len(segments)) for piece in ([copies[j - 1]], segments[j])]
+        new_before = [piece for j in range(i) for piece in (written[j], copies[j][1][-1])] + [kept_before]
+        new_after = [kept_after] + [piece for j in range(i + 1, len(segments)) for piece in (copies[j - 1][1][-1], written[j])]
+        replaced = None
+        if old and len(old) == len(new) and all(op == sre_constants.LITERAL for op, av in old):
+            # A plain substitution: each changed character only counts where
+            # a rule reads the old and the new one differently
+            replaced = ''.join(chr(av) for op, av in old)
+            old = replaced
+        windows.append(((old_before, [old] if old else [], old_after, new if replaced else None),
+                        (new_before, [new] if new else [], new_after, replaced)))
+    return windows
+
+
+class Analysis:
+    def __init__(self, pipeline):
+        self.pipeline = list(pipeline)
+        self.steps = pipeline_steps(self.pipeline)
+        parsed = [parse(step.pattern) for step in self.steps]
+        outputs = [parse(step.output) for step in self.steps if step.output is not None]
+        alphabet = Alphabet(parsed + outputs, [step.replacement for step in self.steps if step.replacement])
+        self.alphabet = alphabet
+        for step, tree in zip(self.steps, parsed):
+            try:
+                step.shape = _shape(step, alphabet, tree)
+                step.windows = _windows(step)
+            except Unsupported as e:
+                step.problem = str(e)
+
+        # feeds[i] holds every j whose pattern the output of step i can complete
+        self.feeds = []
+        for a in self.steps:
+            self.feeds.append({j for j, b in enumerate(self.steps) if self._feeds(a, b)})
+
+    def _feeds(self, a, b):
+        if not a.known or not b.known:
+            return True
+        if a.windows is None:
+            return any(can_overlap(b.shape[0], output) for output in a.shape[1])
+        return any(touches(b.shape[0], self.alphabet, *new) for old, new in a.windows)
+
+    def _spoils(self, a, b):
+        # True if a can change text a match of b takes in
+        if a.windows is None:
+            return can_overlap(a.shape[2], b.shape[2])
+        return any(touches(b.shape[2], self.alphabet, *old) for old, new in a.windows)
+
+    def _reachable(self, start):
+        seen = set()
+        stack = list(self.feeds[start])
+        while stack:
+            j = stack.pop()
+            if j not in seen:
+                seen.add(j)
+                stack.extend(self.feeds[j] - seen)
+        return seen
+
+    def cycles(self):
+        # Groups of rules that can keep feeding each other, as lists of steps
+        reach = [self._reachable(i) for i in range(len(self.steps))]
+        found = []
+        grouped = set()
+        for i in range(len(self.steps)):
+            if i in grouped or i not in reach[i]:
+                continue
+            group = sorted(j for j in reach[i] if i in reach[j])
+            grouped.update(group)
+            found.append([self.steps[j] for j in group])
+        return found
+
+    def backward(self):
+        return [(self.steps[i], self.steps[j]) for i, fed in enumerate(self.feeds) for j in sorted(fed) if j <= i]
+
+    def competing(self):
+        found = []
+        for i, a in enumerate(self.steps):
+            for b in self.steps[i + 1:]:
+                if not a.known or not b.known or a.output is not None or b.output is not None:
+                    continue
+                if a.replacement != b.replacement and (self._spoils(a, b) or self._spoils(b, a)):
+                    found.append((a, b))
+        return found
+
+    @property
+    def one_pass(self):
+        return not any(j <= i for i, fed in enumerate(self.feeds) for j in fed)
+
+    def report(self):
+        lines = [f'{",".join(self.pipeline)}: {len(self.steps)} rules, '
+                 + ('settles in one pass' if self.one_pass else 'needs repeated passes')]
+        for step in self.steps:
+            if not step.known:
+                lines.append(f'  unchecked {step.name} {step.rule!r}: {step.problem}')
+        for group in self.cycles():
+            lines.append(f'  cycle {", ".join(step.name for step in group)}')
+        in_cycle = {step.name for group in self.cycles() for step in group}
+        for a, b in self.backward():
+            if a.name not in in_cycle or b.name not in in_cycle:
+                lines.append(f'  backward {a.name} {a.rule!r} -> {b.name} {b.rule!r}')
+        for a, b in self.competing():
+            lines.append(f'  compete {a.name} {a.rule!r} / {b.name} {b.rule!r}')
+        return lines
+
+
+_analyses = {}
+
+
+def analyze(pipeline):
+    key = tuple(pipeline)
+    if key not in _analyses:
+        _analyses[key] = Analysis(pipeline)
+    return _analyses[key]
+
+
+def is_one_pass(pipeline):
+    return rule_cache.cached('one_pass', tuple(pipeline), lambda: analyze(pipeline).one_pass)
+
+
+def _digest(content):
+    return hashlib.sha1(content if isinstance(content, bytes) else content.encode('utf-8')).digest()
+
+
+def run_to_fixpoint(content, pipeline, max_iterations=MAX_ITERATIONS, path=None):
+    # Returns (content, passes, status); status is 'stable', 'oscillating'
+    # (a pass brought back an earlier text) or 'capped'
+    if is_one_pass(pipeline):
+        return transforms.apply_pipeline(content, pipeline, path), 1, 'stable'
+
+    seen = {_digest(content): 0}
+    for passes in range(1, max_iterations + 1):
+        fixed = transforms.apply_pipeline(content, pipeline, path)
+        if fixed == content:
+            return content, passes, 'stable'
+        digest = _digest(fixed)
+        if digest in seen:
+            return fixed, passes, 'oscillating'
+        seen[digest] = passes
+        content = fixed
+    return content, max_iterations, 'capped'
+
+
+if __name__ == '__main__':
+    from fix_parallel import EXTENSIONS, SKIP_FILES, TARGETS
+    from git_changes import GitError, changed_files
+    from prefilter import may_change
+    from trigram_index import pipeline_candidates
+
+    parser = argparse.ArgumentParser(description='Run the repair transforms until the sources stop changing')
+    parser.add_argument('--apps', default='customer,partner,admin', help='comma-separated apps to process')
+    parser.add_argument('--pipeline', help='comma-separated transforms to run instead of each app\'s default')
+    parser.add_argument('--max-iterations', type=int, default=MAX_ITERATIONS)
+    parser.add_argument('--analyze', action='store_true', help='only report rule conflicts, do not touch files')
+    parser.add_argument('--dry-run', action='store_true', help='print unified diffs instead of writing files')
+    parser.add_argument('--since', help='only process files changed since this git ref, plus untracked ones')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    apps = args.apps.split(',')
+    pipelines = {app: args.pipeline.split(',') if args.pipeline else TARGETS[app][1] for app in apps}
+
+    if args.analyze:
+        for pipeline in dict.fromkeys(tuple(p) for p in pipelines.values()):
+            print('\n'.join(analyze(pipeline).report()))
+        raise SystemExit(0)
+
+    if args.since:
+        try:
+            changed_files(args.since, ROOT)
+        except GitError as e:
+            parser.error(f'--since {args.since}: {e}')
+
+    writer = BatchWriter(args.dry_run)
+    unsettled = 0
+    for app in apps:
+        pipeline = pipelines[app]
+        candidates = pipeline_candidates([TARGETS[app][0]], pipeline, since=args.since)
+        for filepath in source_files(TARGETS[app][0], EXTENSIONS, skip_dts=True, since=args.since):
+            if filepath.replace(os.sep, '/').endswith(SKIP_FILES) or os.path.abspath(filepath) not in candidates:
+                continue
+            if not may_change(filepath, pipeline):
+                writer.skip()
+                continue
+            with open(filepath, 'rb') as f:
+                content = f.read()
+            try:
+                fixed, passes, status = run_to_fixpoint(content, pipeline, args.max_iterations, filepath)
+            except RuleTimeout as e:
+                unsettled += 1
+                print(f'Warning: {filepath} skipped, {e}')
+                continue
+            if writer.write_bytes(filepath, fixed, content):
+                print(f'Fixed: {filepath} ({passes} passes)')
+            if status != 'stable':
+                unsettled += 1
+                print(f'Warning: {filepath} {status} after {passes} passes')
+
+    writer.flush()
+    print(f'\n{writer.summary()}, {unsettled} did not settle')
@@ -0,0 +1,52 @@
+import os
+import subprocess
+
+# Files a branch has touched, from the local git repository.
+#
+# The list is everything that differs between the working tree and the merge
+# base of a ref and HEAD (commits on the branch plus staged and unstaged
+# edits), together with untracked files git does not ignore. Deleted files
+# drop out; a rename counts as its new path. Only git's own listings are read,
+# so the cost grows with the change, not with the size of the tree.
+
+
+class GitError(Exception):
+    pass
+
+
+def git(args, cwd, input=None):
+    # git's output as text; GitError with its message when it fails
+    try:
+        result = subprocess.run(['git', *args], cwd=cwd, input=input, capture_output=True)
+    except FileNotFoundError:
+        raise GitError('git is not installed')
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', 'replace').strip()
+        raise GitError(message or f'git {args[0]} failed')
+    return result.stdout.decode('utf-8', 'surrogateescape')
+
+
+def changed_since(ref, cwd=None):
+    # Absolute paths of the files changed since ref that still exist
+    cwd = cwd or os.getcwd()
+    top = git(['rev-parse', '--show-toplevel'], cwd).strip()
+    base = git(['merge-base', ref, 'HEAD'], cwd).strip()
+    names = git(['diff', '--name-only', '--no-renames', '--diff-filter=d', '-z', base, '--'], top).split('\0')
+    names += git(['ls-files', '--others', '--exclude-standard', '-z'], top).split('\0')
+    paths = set()
+    for name in names:
+        path = os.path.join(top, name)
+        if name and os.path.isfile(path):
+            paths.add(os.path.normpath(path))
+    return paths
+
+
+_changed = {}
+
+
+def changed_files(ref, cwd=None):
+    # changed_since, asked of git once per ref and process
+    key = (ref, cwd or os.getcwd())
+    if key not in _changed:
+        _changed[key] = changed_since(*key)
+    return _changed[key]
@@ -0,0 +1,292 @@
+import bisect
+import re
+from array import array
+from itertools import islice
+from operator import lt
+from re import Match
+
+import rule_cache
+import rule_profile
+from edit_buffer import EditBuffer
+from rule_table import LITERAL_PACKS, ordered_rules, rule_names
+
+# Applies an ordered list of (old, new) literal rules with as few scans as possible.
+#
+# Chained content.replace calls are only equivalent to one simultaneous scan when
+# the rules cannot interact, so the list is split into stages: a rule joins the
+# current stage only if its pattern cannot overlap any pattern already in the
+# stage (so the matches are disjoint) and cannot overlap any replacement already
+# in the stage (so an earlier rule cannot create a match for it). Each stage is
+# then one left-to-right scan, and the output is identical to the chained calls.
+# compile_packs first drops the rules rule_optimizer proves dead and regroups
+# the rest; the scans are kept in the rule cache.
+#
+# The stages record their matches in an EditBuffer rather than each building
+# the text anew. The buffer is only built before a stage that could match what
+# an earlier one wrote or that fires too often for its edits to be worth
+# keeping (EDIT_COST), and once at the end.
+#
+# A literal matches the UTF-8 bytes of a text exactly where it matches the
+# text, so a stage also scans the raw bytes of a file, without decoding them.
+
+
+def overlaps(a, b):
+    # True when a and b can share characters in some text
+    if not a or not b:
+        return True
+    if a in b or b in a:
+        return True
+    for k in range(1, min(len(a), len(b))):
+        if a.endswith(b[:k]) or b.endswith(a[:k]):
+            return True
+    return False
+
+
+def plan_stages(rules):
+    stages = []
+    current = []
+    for old, new in rules:
+        if not old:
+            raise ValueError('Empty pattern in literal rule')
+        if any(overlaps(old, o) or overlaps(old, n) for o, n in current):
+            stages.append(current)
+            current = []
+        current.append((old, new))
+    if current:
+        stages.append(current)
+    return stages
+
+
+def common_substring(patterns):
+    # Longest substring shared by every pattern; if it is absent from a file,
+    # no rule in the stage can fire and the stage is skipped after one search
+    shortest = min(patterns, key=len)
+    for size in range(len(shortest), 0, -1):
+        for start in range(len(shortest) - size + 1):
+            candidate = shortest[start:start + size]
+            if all(candidate in p for p in patterns):
+                return candidate
+    return ''
+
+
+def trie_pattern(patterns):
+    # One regex for the patterns with their shared prefixes merged, so
+    # navigate('/login`) and navigate("/login`) cost one test of navigate(
+    root = {}
+    for pattern in patterns:
+        node = root
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items())]
+        if len(branches) <= 1:
+            return ''.join(branches)
+        return '(?:' + '|'.join(branches) + ')'
+    return emit(root)
+
+
+def plan_scans(rules):
+    # [(rule count, anchor)] for each stage of rules, in order
+    return [(len(stage), common_substring([old for old, new in stage])) for stage in plan_stages(rules)]
+
+
+# Bytes of text that cost about as much to copy as one edit costs to keep: a
+# stage that fires more often than once per this many bytes builds the text
+EDIT_COST = 2000
+
+
+class Stage:
+    def __init__(self, rules, names=None, anchor=None):
+        self.rules = rules
+        self.table = dict(rules)
+        self.names = dict(zip([old for old, new in rules], names or [repr(old) for old, new in rules]))
+        self.label = self.names[rules[0][0]] + (f' +{len(rules) - 1}' if len(rules) > 1 else '')
+        # Patterns in a stage never overlap, so none is a prefix of another and
+        # at most one can match at any position: a trie of them is equivalent
+        self.regex = re.compile(trie_pattern(self.table))
+        self.anchor = common_substring(list(self.table)) if anchor is None else anchor
+        self.btable = {old.encode('utf-8'): new.encode('utf-8') for old, new in self.table.items()}
+        self.bregex = re.compile(self.regex.pattern.encode('utf-8'))
+        self.banchor = self.anchor.encode('utf-8')
+        self.seen = {}
+
+    def matchers(self, content):
+        if isinstance(content, bytes):
+            return self.btable, self.bregex, self.banchor
+        return self.table, self.regex, self.anchor
+
+    def sees(self, written):
+        # Whether a pattern of the stage can match part of one of these replacements
+        for new in written:
+            if new not in self.seen:
+                table = self.btable if isinstance(new, bytes) else self.table
+                self.seen[new] = any(overlaps(old, new) for old in table)
+            if self.seen[new]:
+                return True
+        return False
+
+    def record(self, buffer):
+        # Matches in the text the buffer's edits leave untouched, which is all
+        # the stage can match unless it sees one of buffer.written
+        text = buffer.text
+        table, regex, anchor = self.matchers(text)
+        if anchor and anchor not in text:
+            return
+        hits = [old for old in table if old in text]
+        if not hits:
+            return
+        # Past one match per EDIT_COST bytes, replacing in C over the built
+        # text is cheaper than keeping the edits
+        limit = len(text) // EDIT_COST
+        if len(hits) == 1:
+            old = hits[0]
+            starts = array('q')
+            start = text.find(old)
+            while start >= 0 and len(starts) <= limit:
+                starts.append(start)
+                start = text.find(old, start + len(old))
+            ends = array('q', [end + len(old) for end in starts])
+            replacements = [table[old]] * len(starts)
+        else:
+            matches = list(islice(regex.finditer(text), limit + 1))
+            starts = array('q', map(Match.start, matches))
+            ends = array('q', map(Match.end, matches))
+            replacements = list(map(table.__getitem__, map(Match.group, matches)))
+        if len(starts) > limit:
+            buffer.apply(lambda built: self.replace(built, hits))
+            return
+        if buffer and any(map(lt, map(buffer.next_start, starts), ends)):
+            starts, ends, replacements = self.gap_matches(buffer)
+        buffer.merge(starts, ends, replacements, self.label)
+
+    def gap_matches(self, buffer):
+        # The matches of a text some of whose matches run into the buffer's
+        # edits: each of those gives way to one that stops short of the edit
+        text = buffer.text
+        table, regex, anchor = self.matchers(text)
+        starts = array('q')
+        ends = array('q')
+        replacements = []
+        pos = 0
+        m = regex.search(text)
+        while m is not None:
+            start, end = m.span()
+            k = bisect.bisect_right(buffer.ends, start)
+            if k < len(buffer.starts) and buffer.starts[k] < end:
+                m = regex.search(text, pos, buffer.starts[k])
+                if m is None:
+                    pos = buffer.ends[k]
+                    m = regex.search(text, pos)
+                    continue
+                start, end = m.span()
+            starts.append(start)
+            ends.append(end)
+            replacements.append(table[m.group()])
+            pos = end
+            m = regex.search(text, pos)
+        return starts, ends, replacements
+
+    def apply(self, content):
+        if rule_profile.active is not None:
+            return self.apply_profiled(content, rule_profile.active)
+        table, regex, anchor = self.matchers(content)
+        if anchor and anchor not in content:
+            return content
+        hits = [old for old in table if old in content]
+        if not hits:
+            return content
+        return self.replace(content, hits)
+
+    def replace(self, content, hits):
+        # One copy of content with every match replaced; hits are the patterns it holds
+        table, regex, anchor = self.matchers(content)
+        if len(hits) == 1:
+            return content.replace(hits[0], table[hits[0]])
+        return regex.sub(lambda m: table[m.group()], content)
+
+    def apply_profiled(self, content, profiler):
+        started = rule_profile.clock()
+        size = rule_profile.size(content)
+        table, regex, anchor = self.matchers(content)
+        if anchor and anchor not in content:
+            profiler.scan(self.label, size, rule_profile.clock() - started, skipped=True)
+            return content
+        counts = dict.fromkeys(table, 0)
+
+        def replace(m):
+            counts[m.group()] += 1
+            return table[m.group()]
+        content = regex.sub(replace, content)
+
+        seconds = rule_profile.clock() - started
+        profiler.scan(self.label, size, seconds)
+        for (old, new), key in zip(self.table.items(), counts):
+            hits = counts[key]
+            profiler.rule(self.names[old], hits, hits * len(old.encode('utf-8')),
+                          hits * len(new.encode('utf-8')), seconds / len(self.rules))
+        return content
+
+
+class MultiReplacer:
+    def __init__(self, rules, names=None, plan=None):
+        self.rules = list(rules)
+        names = list(names) if names is not None else [f'rule#{i}' for i in range(len(self.rules))]
+        self.stages = []
+        start = 0
+        for size, anchor in plan or plan_scans(self.rules):
+            self.stages.append(Stage(self.rules[start:start + size], names[start:start + size], anchor))
+            start += size
+
+    def record(self, buffer):
+        for stage in self.stages:
+            if buffer.written and stage.sees(buffer.written):
+                buffer.flush()
+            stage.record(buffer)
+        return buffer
+
+    def apply(self, content):
+        if rule_profile.active is None:
+            return self.record(EditBuffer(content)).result()
+        for stage in self.stages:
+            content = stage.apply(content)
+        return content
+
+
+_compiled = {}
+
+
+def compile_packs(names, skip=()):
+    # The rules of the packs as rule_optimizer leaves them: no dead rules, in
+    # as few scans as they can share. skip names rules ('pack#index') to leave
+    # out, such as those out of scope for a file (rule_scope.skipped_rules)
+    from rule_optimizer import optimize, optimized_replacer
+
+    key = tuple(names) + tuple(skip)
+    if key not in _compiled:
+        rules = ordered_rules(names)
+        labels = rule_names(names)
+        if skip:
+            kept = [i for i, label in enumerate(labels) if label not in skip]
+            rules = [rules[i] for i in kept]
+            labels = [labels[i] for i in kept]
+        scans = rule_cache.cached('literal', key, lambda: optimize(rules)[0])
+        _compiled[key] = optimized_replacer(rules, labels, scans)
+    return _compiled[key]
+
+
+def apply_packs(content, names, skip=()):
+    return compile_packs(names, skip).apply(content)
+
+
+def apply_chained(content, rules):
+    # Reference implementation: what the scripts used to do
+    for old, new in rules:
+        content = content.replace(old, new)
+    return content
+
+
+if __name__ == '__main__':
+    for name, rules in LITERAL_PACKS.items():
+        replacer = MultiReplacer(rules)
+        print(f'{name}: {len(rules)} rules in {len(replacer.stages)} scans')
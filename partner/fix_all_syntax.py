@@ -1,42 +1,26 @@
 import os
-import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_index import root_path
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Fix the malformed quote patterns in the partner pages', since=False)
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
 
 def fix_file(filepath):
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        original = content
-        
         # Fix all malformed quote patterns
-        content = content.replace('`)', '")')
-        content = content.replace("'`)", "'\")")
-        content = content.replace('\'")', "')")
-        content = content.replace('`}', '"}')
-        content = content.replace('`);', '");')
-        content = content.replace("'`);", "');")
-        content = content.replace('`)', '")')
-        content = content.replace('`)', '")')
-        
-        # Fix specific patterns
-        content = re.sub(r'useState\(["\']`\)', "useState('')", content)
-        content = re.sub(r'getItem\(["\']([^"\']+)`\)', r"getItem('\1')", content)
-        content = re.sub(r'=== ["\']([^"\']+)`\)', r"=== '\1')", content)
-        content = re.sub(r'startsWith\(["\']([^"\']+)`\)', r"startsWith('\1')", content)
-        content = re.sub(r'push\(["\']([^"\']+)`\)', r"push('\1')", content)
-        content = re.sub(r'alert\(["\']([^"\']+)`\)', r"alert('\1')", content)
-        content = re.sub(r'replace\(([^,]+), ["\']`\)', r"replace(\1, '')", content)
-        
-        if content != original:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-            return True
-        return False
+        return fix_cached(filepath, ['partner/fix_all_syntax'], cache, writer)
     except Exception as e:
         print(f'Error fixing {filepath}: {e}')
         return False
 
-os.chdir('d:/OFFICE WORK/laundry-main/partner')
+os.chdir(root_path('partner'))
 
 files = [
     'src/components/BottomNav.tsx',
@@ -55,4 +39,8 @@ for file in files:
     else:
         print(f'Not found: {file}')
 
+writer.flush()
+cache.save()
+print(writer.summary())
+
 print('\nAll files fixed!')
@@ -1,47 +1,22 @@
 import os
-import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_index import root_path
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
+from trigram_index import pipeline_candidates, relative
+
+args = parse_args('Fix the calls with malformed quotes in the partner pages')
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
 
 def fix_file(filepath):
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        original = content
-        
-        # Fix useState with malformed quotes
-        content = re.sub(r"useState\(['\"]`\)", "useState('')", content)
-        content = re.sub(r"useState\(['\"]\"", "useState('')", content)
-        
-        # Fix getItem with malformed quotes
-        content = re.sub(r"getItem\('([^']+)`\)", r"getItem('\1')", content)
-        
-        # Fix replace with malformed quotes
-        content = re.sub(r"replace\(([^,]+),\s*['\"]`\)", r"replace(\1, '')", content)
-        content = re.sub(r"replace\(([^,]+),\s*['\"]\\s`\)", r"replace(\1, ' ')", content)
-        
-        # Fix router.push with malformed quotes
-        content = re.sub(r"push\(['\"]([^'\"]+)`\)", r"push('/\1')", content)
-        content = re.sub(r"push\(['\"]\/([^'\"]+)`\)", r"push('/\1')", content)
-        
-        # Fix alert with malformed quotes
-        content = re.sub(r"alert\(['\"]([^'\"]+)`\)", r"alert('\1')", content)
-        
-        # Fix join with malformed quotes
-        content = re.sub(r"join\(['\"],\s`\)", r"join(', ')", content)
-        
-        # Fix selectedReasons.push with malformed quotes
-        content = re.sub(r"push\('([^']+)`\)", r"push('\1')", content)
-        
-        # Fix === comparisons with malformed quotes
-        content = re.sub(r"===\s*['\"]([^'\"]+)`\)", r"=== '\1')", content)
-        
-        # Fix startsWith with malformed quotes
-        content = re.sub(r"startsWith\(['\"]([^'\"]+)`\)", r"startsWith('/\1')", content)
-        content = re.sub(r"startsWith\(['\"]\/([^'\"]+)`\)", r"startsWith('/\1')", content)
-        
-        if content != original:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+        # Fix useState, getItem, replace, push, alert, join, === and startsWith calls with malformed quotes
+        if fix_cached(filepath, ['partner/fix_comprehensive'], cache, writer):
             print(f'Fixed: {filepath}')
             return True
         else:
@@ -51,25 +26,17 @@ def fix_file(filepath):
         print(f'Error fixing {filepath}: {e}')
         return False
 
-os.chdir('d:/OFFICE WORK/laundry-main/partner')
+os.chdir(root_path('partner'))
 
-files = [
-    'src/app/check-availability/page.tsx',
-    'src/app/delivery/[id]/page.tsx',
-    'src/app/delivery/history/page.tsx',
-    'src/app/delivery/pick/page.tsx',
-    'src/app/hub/delivered/page.tsx',
-    'src/app/hub/drop/page.tsx',
-    'src/app/login/page.tsx',
-    'src/app/pickups/confirm/[id]/page.tsx',
-    'src/app/pickups/page.tsx',
-    'src/components/BottomNav.tsx',
-]
+# The pages in the transform's scope (transforms.TRANSFORM_SCOPES) that
+# contain a pattern the rules fix, from the trigram index
+files = relative(pipeline_candidates(['partner/src'], ['partner/fix_comprehensive'], since=args.since))
 
 for file in files:
-    if os.path.exists(file):
-        fix_file(file)
-    else:
-        print(f'Not found: {file}')
+    fix_file(file)
+
+writer.flush()
+cache.save()
+print(writer.summary())
 
 print('\nAll files processed!')
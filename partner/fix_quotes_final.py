@@ -1,41 +1,31 @@
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_index import root_path
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Fix the mismatched quotes left in the partner pages', since=False)
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
 
 def fix_file(filepath):
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        fixed_lines = []
-        for line in lines:
-            # Fix single quote start with double quote end
-            line = line.replace("'profile\")", "'profile')")
-            line = line.replace("'partnerId\")", "'partnerId')")
-            line = line.replace("'react\"", "'react'")
-            line = line.replace("'contain\"", "'contain'")
-            line = line.replace("useState(''))", "useState('')")
-            line = line.replace("useState(''))", "useState('')")
-            
-            # Fix template literals with wrong ending
-            if '`http://localhost:3000' in line and line.strip().endswith('");'):
-                line = line.replace('");', '`);')
-            if '`http://localhost:3000' in line and line.strip().endswith('\");'):
-                line = line.replace('\");', '`);')
-            if '`${API_URL}' in line and line.strip().endswith('");'):
-                line = line.replace('");', '`);')
-            if '`${API_URL}' in line and line.strip().endswith('\");'):
-                line = line.replace('\");', '`);')
-                
-            fixed_lines.append(line)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.writelines(fixed_lines)
-        print(f'Fixed: {filepath}')
-        return True
+        # Fix single quote start with double quote end and template literals with wrong ending
+        if fix_cached(filepath, ['partner/fix_quotes_final'], cache, writer):
+            print(f'Fixed: {filepath}')
+            return True
+        else:
+            print(f'No changes: {filepath}')
+            return False
     except Exception as e:
         print(f'Error fixing {filepath}: {e}')
         return False
 
-os.chdir('d:/OFFICE WORK/laundry-main/partner')
+os.chdir(root_path('partner'))
 
 files = [
     'src/components/BottomNav.tsx',
@@ -51,4 +41,8 @@ for file in files:
     else:
         print(f'Not found: {file}')
 
+writer.flush()
+cache.save()
+print(writer.summary())
+
 print('\nAll files fixed!')
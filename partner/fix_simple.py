@@ -1,23 +1,22 @@
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_index import root_path
+from fix_cache import FixCache, fix_cached
+from safe_write import BatchWriter
+from script_args import parse_args
+from trigram_index import pipeline_candidates, relative
+
+args = parse_args('Fix the common malformed quote patterns in the partner app')
+cache = FixCache()
+writer = BatchWriter(args.dry_run)
 
 def fix_file(filepath):
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        original = content
-        
         # Simple string replacements for common patterns
-        content = content.replace("'partnerId`)", "'partnerId')")
-        content = content.replace("'all`)", "'all')")
-        content.replace("replace('_', ' `)", "replace('_', ' ')")
-        
-        # Fix the specific line in delivery/[id]/page.tsx
-        content = content.replace(".replace('_', ' `)", ".replace('_', ' ')")
-        
-        if content != original:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+        if fix_cached(filepath, ['partner/fix_simple'], cache, writer):
             print(f'Fixed: {filepath}')
             return True
         else:
@@ -27,25 +26,16 @@ def fix_file(filepath):
         print(f'Error fixing {filepath}: {e}')
         return False
 
-os.chdir('d:/OFFICE WORK/laundry-main/partner')
-
-files = [
-    'src/app/check-availability/page.tsx',
-    'src/app/delivery/[id]/page.tsx',
-    'src/app/delivery/history/page.tsx',
-    'src/app/delivery/pick/page.tsx',
-    'src/app/hub/delivered/page.tsx',
-    'src/app/hub/drop/page.tsx',
-    'src/app/login/page.tsx',
-    'src/app/pickups/confirm/[id]/page.tsx',
-    'src/app/pickups/page.tsx',
-    'src/components/BottomNav.tsx',
-]
+os.chdir(root_path('partner'))
+
+# The files containing a pattern the rules fix, from the trigram index
+files = relative(pipeline_candidates(['partner/src'], ['partner/fix_simple'], since=args.since))
 
 for file in files:
-    if os.path.exists(file):
-        fix_file(file)
-    else:
-        print(f'Not found: {file}')
+    fix_file(file)
+
+writer.flush()
+cache.save()
+print(writer.summary())
 
 print('\nAll files processed!')
@@ -0,0 +1,209 @@
+import argparse
+import contextlib
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+
+import structure
+import transforms
+from file_index import ROOT
+from fix_parallel import EXTENSIONS, SKIP_FILES, TARGETS
+from git_changes import GitError, git
+from prefilter import prefilter
+from regex_rules import RuleTimeout
+from rule_scope import scoped
+from safe_write import BatchWriter, diff_lines
+
+# Pre-commit hook that repairs what is staged, not what is on disk.
+#
+# The staged blobs of the app sources come from the index (git diff-index
+# --cached), are read through one git cat-file --batch process for the whole
+# commit, and are run through each app's pipeline in memory. The repaired
+# blobs go to temp files that one git hash-object -w --stdin-paths stores, and
+# all the new entries go into the index in one git update-index --index-info,
+# so the commit gets the fixed text
+# while the working tree is left alone and no dev server sees a change. The
+# prefilter and the structure check apply exactly as they do to files.
+#
+# With --sync-worktree a working copy that is byte for byte the staged blob
+# is rewritten too; partially staged files never are.
+#
+#   python precommit.py --install       set it up as .git/hooks/pre-commit
+
+HOOK = '''#!/bin/sh
+exec python3 "{script}" "$@"
+'''
+
+
+def staged_blobs(top):
+    # [(path relative to top, mode, blob id)] for added, copied and modified entries
+    head = 'HEAD'
+    try:
+        git(['rev-parse', '--verify', '-q', 'HEAD'], top)
+    except GitError:
+        # First commit: everything staged is new against the empty tree
+        head = git(['hash-object', '-t', 'tree', '--stdin'], top, b'').strip()
+    fields = git(['diff-index', '--cached', '-z', '--no-renames', '--diff-filter=ACM', head], top).split('\0')
+    blobs = []
+    for info, path in zip(fields[0::2], fields[1::2]):
+        old_mode, mode, old_blob, blob, status = info[1:].split(' ')
+        if stat.S_ISREG(int(mode, 8)):
+            blobs.append((path, mode, blob))
+    return blobs
+
+
+def read_blobs(blob_ids, top):
+    # Yields (blob id, bytes) in order from a single git cat-file --batch. The
+    # requests go in from a thread, so a large commit cannot fill both pipes
+    process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=top, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def feed():
+        try:
+            process.stdin.write(''.join(f'{blob}\n' for blob in blob_ids).encode('ascii'))
+            process.stdin.close()
+        except OSError:
+            # The reader stopped early and cat-file is gone
+            pass
+    thread = threading.Thread(target=feed)
+    thread.start()
+    try:
+        for blob in blob_ids:
+            header = process.stdout.readline().split()
+            if len(header) < 3:
+                yield blob, None
+                continue
+            data = process.stdout.read(int(header[2]))
+            process.stdout.read(1)
+            yield blob, data
+    finally:
+        # Closed first, so a cat-file still writing stops instead of blocking the feed
+        process.stdout.close()
+        thread.join()
+        process.wait()
+
+
+def app_of(path):
+    for app, (directory, pipeline) in TARGETS.items():
+        if path.startswith(directory + '/'):
+            return app
+    return None
+
+
+def select(blobs, top, pipeline=None):
+    # [(path, mode, blob id, pipeline)] for the staged app sources
+    selected = []
+    for path, mode, blob in blobs:
+        relative = os.path.relpath(os.path.join(top, path), ROOT).replace(os.sep, '/')
+        app = app_of(relative)
+        if app is None or not relative.endswith(EXTENSIONS) or relative.endswith(('.d.ts',) + SKIP_FILES):
+            continue
+        selected.append((path, mode, blob, pipeline or TARGETS[app][1]))
+    return selected
+
+
+def repair(data, path, pipeline):
+    # Returns (fixed bytes or None if unchanged, structure problem or None);
+    # path is where the file is checked out, for its scope and its structure
+    gate = prefilter(scoped(path, pipeline)[0])
+    if gate.triggers is not None and not gate.matches(data):
+        return None, None
+    try:
+        fixed = transforms.apply_pipeline(data, pipeline, path)
+    except UnicodeDecodeError:
+        return None, None
+    except RuleTimeout as e:
+        return None, e
+    if fixed == data:
+        return None, None
+    problem = structure.regression(path, data, fixed)
+    if problem is not None:
+        return None, problem
+    return fixed, None
+
+
+def store_blobs(files, top):
+    # The blob ids of the files, stored by one git hash-object
+    if not files:
+        return []
+    return git(['hash-object', '-w', '--no-filters', '--stdin-paths'], top,
+               ''.join(f'{path}\n' for path in files).encode('utf-8', 'surrogateescape')).split()
+
+
+def run(pipeline=None, dry_run=False, sync_worktree=False, cwd=ROOT):
+    # Returns (checked, repaired paths, rolled back [(path, problem)])
+    top = git(['rev-parse', '--show-toplevel'], cwd).strip()
+    selected = select(staged_blobs(top), top, pipeline)
+    staged = []
+    repaired = []
+    rolled_back = []
+    writer = BatchWriter(validate=False)
+    with tempfile.TemporaryDirectory() as scratch, \
+            contextlib.closing(read_blobs([blob_id for path, mode, blob_id, file_pipeline in selected], top)) as blobs:
+        for (path, mode, blob_id, file_pipeline), (read_id, data) in zip(selected, blobs):
+            if data is None:
+                continue
+            fixed, problem = repair(data, os.path.join(top, path), file_pipeline)
+            if problem is not None:
+                rolled_back.append((path, problem))
+                continue
+            if fixed is None:
+                continue
+            repaired.append(path)
+            if dry_run:
+                sys.stdout.writelines(diff_lines(path, data, fixed))
+                continue
+            scratch_file = os.path.join(scratch, str(len(staged)))
+            with open(scratch_file, 'wb') as f:
+                f.write(fixed)
+            staged.append((mode, path, scratch_file))
+            if sync_worktree:
+                worktree = os.path.join(top, path)
+                with open(worktree, 'rb') as f:
+                    if f.read() != data:
+                        continue
+                writer.write_bytes(worktree, fixed)
+        new_blobs = store_blobs([scratch_file for mode, path, scratch_file in staged], top)
+
+    writer.flush()
+    if staged:
+        entries = [f'{mode} {new_blob}\t{path}\0' for (mode, path, scratch_file), new_blob in zip(staged, new_blobs)]
+        git(['update-index', '-z', '--index-info'], top, ''.join(entries).encode('utf-8'))
+    return len(selected), repaired, rolled_back
+
+
+def install(cwd=ROOT):
+    hooks = git(['rev-parse', '--git-path', 'hooks'], cwd).strip()
+    path = os.path.join(cwd, hooks, 'pre-commit')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(HOOK.format(script=os.path.abspath(__file__).replace(os.sep, '/')))
+    os.chmod(path, 0o755)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Repair the staged app sources in the git index')
+    parser.add_argument('--pipeline', help='comma-separated transforms to run instead of each app\'s default')
+    parser.add_argument('--dry-run', action='store_true', help='print unified diffs instead of updating the index')
+    parser.add_argument('--sync-worktree', action='store_true', help='also rewrite working copies that match the staged blob')
+    parser.add_argument('--install', action='store_true', help='install this script as the pre-commit hook')
+    args = parser.parse_args()
+
+    try:
+        if args.install:
+            print(f'Installed {install()}')
+            sys.exit(0)
+        checked, repaired, rolled_back = run(args.pipeline.split(',') if args.pipeline else None,
+                                             args.dry_run, args.sync_worktree)
+    except GitError as e:
+        parser.error(str(e))
+
+    for path in repaired:
+        print(f'{"Would fix" if args.dry_run else "Fixed in the index"}: {path}')
+    for path, problem in rolled_back:
+        print(f'Rolled back: {path} {problem}')
+    print(f'{checked} staged sources checked, {len(repaired)} {"would be repaired" if args.dry_run else "repaired"}, '
+          f'{len(rolled_back)} rolled back')
@@ -0,0 +1,184 @@
+import mmap
+import os
+
+import rule_cache
+import transforms
+from multi_replace import common_substring
+from regex_overlap import parse, sre_constants
+from regex_rules import REGEX_PACKS
+from rule_scope import scoped
+from rule_table import LITERAL_PACKS
+
+# Quick reject of files no rule in a pipeline can touch.
+#
+# Every rule has a trigger: a substring each of its matches contains (a literal
+# rule's pattern, the longest literal run a regex cannot match without, or the
+# guard a whole transform is gated on). If none of a pipeline's triggers occurs
+# in a file, no transform can change it, and neither can any later one, since
+# the text stays the same.
+#
+# The check runs on the raw bytes, so a rejected file is never decoded. Large
+# files are searched through a read-only mmap and never copied into memory;
+# below MMAP_THRESHOLD one read() is cheaper than setting up the mapping.
+# Triggers are grouped by a substring they share (most contain a backtick and a
+# parenthesis), and the search is one find() per group anchor, then one per
+# trigger of the groups whose anchor occurs; on these short patterns that beats
+# a regex alternation by a wide margin.
+#
+# A transform whose rules have no trigger (the ts_literals scanner can act on
+# any quote) turns the prefilter off for the pipelines it is in.
+#
+# may_change counts only the transforms in scope for the file (rule_scope.py),
+# so a file no transform of the pipeline is meant for is never opened.
+
+MMAP_THRESHOLD = 64 * 1024
+MIN_ANCHOR = 2
+
+
+def _flatten(parsed):
+    # Top-level sequence with plain groups inlined, so literal runs continue through them
+    for op, av in parsed:
+        if op == sre_constants.SUBPATTERN:
+            yield from _flatten(av[-1])
+        else:
+            yield op, av
+
+
+def _selectivity(options):
+    # Backticks are rare outside template literals, so a run with one rejects
+    # more files than any longer run of plain code; then longer is better
+    return all('`' in option for option in options), min(len(option) for option in options)
+
+
+def _better(best, candidate):
+    if candidate is None:
+        return best
+    if best is None or _selectivity(candidate) > _selectivity(best):
+        return candidate
+    return best
+
+
+def required_literals(parsed):
+    # A list of strings, one of which every match contains, or None
+    best = None
+    run = []
+    for op, av in _flatten(parsed):
+        if op == sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            best = _better(best, [''.join(run)])
+            run = []
+        if op == sre_constants.BRANCH:
+            options = [required_literals(branch) for branch in av[1]]
+            if all(option is not None for option in options):
+                best = _better(best, [text for option in options for text in option])
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            best = _better(best, required_literals(av[2]))
+    if run:
+        best = _better(best, [''.join(run)])
+    return best
+
+
+def transform_triggers(name):
+    # Substrings one of which must be present for the transform to change a file, or None
+    guard = transforms.TRANSFORM_GUARDS.get(name)
+    if guard is not None:
+        return [guard]
+    triggers = []
+    for step in transforms.TRANSFORM_STEPS[name]:
+        if step[0] == 'literal':
+            triggers.extend(old for old, new in LITERAL_PACKS[step[1]] if old != new)
+            continue
+        patterns = [pattern for pattern, _ in REGEX_PACKS[step[1]]] if step[0] == 'regex' else [step[1]]
+        for pattern in patterns:
+            required = required_literals(parse(pattern))
+            if required is None:
+                return None
+            triggers.extend(required)
+    return triggers
+
+
+def minimal(triggers):
+    # A trigger containing another is implied by it, so only the shortest are kept
+    kept = []
+    for text in sorted(set(triggers), key=len):
+        if not any(shorter in text for shorter in kept):
+            kept.append(text)
+    return kept
+
+
+def group_by_anchor(triggers):
+    # [(anchor, triggers)]: each trigger joins the first group it still shares
+    # at least MIN_ANCHOR characters with
+    groups = []
+    for trigger in triggers:
+        for group in groups:
+            anchor = common_substring(group[1] + [trigger])
+            if len(anchor) >= MIN_ANCHOR:
+                group[0] = anchor
+                group[1].append(trigger)
+                break
+        else:
+            groups.append([trigger, [trigger]])
+    return [(anchor, members) for anchor, members in groups]
+
+
+def pipeline_triggers(pipeline):
+    triggers = []
+    for name in pipeline:
+        found = transform_triggers(name)
+        if found is None:
+            return None
+        triggers.extend(found)
+    return minimal(triggers)
+
+
+class Prefilter:
+    def __init__(self, pipeline):
+        self.pipeline = list(pipeline)
+        self.triggers = rule_cache.cached('triggers', tuple(pipeline), lambda: pipeline_triggers(self.pipeline))
+        self.groups = group_by_anchor([t.encode('utf-8') for t in self.triggers or []])
+
+    def matches(self, data):
+        for anchor, members in self.groups:
+            if data.find(anchor) == -1:
+                continue
+            if len(members) == 1 or any(data.find(trigger) != -1 for trigger in members):
+                return True
+        return False
+
+    def may_change(self, filepath):
+        if self.triggers is None:
+            return True
+        if not self.triggers:
+            return False
+        with open(filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return False
+            if size < MMAP_THRESHOLD:
+                return self.matches(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return self.matches(m)
+
+
+_prefilters = {}
+
+
+def prefilter(pipeline):
+    key = tuple(pipeline)
+    if key not in _prefilters:
+        _prefilters[key] = Prefilter(pipeline)
+    return _prefilters[key]
+
+
+def may_change(filepath, pipeline):
+    # Only the transforms in scope for the file can change it
+    return prefilter(scoped(filepath, pipeline)[0]).may_change(filepath)
+
+
+if __name__ == '__main__':
+    for name in transforms.TRANSFORMS:
+        p = Prefilter([name])
+        print(f'{name}: ' + ('no prefilter' if p.triggers is None else ', '.join(repr(t) for t in p.triggers)))
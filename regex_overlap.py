@@ -0,0 +1,606 @@
+import re
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+# Static checks on the regex rules, done on small NFAs built from the parsed
+# patterns. Characters the patterns never mention are folded into one OTHER
+# symbol, so every answer errs on the side of "these can overlap".
+
+OTHER = None
+MAX_EXPANDED_REPEAT = 16
+MAX_ALTERNATIVES = 16
+
+CATEGORY_CHARS = {
+    sre_constants.CATEGORY_DIGIT: '0123456789',
+    sre_constants.CATEGORY_SPACE: ' \t\n\r\f\v',
+    sre_constants.CATEGORY_WORD: 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_',
+}
+NEGATED_CATEGORIES = {
+    sre_constants.CATEGORY_NOT_DIGIT: sre_constants.CATEGORY_DIGIT,
+    sre_constants.CATEGORY_NOT_SPACE: sre_constants.CATEGORY_SPACE,
+    sre_constants.CATEGORY_NOT_WORD: sre_constants.CATEGORY_WORD,
+}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def parse(pattern):
+    if isinstance(pattern, re.Pattern):
+        pattern = pattern.pattern
+    return sre_parse.parse(pattern)
+
+
+def _mentioned(parsed, chars):
+    for op, av in parsed:
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL):
+            chars.add(chr(av))
+        elif op == sre_constants.IN:
+            for item_op, item_av in av:
+                if item_op == sre_constants.LITERAL:
+                    chars.add(chr(item_av))
+                elif item_op == sre_constants.RANGE and item_av[1] - item_av[0] < 256:
+                    chars.update(chr(c) for c in range(item_av[0], item_av[1] + 1))
+                elif item_op == sre_constants.CATEGORY:
+                    category = NEGATED_CATEGORIES.get(item_av, item_av)
+                    chars.update(CATEGORY_CHARS.get(category, ''))
+        elif op == sre_constants.SUBPATTERN:
+            _mentioned(av[-1], chars)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            _mentioned(av[2], chars)
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                _mentioned(branch, chars)
+        elif op == sre_constants.ANY:
+            chars.add('\n')
+    return chars
+
+
+class Alphabet:
+    def __init__(self, parsed_patterns, literals=()):
+        chars = set()
+        for parsed in parsed_patterns:
+            _mentioned(parsed, chars)
+        for text in literals:
+            chars.update(text)
+        self.symbols = frozenset(chars) | {OTHER}
+
+    def symbol(self, ch):
+        return ch if ch in self.symbols else OTHER
+
+    def charset(self, op, av):
+        if op == sre_constants.LITERAL:
+            return frozenset([self.symbol(chr(av))])
+        if op == sre_constants.NOT_LITERAL:
+            return self.symbols - {chr(av)}
+        if op == sre_constants.ANY:
+            return self.symbols - {'\n'}
+        if op == sre_constants.IN:
+            negate = False
+            members = set()
+            for item_op, item_av in av:
+                if item_op == sre_constants.NEGATE:
+                    negate = True
+                elif item_op == sre_constants.LITERAL:
+                    members.add(self.symbol(chr(item_av)))
+                elif item_op == sre_constants.RANGE:
+                    if item_av[1] - item_av[0] < 256:
+                        members.update(chr(c) for c in range(item_av[0], item_av[1] + 1))
+                    members.add(OTHER)
+                elif item_op == sre_constants.CATEGORY:
+                    if item_av in NEGATED_CATEGORIES:
+                        excluded = set(CATEGORY_CHARS[NEGATED_CATEGORIES[item_av]])
+                        members.update(self.symbols - excluded)
+                    else:
+                        members.update(CATEGORY_CHARS.get(item_av, ''))
+                    members.add(OTHER)
+                else:
+                    raise Unsupported(f'character class item {item_op}')
+            if negate:
+                # OTHER stands for many characters, so it survives negation
+                return (self.symbols - members) | {OTHER}
+            return frozenset(members & self.symbols)
+        raise Unsupported(f'opcode {op}')
+
+
+class NFA:
+    def __init__(self):
+        self.edges = []
+        self.epsilon = []
+
+    def state(self):
+        self.edges.append([])
+        self.epsilon.append([])
+        return len(self.edges) - 1
+
+    def closure(self, states):
+        seen = set(states)
+        stack = list(states)
+        while stack:
+            for nxt in self.epsilon[stack.pop()]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return frozenset(seen)
+
+
+class Fragment:
+    def __init__(self, nfa, start, accept):
+        self.nfa = nfa
+        self.start = start
+        self.accept = accept
+
+    def all_states(self):
+        return range(len(self.nfa.edges))
+
+
+def _build(nfa, alphabet, parsed, groups):
+    start = nfa.state()
+    current = start
+    for op, av in parsed:
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN):
+            nxt = nfa.state()
+            nfa.edges[current].append((alphabet.charset(op, av), nxt))
+            current = nxt
+        elif op == sre_constants.SUBPATTERN:
+            group = av[0]
+            sub_start, sub_end = _build(nfa, alphabet, av[-1], groups)
+            if group is not None:
+                groups[group] = av[-1]
+            nfa.epsilon[current].append(sub_start)
+            current = sub_end
+        elif op == sre_constants.BRANCH:
+            end = nfa.state()
+            for branch in av[1]:
+                sub_start, sub_end = _build(nfa, alphabet, branch, groups)
+                nfa.epsilon[current].append(sub_start)
+                nfa.epsilon[sub_end].append(end)
+            current = end
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            low, high, item = av
+            unbounded = high == sre_constants.MAXREPEAT or high > MAX_EXPANDED_REPEAT
+            for _ in range(min(low, MAX_EXPANDED_REPEAT)):
+                sub_start, sub_end = _build(nfa, alphabet, item, groups)
+                nfa.epsilon[current].append(sub_start)
+                current = sub_end
+            if unbounded:
+                sub_start, sub_end = _build(nfa, alphabet, item, groups)
+                nfa.epsilon[current].append(sub_start)
+                nfa.epsilon[sub_end].append(current)
+            else:
+                end = nfa.state()
+                nfa.epsilon[current].append(end)
+                for _ in range(high - low):
+                    sub_start, sub_end = _build(nfa, alphabet, item, groups)
+                    nfa.epsilon[current].append(sub_start)
+                    nfa.epsilon[sub_end].append(end)
+                    current = sub_end
+                current = end
+        else:
+            raise Unsupported(f'opcode {op}')
+    return start, current
+
+
+def build(parsed, alphabet):
+    nfa = NFA()
+    groups = {}
+    start, accept = _build(nfa, alphabet, parsed, groups)
+    state = getattr(parsed, 'state', None) or getattr(parsed, 'pattern', None)
+    for name, number in state.groupdict.items():
+        groups[name] = groups[number]
+    return Fragment(nfa, start, accept), groups
+
+
+def build_sequence(pieces, alphabet):
+    # pieces is a list of literal strings and parsed subpatterns, matched in order
+    nfa = NFA()
+    start = nfa.state()
+    current = start
+    for piece in pieces:
+        if isinstance(piece, str):
+            for ch in piece:
+                nxt = nfa.state()
+                nfa.edges[current].append((frozenset([alphabet.symbol(ch)]), nxt))
+                current = nxt
+        else:
+            sub_start, sub_end = _build(nfa, alphabet, piece, {})
+            nfa.epsilon[current].append(sub_start)
+            current = sub_end
+    return Fragment(nfa, start, current)
+
+
+def intersects(a, a_starts, a_accepts, b, b_starts, b_accepts):
+    # True if some non-empty string runs from a_starts to a_accepts in a and
+    # from b_starts to b_accepts in b
+    a_accepts = set(a_accepts)
+    b_accepts = set(b_accepts)
+    frontier = [(a.nfa.closure(a_starts), b.nfa.closure(b_starts))]
+    seen = set(frontier)
+    while frontier:
+        left, right = frontier.pop()
+        moves = {}
+        for s in left:
+            for chars, nxt in a.nfa.edges[s]:
+                for t in right:
+                    for other_chars, other_nxt in b.nfa.edges[t]:
+                        if chars & other_chars:
+                            moves.setdefault(frozenset(chars & other_chars), (set(), set()))
+                            moves[frozenset(chars & other_chars)][0].add(nxt)
+                            moves[frozenset(chars & other_chars)][1].add(other_nxt)
+        for left_next, right_next in moves.values():
+            pair = (a.nfa.closure(left_next), b.nfa.closure(right_next))
+            if pair[0] & a_accepts and pair[1] & b_accepts:
+                return True
+            if pair not in seen:
+                seen.add(pair)
+                frontier.append(pair)
+    return False
+
+
+def matches_empty(fragment):
+    return fragment.accept in fragment.nfa.closure([fragment.start])
+
+
+def can_overlap(a, b):
+    # True if a match of a and a match of b can share characters in some text
+    every_a = a.all_states()
+    every_b = b.all_states()
+    return (intersects(a, every_a, [a.accept], b, [b.start], every_b)
+            or intersects(b, every_b, [b.accept], a, [a.start], every_a)
+            or intersects(a, every_a, every_a, b, [b.start], [b.accept])
+            or intersects(b, every_b, every_b, a, [a.start], [a.accept]))
+
+
+def _append(nfa, fragment, edges=None):
+    # Copies fragment's states onto the end of nfa; returns the copies of its
+    # start and accept states and the range of all of them
+    first = len(nfa.edges)
+    for state in fragment.all_states():
+        copy = nfa.state()
+        nfa.edges[copy] = [(chars, nxt + first) for chars, nxt in (edges or fragment.nfa.edges)[state]]
+        nfa.epsilon[copy] = [nxt + first for nxt in fragment.nfa.epsilon[state]]
+    return fragment.start + first, fragment.accept + first, range(first, len(nfa.edges))
+
+
+def touches(fragment, alphabet, before, changed, after, replaced=None):
+    # True if a match of fragment can take in a character of changed in some
+    # text holding before + changed + after (pieces as for build_sequence),
+    # with anything at all around them. With changed empty the match has to
+    # span the join between before and after instead.
+    #
+    # replaced is the text changed stands in for, when both are plain text of
+    # the same length. A match then also has to read some changed character
+    # where fragment would not have taken the replaced one, since a match
+    # taking the old text as well was there all along
+    nfa = NFA()
+    everything = frozenset(alphabet.symbols)
+    # Text ahead of before: a match starting there has read a character of it
+    # by the time it reaches before
+    outside = nfa.state()
+    lead = nfa.state()
+    nfa.edges[outside].append((everything, lead))
+    nfa.edges[lead].append((everything, lead))
+    starts = [outside]
+    accepts = []
+
+    start, current, states = _append(nfa, build_sequence(before, alphabet))
+    nfa.epsilon[lead].append(start)
+    starts.extend(state for state in states if changed or state != current)
+
+    if changed:
+        # Two copies of changed: the second is reached by reading a character
+        # of it (one read differently from the replaced one, with replaced)
+        region = build_sequence(changed, alphabet)
+        if replaced is not None:
+            marked = [[] for _ in region.all_states()]
+            for state in region.all_states():
+                for chars, nxt in region.nfa.edges[state]:
+                    k = state - region.start
+                    marked[state].append((frozenset([('same', k)]), nxt, False))
+                    marked[state].append((frozenset([('differs', k)]), nxt, True))
+        else:
+            marked = [[(chars, nxt, True) for chars, nxt in edges] for edges in region.nfa.edges]
+        unread = len(nfa.edges)
+        read = unread + len(marked)
+        for _ in range(2 * len(marked)):
+            nfa.state()
+        for state, edges in enumerate(marked):
+            for chars, nxt, counts in edges:
+                nfa.edges[unread + state].append((chars, (read if counts else unread) + nxt))
+                nfa.edges[read + state].append((chars, read + nxt))
+            nfa.epsilon[unread + state] = [unread + nxt for nxt in region.nfa.epsilon[state]]
+            nfa.epsilon[read + state] = [read + nxt for nxt in region.nfa.epsilon[state]]
+        nfa.epsilon[current].append(unread + region.start)
+        starts.extend(range(unread, read))
+        accepts.extend(range(read, read + len(marked)))
+        ends = [read + region.accept]
+        if replaced is None and matches_empty(region):
+            # Text that can vanish joins before and after, which counts too
+            ends.append(unread + region.accept)
+    else:
+        ends = [current]
+
+    start, end, states = _append(nfa, build_sequence(after, alphabet))
+    for state in ends:
+        nfa.epsilon[state].append(start)
+    accepts.extend(state for state in states if changed or state != start)
+    # Text after after, which a match ending there has read a character of
+    trail = nfa.state()
+    nfa.edges[end].append((everything, trail))
+    nfa.edges[trail].append((everything, trail))
+    accepts.append(trail)
+
+    if replaced is not None:
+        # fragment, with its transitions marked by how they take each changed
+        # character
+        marked = []
+        for edges in fragment.nfa.edges:
+            marked.append([])
+            for chars, nxt in edges:
+                extra = set()
+                for k, (new, old) in enumerate(zip(changed[0], replaced)):
+                    if alphabet.symbol(new) in chars:
+                        extra.add(('same', k) if alphabet.symbol(old) in chars else ('differs', k))
+                marked[-1].append((chars | extra, nxt))
+        copy = NFA()
+        start, accept, _ = _append(copy, fragment, marked)
+        fragment = Fragment(copy, start, accept)
+    context = Fragment(nfa, outside, trail)
+    return intersects(fragment, [fragment.start], [fragment.accept], context, starts, accepts)
+
+
+def has_unsupported(parsed):
+    try:
+        build(parsed, Alphabet([parsed]))
+    except Unsupported as e:
+        return str(e)
+    return None
+
+
+WIDE_OPS = (sre_constants.ANY, sre_constants.NOT_LITERAL, sre_constants.IN)
+
+
+def _bytes_safe(parsed, repeated=False):
+    for op, av in parsed:
+        if op == sre_constants.CATEGORY:
+            return False
+        if op == sre_constants.AT and av in (sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY):
+            return False
+        if op == sre_constants.IN:
+            for item_op, item_av in av:
+                if item_op == sre_constants.CATEGORY:
+                    return False
+                if item_op == sre_constants.LITERAL and item_av > 0x7f:
+                    return False
+                if item_op == sre_constants.RANGE and item_av[1] > 0x7f:
+                    return False
+            if av[0][0] == sre_constants.NEGATE and not repeated:
+                return False
+        elif op in (sre_constants.ANY, sre_constants.NOT_LITERAL) and not repeated:
+            return False
+        elif op == sre_constants.SUBPATTERN:
+            if not _bytes_safe(av[-1]):
+                return False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            low, high, body = av
+            run = high == sre_constants.MAXREPEAT and len(body) == 1 and body[0][0] in WIDE_OPS
+            if not _bytes_safe(body, run):
+                return False
+        elif op == sre_constants.BRANCH:
+            if not all(_bytes_safe(branch) for branch in av[1]):
+                return False
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if not _bytes_safe(av[1]):
+                return False
+    return True
+
+
+def bytes_safe(pattern):
+    # True if the pattern, compiled as bytes, matches the UTF-8 bytes of any
+    # text exactly where it matches the text. Literals of any script are fine
+    # (UTF-8 is self-synchronising); what is not: \s, \w, \d and \b, which
+    # know Unicode only on text, case folding, non-ASCII class members, and a
+    # '.', [^...] or excluded character that must match exactly one character,
+    # where bytes would match a third of a '→'. Inside an unbounded repeat
+    # those match whole runs, which are the same bytes either way
+    if re.compile(pattern).flags & re.IGNORECASE:
+        return False
+    return _bytes_safe(parse(pattern))
+
+
+def _unbounded(av):
+    return av[1] == sre_constants.MAXREPEAT
+
+
+def _nested_repeat(parsed, inside=False):
+    for op, av in parsed:
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if inside and _unbounded(av):
+                return True
+            if _nested_repeat(av[2], inside or _unbounded(av)):
+                return True
+        elif op == sre_constants.SUBPATTERN:
+            if _nested_repeat(av[-1], inside):
+                return True
+        elif op == sre_constants.BRANCH:
+            if any(_nested_repeat(branch, inside) for branch in av[1]):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _nested_repeat(av[1], inside):
+                return True
+    return False
+
+
+def _sequence(parsed):
+    # The top-level items of a pattern, with group bodies spliced in
+    items = []
+    for op, av in parsed:
+        if op == sre_constants.SUBPATTERN:
+            items.extend(_sequence(av[-1]))
+        else:
+            items.append((op, av))
+    return items
+
+
+def _alternatives(items):
+    # The item lists a sequence can take, one per way through its top-level
+    # branches (re factors a common prefix out, so (a|aa) is a(|a)), at most
+    # MAX_ALTERNATIVES of them
+    ways = [[]]
+    for op, av in items:
+        if op != sre_constants.BRANCH:
+            for way in ways:
+                way.append((op, av))
+            continue
+        branches = [_sequence(branch) for branch in av[1]]
+        ways = [way + branch for way in ways for branch in branches][:MAX_ALTERNATIVES]
+    return ways
+
+
+def _ambiguous_repeat(parsed, alphabet):
+    # The first unbounded repeat whose body can match one text in two ways:
+    # two of its alternatives, each followed by more of the repeat, match the
+    # same text, as in (a|a)* and (a|aa)*. A failing match then tries every way
+    # of splitting the run, exponentially many
+    for op, av in parsed:
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if _unbounded(av):
+                ways = _alternatives(_sequence(av[2]))
+                rest = [(op, (0, sre_constants.MAXREPEAT, av[2]))]
+                try:
+                    runs = [build_sequence([way, rest], alphabet) for way in ways]
+                except Unsupported:
+                    runs = []
+                for i, a in enumerate(runs):
+                    for b in runs[i + 1:]:
+                        if intersects(a, [a.start], [a.accept], b, [b.start], [b.accept]):
+                            return True
+            if _ambiguous_repeat(av[2], alphabet):
+                return True
+        elif op == sre_constants.SUBPATTERN:
+            if _ambiguous_repeat(av[-1], alphabet):
+                return True
+        elif op == sre_constants.BRANCH:
+            if any(_ambiguous_repeat(branch, alphabet) for branch in av[1]):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _ambiguous_repeat(av[1], alphabet):
+                return True
+    return False
+
+
+def backtracking_risk(pattern):
+    # (kind, reason) for a pattern re can take super-linear time on, or None.
+    # 'exponential': an unbounded repeat inside another, as in (a+)+, or over
+    # alternatives that can match the same text, as in (a|aa)+; either can
+    # split one run of text in exponentially many ways. 'quadratic': an
+    # unbounded repeat that what comes before it can also occur inside, as in
+    # replace\(([^,]+), ; re.sub tries every start, and each start inside one
+    # run scans the rest of it again
+    parsed = parse(pattern)
+    if _nested_repeat(parsed):
+        return 'exponential', 'nests an unbounded repeat inside another'
+    alphabet = Alphabet([parsed])
+    if _ambiguous_repeat(parsed, alphabet):
+        return 'exponential', 'repeats alternatives that can match the same text'
+    items = _sequence(parsed)
+    for i, (op, av) in enumerate(items):
+        if op not in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) or not _unbounded(av):
+            continue
+        if not i:
+            return 'quadratic', 'starts with an unbounded repeat, so every position in a run is a start'
+        try:
+            before = build_sequence([items[:i]], alphabet)
+            run = build_sequence([[(op, (0, sre_constants.MAXREPEAT, av[2]))]], alphabet)
+        except Unsupported:
+            continue
+        if intersects(before, [before.start], [before.accept], run, [run.start], run.all_states()):
+            prefix = 'what comes before it'
+            if all(item_op == sre_constants.LITERAL for item_op, item_av in items[:i]):
+                prefix = repr(''.join(chr(item_av) for item_op, item_av in items[:i]))
+            return 'quadratic', f'{prefix} can recur inside the run of its repeat'
+    return None
+
+
+QUADRATIC_HEAD = re.compile(r'((?:\\.|[^\\()\[\]{}.*+?|^$])+)\(((?:\[(?:\\.|[^\]\\])*\]|\\.|[^\\()\[\]{}.*+?|^$]))\+\)')
+
+
+def linear_rewrite(pattern, replacement):
+    # A pattern that re.sub turns into the same output as a quadratic one with
+    # the same replacement, scanning each run once, or None. Covers a literal
+    # head followed by a group that is a run of one class, as in replace\(([^,]+),
+    # when the replacement writes the head back just before that group and uses
+    # the group nowhere else. What follows the run cannot start inside it, so
+    # every start of the head inside one run ends the run at the same place and
+    # matches or fails with the first; matching from the last start instead
+    # leaves the text before it unchanged, as the first start would have written
+    # it back. The rewrite keeps the run from taking in the start of a later
+    # match (the head and one more character of the run); that check reads the
+    # same on UTF-8 bytes, so the rule stays as bytes-safe as it was
+    m = QUADRATIC_HEAD.match(pattern)
+    if m is None:
+        return None
+    head, item = m.group(1), m.group(2)
+    rest = pattern[m.end():]
+    parsed_head = parse(head)
+    if not all(op == sre_constants.LITERAL for op, av in parsed_head):
+        return None
+    text = ''.join(chr(av) for op, av in parsed_head)
+    run = re.compile(item)
+    tail = parse(rest)
+    if not tail or tail[0][0] != sre_constants.LITERAL or run.fullmatch(chr(tail[0][1])):
+        return None
+    groups = {n: n for n in range(1, re.compile(pattern).groups + 1)}
+    try:
+        pieces = template_pieces(replacement, groups)
+    except Unsupported:
+        return None
+    if pieces[:2] != [text, 1] or 1 in pieces[2:]:
+        return None
+    return f'{head}((?:(?!{head}{item}){item})+){rest}'
+
+
+def template_pieces(template, groups):
+    # Splits a re.sub replacement string into literal text and the parsed
+    # subpatterns its group references stand for
+    pieces = []
+    literal = []
+    i = 0
+    while i < len(template):
+        ch = template[i]
+        if ch != '\\' or i + 1 == len(template):
+            literal.append(ch)
+            i += 1
+            continue
+        nxt = template[i + 1]
+        ref = None
+        if nxt.isdigit():
+            j = i + 1
+            while j < len(template) and template[j].isdigit() and j < i + 3:
+                j += 1
+            ref = int(template[i + 1:j])
+            i = j
+        elif nxt == 'g' and template[i + 2:i + 3] == '<':
+            j = template.index('>', i)
+            ref = template[i + 3:j]
+            ref = int(ref) if ref.isdigit() else ref
+            i = j + 1
+        else:
+            literal.append({'n': '\n', 't': '\t', 'r': '\r', '\\': '\\'}.get(nxt, '\\' + nxt))
+            i += 2
+        if ref is not None:
+            if literal:
+                pieces.append(''.join(literal))
+                literal = []
+            if ref not in groups:
+                raise Unsupported(f'group reference {ref}')
+            pieces.append(groups[ref])
+    if literal:
+        pieces.append(''.join(literal))
+    return pieces
@@ -0,0 +1,387 @@
+import contextlib
+import os
+import re
+import signal
+import threading
+import warnings
+
+import rule_cache
+import rule_profile
+from regex_overlap import (Alphabet, Unsupported, backtracking_risk, build, build_sequence, bytes_safe,
+                           can_overlap, linear_rewrite, matches_empty, parse, template_pieces)
+
+# Regex repair rules lifted from the repair scripts, one pack per script, as
+# (pattern, replacement) pairs in the order the script called re.sub.
+#
+# A pack is compiled the first time it is applied. Consecutive rules whose
+# matches cannot overlap, and whose replacements cannot produce a match for a
+# later rule, are fused into one alternation so a file is scanned once for the
+# whole group; the output is identical to calling re.sub rule by rule. Which
+# rules fuse is worked out once per rule change and kept in the rule cache.
+#
+# A stage applies to text or to the raw bytes of a file. When every rule in it
+# is bytes-safe (see regex_overlap.bytes_safe) it also has a bytes pattern and
+# scans the bytes as they are; otherwise the bytes are decoded for that stage.
+#
+# A rule that can take super-linear time (regex_overlap.backtracking_risk) is
+# refused when its pack is compiled, unless regex_overlap.linear_rewrite has a
+# linear pattern with the same output for it; the rule then runs as that, and
+# report() lists it. Pattern and plan stay those of the script's rule. The
+# regex stages over a file also share a time budget (RULE_BUDGET seconds, from
+# LAUNDRY_RULE_BUDGET, 0 for none), armed once per file by rule_budget(): re
+# checks for signals while it matches, so a timer interrupts a runaway scan and
+# the file fails with RuleTimeout naming the rules, instead of holding up the
+# run. Only the main thread of a process on a platform with setitimer can be
+# interrupted; elsewhere (Windows, other threads) a stage that ran over still
+# fails with RuleTimeout once it ends, and a RuntimeWarning, given once, says
+# the scan itself is not cut short.
+
+RULE_BUDGET = float(os.environ.get('LAUNDRY_RULE_BUDGET') or 2.0)
+
+FIX_FETCH_QUOTES = [
+    (r"fetch\(`\$\{API_URL\}([^`]*)'", r"fetch(`${API_URL}\1`"),
+    (r'fetch\(`\$\{API_URL\}([^`]*)"', r'fetch(`${API_URL}\1`'),
+]
+
+FIX_ALL_APIS = [
+    (r'`http://localhost:3000/', r'`${API_URL}/'),
+    (r"'http://localhost:3000/", r"`${API_URL}/"),
+    (r'"http://localhost:3000/', r'`${API_URL}/'),
+]
+
+REPLACE_API_PROPERLY = [
+    (r"'(\$\{API_URL\}[^']*)'", r'`\1`'),
+    (r'"(\$\{API_URL\}[^"]*)"', r'`\1`'),
+]
+
+PARTNER_FIX_ALL_SYNTAX = [
+    (r'useState\(["\']`\)', "useState('')"),
+    (r'getItem\(["\']([^"\']+)`\)', r"getItem('\1')"),
+    (r'=== ["\']([^"\']+)`\)', r"=== '\1')"),
+    (r'startsWith\(["\']([^"\']+)`\)', r"startsWith('\1')"),
+    (r'push\(["\']([^"\']+)`\)', r"push('\1')"),
+    (r'alert\(["\']([^"\']+)`\)', r"alert('\1')"),
+    (r'replace\(([^,]+), ["\']`\)', r"replace(\1, '')"),
+]
+
+# The mismatched-quote repairs of final_fix, fix_partner_syntax and this pack
+# are done by ts_literals, which can tell strings, templates and JSX text apart
+PARTNER_FIX_ALL_SYNTAX2 = [
+    (r"useState\('\"", "useState('')"),
+    (r'useState\("', "useState('')"),
+]
+
+PARTNER_FIX_COMPREHENSIVE = [
+    (r"useState\(['\"]`\)", "useState('')"),
+    (r"useState\(['\"]\"", "useState('')"),
+    (r"getItem\('([^']+)`\)", r"getItem('\1')"),
+    (r"replace\(([^,]+),\s*['\"]`\)", r"replace(\1, '')"),
+    (r"replace\(([^,]+),\s*['\"]\\s`\)", r"replace(\1, ' ')"),
+    (r"push\(['\"]([^'\"]+)`\)", r"push('/\1')"),
+    (r"push\(['\"]\/([^'\"]+)`\)", r"push('/\1')"),
+    (r"alert\(['\"]([^'\"]+)`\)", r"alert('\1')"),
+    (r"join\(['\"],\s`\)", r"join(', ')"),
+    (r"push\('([^']+)`\)", r"push('\1')"),
+    (r"===\s*['\"]([^'\"]+)`\)", r"=== '\1')"),
+    (r"startsWith\(['\"]([^'\"]+)`\)", r"startsWith('/\1')"),
+    (r"startsWith\(['\"]\/([^'\"]+)`\)", r"startsWith('/\1')"),
+]
+
+REGEX_PACKS = {
+    'fix_fetch_quotes': FIX_FETCH_QUOTES,
+    'fix_all_apis': FIX_ALL_APIS,
+    'replace_api_properly': REPLACE_API_PROPERLY,
+    'partner/fix_all_syntax': PARTNER_FIX_ALL_SYNTAX,
+    'partner/fix_all_syntax2': PARTNER_FIX_ALL_SYNTAX2,
+    'partner/fix_comprehensive': PARTNER_FIX_COMPREHENSIVE,
+}
+
+
+class Rule:
+    def __init__(self, pack, index, pattern, replacement):
+        self.pack = pack
+        self.index = index
+        self.pattern = pattern
+        self.replacement = replacement
+        self.regex = re.compile(pattern)
+        self.bytes_safe = bytes_safe(pattern)
+        self.risk = None
+
+    @property
+    def name(self):
+        return f'{self.pack}#{self.index}'
+
+
+class RuleTimeout(Exception):
+    def __init__(self, stage, seconds):
+        super().__init__(f'{", ".join(rule.name for rule in stage.rules)} ran over the {seconds:g} s rule budget')
+        self.rules = stage.rules
+        self.seconds = seconds
+
+
+class _Expired(Exception):
+    pass
+
+
+class _Budget:
+    def __init__(self):
+        self.started = rule_profile.clock()
+        self.running = None
+        self.expired = False
+
+
+_local = threading.local()
+_warned = False
+
+
+def _expire(signum, frame):
+    budget = _local.budget
+    budget.expired = True
+    if budget.running is not None:
+        raise _Expired()
+
+
+@contextlib.contextmanager
+def rule_budget():
+    # Runs every regex stage inside the block under one budget, armed once:
+    # transforms.apply_pipeline puts the whole pipeline over a file in one.
+    # A stage run outside any block gets a budget of its own
+    global _warned
+    if not RULE_BUDGET or getattr(_local, 'budget', None) is not None:
+        yield
+        return
+    timer = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if not timer and not _warned:
+        # No timer can interrupt a scan here, so the budget is checked after each stage
+        _warned = True
+        warnings.warn(f'no timer to interrupt regex rules here; the {RULE_BUDGET:g} s budget is only '
+                      f'checked after each stage', RuntimeWarning, stacklevel=3)
+    _local.budget = _Budget()
+    if timer:
+        previous = signal.signal(signal.SIGALRM, _expire)
+        signal.setitimer(signal.ITIMER_REAL, RULE_BUDGET)
+    try:
+        yield
+    finally:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        _local.budget = None
+
+
+def within_budget(stage, run, content):
+    budget = getattr(_local, 'budget', None)
+    if budget is None:
+        if not RULE_BUDGET:
+            return run(content)
+        with rule_budget():
+            return within_budget(stage, run, content)
+    if budget.expired:
+        raise RuleTimeout(stage, RULE_BUDGET)
+    try:
+        budget.running = stage
+        result = run(content)
+    except _Expired:
+        raise RuleTimeout(stage, RULE_BUDGET) from None
+    finally:
+        budget.running = None
+    if rule_profile.clock() - budget.started > RULE_BUDGET:
+        raise RuleTimeout(stage, RULE_BUDGET)
+    return result
+
+
+def _absolute_template(template, offset):
+    # Rewrites group references so the template can be expanded against the fused match
+    def shift(m):
+        if m.group(1):
+            return m.group(0)
+        return f'\\g<{int(m.group(2) or m.group(3)) + offset}>'
+    return re.sub(r'\\(\\)|\\g<(\d+)>|\\(\d{1,2})', shift, template)
+
+
+class FusedStage:
+    def __init__(self, rules):
+        self.rules = rules
+        self.label = rules[0].name + (f' +{len(rules) - 1}' if len(rules) > 1 else '')
+        self.bytes_safe = all(rule.bytes_safe for rule in rules)
+        if len(rules) == 1:
+            self.regex = rules[0].regex
+            self.templates = {None: rules[0].replacement}
+        else:
+            parts = []
+            self.templates = {}
+            self.owners = {}
+            group = 1
+            for rule in rules:
+                parts.append(f'({rule.regex.pattern})')
+                self.templates[group] = _absolute_template(rule.replacement, group)
+                self.owners[group] = rule
+                group += 1 + rule.regex.groups
+            self.regex = re.compile('|'.join(parts))
+        if self.bytes_safe:
+            self.bregex = re.compile(self.regex.pattern.encode('utf-8'))
+            self.btemplates = {group: template.encode('utf-8') for group, template in self.templates.items()}
+
+    def dispatch(self, m):
+        # The wrapping group of the rule that matched closes last
+        if isinstance(m.string, bytes):
+            return m.expand(self.btemplates[m.lastindex])
+        return m.expand(self.templates[m.lastindex])
+
+    def matchers(self, content):
+        if isinstance(content, bytes):
+            return self.bregex, self.btemplates
+        return self.regex, self.templates
+
+    def apply(self, content):
+        if isinstance(content, bytes) and not self.bytes_safe:
+            return self.apply(content.decode('utf-8')).encode('utf-8')
+        return within_budget(self, self.run, content)
+
+    def run(self, content):
+        if rule_profile.active is not None:
+            return self.apply_profiled(content, rule_profile.active)
+        regex, templates = self.matchers(content)
+        if len(self.rules) == 1:
+            return regex.sub(templates[None], content)
+        return regex.sub(self.dispatch, content)
+
+    def apply_profiled(self, content, profiler):
+        started = rule_profile.clock()
+        counts = {rule.name: [0, 0, 0] for rule in self.rules}
+        regex, templates = self.matchers(content)
+
+        def replace(m):
+            if len(self.rules) == 1:
+                rule, output = self.rules[0], m.expand(templates[None])
+            else:
+                rule, output = self.owners[m.lastindex], self.dispatch(m)
+            count = counts[rule.name]
+            count[0] += 1
+            count[1] += rule_profile.size(m.group())
+            count[2] += rule_profile.size(output)
+            return output
+        size = rule_profile.size(content)
+        content = regex.sub(replace, content)
+
+        seconds = rule_profile.clock() - started
+        profiler.scan(self.label, size, seconds)
+        for rule in self.rules:
+            hits, bytes_in, bytes_out = counts[rule.name]
+            profiler.rule(rule.name, hits, bytes_in, bytes_out, seconds / len(self.rules))
+        return content
+
+
+def plan_bundle(rules):
+    # Returns (stages, unfused): the rule indices scanned together, in order,
+    # and (index, other index or None, reason) for each rule that broke a group
+    unfused = []
+    stages = []
+    parsed = [parse(rule.pattern) for rule in rules]
+    alphabet = Alphabet(parsed, [rule.replacement for rule in rules])
+    shapes = []
+    for i, (rule, tree) in enumerate(zip(rules, parsed)):
+        try:
+            fragment, groups = build(tree, alphabet)
+            output = build_sequence(template_pieces(rule.replacement, groups), alphabet)
+            if matches_empty(fragment) or matches_empty(output):
+                raise Unsupported('can match or produce an empty string')
+            shapes.append((fragment, output))
+        except Unsupported as e:
+            shapes.append(None)
+            unfused.append((i, None, str(e)))
+
+    current = []
+    for i, shape in enumerate(shapes):
+        conflict = None
+        if shape is None:
+            conflict = (None, 'unsupported')
+        else:
+            for other, other_shape in current:
+                if can_overlap(shape[0], other_shape[0]):
+                    conflict = (other, 'matches overlap')
+                    break
+                if can_overlap(shape[0], other_shape[1]):
+                    conflict = (other, 'replacement feeds pattern')
+                    break
+        if conflict is not None and current:
+            if conflict[0] is not None:
+                unfused.append((i, conflict[0], conflict[1]))
+            stages.append([j for j, _ in current])
+            current = []
+        if shape is None:
+            stages.append([i])
+        else:
+            current.append((i, shape))
+    if current:
+        stages.append([j for j, _ in current])
+    return stages, unfused
+
+
+class Bundle:
+    def __init__(self, rules, plan=None):
+        self.rules = rules
+        stages, unfused = plan or plan_bundle(rules)
+        self.stages = [FusedStage([rules[i] for i in stage]) for stage in stages]
+        self.unfused = [(rules[i], None if other is None else rules[other], reason) for i, other, reason in unfused]
+
+    def apply(self, content):
+        for stage in self.stages:
+            content = stage.apply(content)
+        return content
+
+    def report(self):
+        lines = []
+        for rule, other, reason in self.unfused:
+            if other is None:
+                lines.append(f'{rule.name} {rule.pattern!r}: not fused ({reason})')
+            else:
+                lines.append(f'{rule.name} {rule.pattern!r}: not fused with {other.name} {other.pattern!r} ({reason})')
+        for rule in self.rules:
+            if not rule.bytes_safe:
+                lines.append(f'{rule.name} {rule.pattern!r}: runs on decoded text')
+            if rule.risk is not None:
+                lines.append(f'{rule.name} {rule.pattern!r}: {rule.risk[1]}, runs as {rule.regex.pattern!r}')
+        return lines
+
+
+def compile_pack(name):
+    rules = [Rule(name, i, pattern, repl) for i, (pattern, repl) in enumerate(REGEX_PACKS[name])]
+    risks = rule_cache.cached('risks', name, lambda: [backtracking_risk(rule.pattern) for rule in rules])
+    for rule, risk in zip(rules, risks):
+        if risk is None:
+            continue
+        rewritten = linear_rewrite(rule.pattern, rule.replacement) if risk[0] == 'quadratic' else None
+        if rewritten is None:
+            raise ValueError(f'{rule.name} {rule.pattern!r} {risk[1]}')
+        rule.regex = re.compile(rewritten)
+        rule.risk = risk
+    return Bundle(rules, rule_cache.cached('bundle', name, lambda: plan_bundle(rules)))
+
+
+_bundles = {}
+
+
+def bundle(name):
+    if name not in _bundles:
+        _bundles[name] = compile_pack(name)
+    return _bundles[name]
+
+
+def apply_bundle(content, name):
+    return bundle(name).apply(content)
+
+
+def apply_sequential(content, name):
+    # Reference implementation: what the scripts used to do
+    for pattern, replacement in REGEX_PACKS[name]:
+        content = re.sub(pattern, replacement, content)
+    return content
+
+
+if __name__ == '__main__':
+    for name in REGEX_PACKS:
+        compiled = bundle(name)
+        print(f'{name}: {len(compiled.rules)} rules in {len(compiled.stages)} scans')
+        for line in compiled.report():
+            print(f'  {line}')
@@ -0,0 +1,155 @@
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+# One entry point for the repair scripts.
+#
+# The rules of each standalone script (and of the two Windows scripts) are a
+# named rule pack here. `run` chains the packs it is given, in that order, into
+# one pipeline and runs it over the selected apps on the fix_parallel process
+# pool, with the fix cache, trigram index, prefilter and structure check that
+# come with it. Only this registry is loaded up front: the rule modules are
+# imported when a command needs them, only the selected packs are compiled,
+# and their analysis (fusion plans, scan splits, triggers) comes from the
+# rule cache.
+#
+#   python repair.py list
+#   python repair.py run api-url,customer-quotes,navigate --apps customer
+#   python repair.py run partner-quotes --dry-run
+#   python repair.py run --since main      only what the branch touched
+#   python repair.py run                  each app's default pipeline
+#   python repair.py rules navigate       the rules behind a pack
+
+RulePack = namedtuple('RulePack', 'transforms apps scripts description')
+
+APPS = ('customer', 'partner', 'admin')
+
+RULE_PACKS = {
+    'api-url': RulePack(['replace_api_url'], APPS, 'replace_api_properly.py, replace-localhost.ps1, replace-api.bat',
+                        'localhost:3000 URLs as ${API_URL} template literals, importing API_URL'),
+    'api-url-start': RulePack(['fix_all_apis'], APPS, 'fix_all_apis.py',
+                              'only the opening quote of localhost:3000 URLs; follow with literals'),
+    'localhost': RulePack(['replace_localhost'], ('customer', 'partner'), 'replace_localhost.py',
+                          'quoted localhost:3000 URLs and every quote before a ) as backticks'),
+    'customer-quotes': RulePack(['fix_syntax', 'fix_more_syntax'], ('customer',), 'fix_syntax.py, fix_more_syntax.py',
+                                'strings the URL rewrite closed with a backtick'),
+    'fetch-quotes': RulePack(['fix_fetch'], ('customer',), 'fix_fetch_quotes.py',
+                             'fetch(`${API_URL}...\' templates closed with a quote'),
+    'navigate': RulePack(['fix_navigate'], ('customer',), 'fix_navigate.py',
+                         "navigate('/login`) calls"),
+    'customer-literals': RulePack(['fix_syntax', 'fix_more_syntax', 'fix_navigate'], ('customer',), 'fix_literals.py',
+                                  'customer-quotes and navigate in one go'),
+    'literals': RulePack(['final_fix'], APPS, 'final_fix.py, fix_partner_syntax.py',
+                         'any string or template closed with the wrong quote, found by the literal scanner'),
+    'partner-quotes': RulePack(['fix_partner_complete'], ('partner',), 'fix_partner_complete.py',
+                               "'`) and \"`) closers and the partnerId lookups"),
+    'partner-all': RulePack(['fix_partner_all'], ('partner',), 'fix_partner_all.py',
+                            'every `) as \'), valid templates included'),
+    'partner-all-quotes': RulePack(['fix_all_partner_quotes'], ('partner',), 'fix_all_partner_quotes.py',
+                                   'mixed closers in the partner pages, valid templates included'),
+    'partner-syntax': RulePack(['partner/fix_all_syntax'], ('partner',), 'partner/fix_all_syntax.py',
+                               'useState, getItem, push and alert arguments closed with a backtick'),
+    'partner-syntax2': RulePack(['partner/fix_all_syntax2'], ('partner',), 'partner/fix_all_syntax2.py',
+                                'the literal scanner, then useState(\'" and useState(" initialisers'),
+    'partner-comprehensive': RulePack(['partner/fix_comprehensive'], ('partner',), 'partner/fix_comprehensive.py',
+                                      'call arguments and comparisons closed with a backtick'),
+    'partner-simple': RulePack(['partner/fix_simple'], ('partner',), 'partner/fix_simple.py',
+                               "'partnerId`), 'all`) and .replace('_', ' `)"),
+    'partner-quotes-final': RulePack(['partner/fix_quotes_final'], ('partner',), 'partner/fix_quotes_final.py',
+                                     'strings closed with a double quote and API templates closed with ")'),
+}
+
+
+def parse_packs(parser, text):
+    names = [name for name in text.split(',') if name] if text else []
+    unknown = [name for name in names if name not in RULE_PACKS]
+    if unknown:
+        parser.error(f'unknown rule packs: {", ".join(unknown)} (see repair.py list)')
+    return names
+
+
+def pack_apps(names):
+    # The apps every one of the packs is meant for
+    return [app for app in APPS if all(app in RULE_PACKS[name].apps for name in names)]
+
+
+def list_packs():
+    width = max(len(name) for name in RULE_PACKS)
+    for name, pack in RULE_PACKS.items():
+        print(f'{name:<{width}}  {pack.description}')
+        print(f'{"":<{width}}  apps: {",".join(pack.apps)}; replaces {pack.scripts}')
+
+
+def show_rules(names):
+    import transforms
+    from regex_rules import REGEX_PACKS
+    from rule_table import LITERAL_PACKS
+
+    for name in names:
+        print(f'{name}:')
+        for transform in RULE_PACKS[name].transforms:
+            for step in transforms.TRANSFORM_STEPS[transform]:
+                if step[0] == 'literal':
+                    rules = [f'{old!r} -> {new!r}' for old, new in LITERAL_PACKS[step[1]]]
+                elif step[0] == 'regex':
+                    rules = [f'/{pattern}/ -> {replacement!r}' for pattern, replacement in REGEX_PACKS[step[1]]]
+                else:
+                    rules = [f'code step on {step[1]!r}, writing {step[2]!r}']
+                for rule in rules:
+                    print(f'  {transform}  {rule}')
+
+
+def run_packs(names, apps, args):
+    import fix_parallel
+    import rule_profile
+    from file_index import ROOT
+    from fix_cache import FixCache
+
+    pipeline = [transform for name in names for transform in RULE_PACKS[name].transforms] or None
+    os.chdir(ROOT)
+    cache = None if args.no_cache else FixCache()
+    profiler = rule_profile.Profiler() if args.profile else None
+    results, skipped = fix_parallel.run(apps, args.workers, pipeline, cache, profiler, args.dry_run,
+                                        not args.no_index, args.since)
+    errors = fix_parallel.print_results(results, skipped, args.dry_run)
+    if profiler is not None:
+        fix_parallel.print_profile(profiler, args.top)
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the repair rule packs over the customer, partner and admin sources')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='list the rule packs')
+    commands.add_parser('rules', help='print the rules of some packs').add_argument('packs', help='comma-separated rule packs')
+    run = commands.add_parser('run', help='run a pipeline of rule packs')
+    run.add_argument('packs', nargs='?', help='comma-separated rule packs, in order; each app\'s default pipeline if omitted')
+    run.add_argument('--apps', help='comma-separated apps; by default every app all the packs are meant for')
+    run.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    run.add_argument('--no-cache', action='store_true', help='process every file, ignoring the fix cache')
+    run.add_argument('--no-index', action='store_true', help='visit every file, not only the trigram index candidates')
+    run.add_argument('--dry-run', action='store_true', help='print unified diffs instead of writing files')
+    run.add_argument('--since', help='only process files changed since this git ref, plus untracked ones')
+    run.add_argument('--profile', action='store_true', help='report per-rule hits and timings')
+    run.add_argument('--top', type=int, default=20, help='rows per profile table')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        list_packs()
+    elif args.command == 'rules':
+        show_rules(parse_packs(parser, args.packs))
+    else:
+        names = parse_packs(parser, args.packs)
+        apps = args.apps.split(',') if args.apps else pack_apps(names)
+        unknown = [app for app in apps if app not in APPS]
+        if unknown:
+            parser.error(f'unknown apps: {", ".join(unknown)}')
+        if not apps:
+            parser.error('the packs are not all meant for any one app; pick with --apps')
+        from git_changes import GitError
+        try:
+            errors = run_packs(names, apps, args)
+        except GitError as e:
+            parser.error(f'--since {args.since}: {e}')
+        sys.exit(1 if errors else 0)
@@ -1,12 +1,5 @@
-# Replace localhost URLs in customer app
-Get-ChildItem -Path "customer\src" -Recurse -Include *.tsx,*.ts | ForEach-Object {
-    (Get-Content $_.FullName) -replace "http://localhost:3000", '${API_URL}' | Set-Content $_.FullName
-    (Get-Content $_.FullName) -replace "fetch\(`\$\{API_URL\}", "import { API_URL } from '@/config/api';`n`nfetch(`${API_URL}" | Set-Content $_.FullName -Force
-}
-
-# Replace localhost URLs in partner app
-Get-ChildItem -Path "partner\src" -Recurse -Include *.tsx,*.ts | ForEach-Object {
-    (Get-Content $_.FullName) -replace "http://localhost:3000", '${API_URL}' | Set-Content $_.FullName
-}
+# Replace localhost URLs in the customer and partner apps with ${API_URL},
+# importing API_URL where it is used; see repair.py list for the other packs
+python (Join-Path $PSScriptRoot "repair.py") run api-url --apps customer,partner
 
 Write-Host "Replacement complete!"
@@ -1,56 +1,44 @@
 import os
-import re
+
+import transforms
+from file_index import ROOT, source_files
+from prefilter import may_change
+from safe_write import BatchWriter
+from script_args import parse_args
+
+args = parse_args('Replace localhost URLs with API_URL in the customer and partner apps')
+writer = BatchWriter(args.dry_run)
 
 def replace_in_file(filepath, app_type):
-    with open(filepath, 'r', encoding='utf-8') as f:
+    if not may_change(filepath, ['replace_localhost']):
+        return writer.skip()
+
+    with open(filepath, 'rb') as f:
         content = f.read()
     
-    if 'http://localhost:3000' not in content:
-        return False
-    
-    # Add import if not exists
-    if 'API_URL' not in content:
-        if app_type == 'customer':
-            import_line = "import { API_URL } from '@/config/api';\n"
-        else:
-            import_line = "import { API_URL } from '@/config/api';\n"
-        
-        # Add after last import
-        lines = content.split('\n')
-        last_import_idx = 0
-        for i, line in enumerate(lines):
-            if line.startswith('import '):
-                last_import_idx = i
-        lines.insert(last_import_idx + 1, import_line.rstrip())
-        content = '\n'.join(lines)
+    if b'http://localhost:3000' not in content:
+        return writer.skip()
     
-    # Replace all localhost URLs
-    content = content.replace("'http://localhost:3000", "`${API_URL}")
-    content = content.replace('"http://localhost:3000', '`${API_URL}')
-    content = content.replace("')", "`)")
-    content = content.replace('")', '`)')
+    # Add import and replace all localhost URLs
+    fixed = transforms.replace_localhost_bytes(content)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
-    return True
+    return writer.write_bytes(filepath, fixed, content)
+
+os.chdir(ROOT)
 
 # Process customer app
 customer_dir = 'customer/src'
-for root, dirs, files in os.walk(customer_dir):
-    for file in files:
-        if file.endswith(('.tsx', '.ts')) and not file.endswith('.d.ts'):
-            filepath = os.path.join(root, file)
-            if replace_in_file(filepath, 'customer'):
-                print(f'Updated: {filepath}')
+for filepath in source_files(customer_dir, ('.tsx', '.ts'), skip_dts=True, since=args.since):
+    if replace_in_file(filepath, 'customer'):
+        print(f'Updated: {filepath}')
 
 # Process partner app
 partner_dir = 'partner/src'
-for root, dirs, files in os.walk(partner_dir):
-    for file in files:
-        if file.endswith(('.tsx', '.ts')) and not file.endswith('.d.ts'):
-            filepath = os.path.join(root, file)
-            if replace_in_file(filepath, 'partner'):
-                print(f'Updated: {filepath}')
+for filepath in source_files(partner_dir, ('.tsx', '.ts'), skip_dts=True, since=args.since):
+    if replace_in_file(filepath, 'partner'):
+        print(f'Updated: {filepath}')
+
+writer.flush()
+print(writer.summary())
 
 print('\nDone! All localhost URLs replaced with API_URL')
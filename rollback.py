@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from file_index import HERE
+
+# Undo for fixer runs.
+#
+# Before BatchWriter renames a new version over a source file, the run journal
+# keeps the old one: a hardlink to the old inode (the rename leaves it
+# untouched, so this costs no copy), else a reflink where the filesystem can
+# clone, else the bytes zlib-compressed into one pack file per process. A file
+# the run creates is journaled as new. Nothing is kept for files a run leaves
+# alone, so a run costs and a rollback takes time in proportion to the files
+# it changed, whatever the size of the tree.
+#
+# A run is one process and every worker it starts (they inherit the run id
+# through LAUNDRY_RUN), or one batch of saves in watch_api. A run id is the
+# time the run started, to the nanosecond, and the process id; runs are
+# ordered by that time. The last KEEP_RUNS runs are kept under .rollback/.
+# Rolling back restores each file only if it still holds what the run wrote;
+# a file edited since is reported and left alone unless --force is given.
+# LAUNDRY_NO_ROLLBACK=1 turns the journal off.
+#
+#   python rollback.py --list
+#   python rollback.py                  undo the latest run
+#   python rollback.py 20260412-101502-038127455-4242 --dry-run
+
+ROLLBACK_DIR = os.path.join(HERE, '.rollback')
+KEEP_RUNS = 20
+ENABLED = not os.environ.get('LAUNDRY_NO_ROLLBACK')
+FICLONE = 0x40049409
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _clone(source, target):
+    # Hardlink, else reflink; False when the filesystem can do neither
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        pass
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+class RunJournal:
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.directory = os.path.join(ROLLBACK_DIR, run_id)
+        self.journal = None
+        self.pack = None
+        self.serial = 0
+
+    def _open(self):
+        fresh = not os.path.isdir(self.directory)
+        os.makedirs(os.path.join(self.directory, 'files'), exist_ok=True)
+        if fresh:
+            with open(os.path.join(self.directory, 'run.json'), 'w', encoding='utf-8') as f:
+                json.dump({'started': time.time(), 'cwd': os.getcwd(), 'argv': sys.argv}, f)
+            prune()
+        self.journal = open(os.path.join(self.directory, f'journal-{os.getpid()}.jsonl'), 'a', encoding='utf-8')
+
+    def record(self, filepath, before, after):
+        # Called before after replaces before at filepath (before is None for a new file)
+        if self.journal is None:
+            self._open()
+        entry = {'path': os.path.abspath(filepath), 'after': _digest(after)}
+        if before is None:
+            entry['kind'] = 'new'
+        else:
+            name = f'{os.getpid()}-{self.serial}'
+            self.serial += 1
+            if _clone(filepath, os.path.join(self.directory, 'files', name)):
+                entry.update(kind='file', name=name)
+            else:
+                if self.pack is None:
+                    self.pack = open(os.path.join(self.directory, f'pack-{os.getpid()}'), 'ab')
+                data = zlib.compress(before)
+                entry.update(kind='pack', name=f'pack-{os.getpid()}', offset=self.pack.tell(), length=len(data))
+                self.pack.write(data)
+                self.pack.flush()
+        self.journal.write(json.dumps(entry) + '\n')
+        self.journal.flush()
+
+    def sync(self):
+        for f in (self.journal, self.pack):
+            if f is not None:
+                os.fsync(f.fileno())
+
+
+_current = None
+_last_started = 0
+
+
+def begin():
+    # Starts a new run for this process and the workers it starts from now on
+    global _current, _last_started
+    # Later than the last run of this process even where the clock is coarse
+    started = _last_started = max(time.time_ns(), _last_started + 1)
+    seconds, nanoseconds = divmod(started, 10 ** 9)
+    run_id = f'{time.strftime("%Y%m%d-%H%M%S", time.localtime(seconds))}-{nanoseconds:09d}-{os.getpid()}'
+    os.environ['LAUNDRY_RUN'] = run_id
+    _current = RunJournal(run_id)
+    return _current
+
+
+def current():
+    global _current
+    if _current is None:
+        run_id = os.environ.get('LAUNDRY_RUN')
+        if run_id:
+            _current = RunJournal(run_id)
+        else:
+            begin()
+    return _current
+
+
+def _started(run_id):
+    # Sort key of a run id: (date, time, nanoseconds, pid). An id from before
+    # the nanoseconds were added has none, and one that is not a run id sorts first
+    parts = run_id.split('-')
+    if len(parts) == 3:
+        parts.insert(2, '0')
+    if len(parts) != 4 or not all(part.isdigit() for part in parts):
+        return (0, run_id)
+    return tuple(int(part) for part in parts)
+
+
+def runs():
+    # Run ids, oldest first
+    if not os.path.isdir(ROLLBACK_DIR):
+        return []
+    return sorted((name for name in os.listdir(ROLLBACK_DIR) if os.path.isdir(os.path.join(ROLLBACK_DIR, name))),
+                  key=_started)
+
+
+def prune(keep=KEEP_RUNS):
+    for run_id in runs()[:-keep]:
+        shutil.rmtree(os.path.join(ROLLBACK_DIR, run_id), ignore_errors=True)
+
+
+def entries(run_id):
+    # The journal of a run in the order it was written, process by process
+    directory = os.path.join(ROLLBACK_DIR, run_id)
+    found = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('journal-'):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                found.extend(json.loads(line) for line in f if line.endswith('\n'))
+    return found
+
+
+def original(run_id, entry):
+    # The bytes the run replaced, or None for a file it created
+    directory = os.path.join(ROLLBACK_DIR, run_id)
+    if entry['kind'] == 'new':
+        return None
+    if entry['kind'] == 'file':
+        with open(os.path.join(directory, 'files', entry['name']), 'rb') as f:
+            return f.read()
+    with open(os.path.join(directory, entry['name']), 'rb') as f:
+        f.seek(entry['offset'])
+        return zlib.decompress(f.read(entry['length']))
+
+
+def roll_back(run_id, force=False, dry_run=False):
+    # Returns (restored paths, [(path, reason)] left alone)
+    from safe_write import BatchWriter
+
+    writer = BatchWriter(dry_run, validate=False, journal=False)
+    restored = []
+    conflicts = []
+    # Newest first, so a file written twice ends up with its oldest bytes
+    for entry in reversed(entries(run_id)):
+        path = entry['path']
+        try:
+            with open(path, 'rb') as f:
+                present = f.read()
+        except FileNotFoundError:
+            present = None
+        if present is None and entry['kind'] == 'new':
+            continue
+        if not force and (present is None or _digest(present) != entry['after']):
+            conflicts.append((path, 'deleted since the run' if present is None else 'changed since the run'))
+            continue
+        data = original(run_id, entry)
+        if data is None:
+            if dry_run:
+                print(f'Would remove: {path}')
+            else:
+                os.remove(path)
+        elif not writer.write_bytes(path, data, present):
+            continue
+        restored.append(path)
+    writer.flush()
+    if not dry_run and not conflicts:
+        shutil.rmtree(os.path.join(ROLLBACK_DIR, run_id), ignore_errors=True)
+    return restored, conflicts
+
+
+def describe(run_id):
+    with open(os.path.join(ROLLBACK_DIR, run_id, 'run.json'), 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    files = {entry['path'] for entry in entries(run_id)}
+    command = ' '.join([os.path.basename(info['argv'][0])] + info['argv'][1:])
+    return f'{run_id}  {len(files):>4} files  {command}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Undo the file changes of a fixer run')
+    parser.add_argument('run', nargs='?', help='run id; the latest run if omitted')
+    parser.add_argument('--list', action='store_true', help='list the runs that can be rolled back')
+    parser.add_argument('--force', action='store_true', help='also restore files changed since the run')
+    parser.add_argument('--dry-run', action='store_true', help='print unified diffs instead of writing files')
+    args = parser.parse_args()
+
+    known = runs()
+    if args.list:
+        for run_id in known:
+            print(describe(run_id))
+        sys.exit(0)
+    if not known:
+        parser.error('no runs to roll back')
+    run_id = args.run or known[-1]
+    if run_id not in known:
+        parser.error(f'unknown run {run_id} (see --list)')
+
+    started = time.perf_counter()
+    restored, conflicts = roll_back(run_id, args.force, args.dry_run)
+    for path in restored:
+        print(f'{"Would restore" if args.dry_run else "Restored"}: {os.path.relpath(path)}')
+    for path, reason in conflicts:
+        print(f'Left alone: {os.path.relpath(path)} ({reason}; --force to restore anyway)')
+    print(f'{len(restored)} files {"would be restored" if args.dry_run else "restored"}, {len(conflicts)} left alone '
+          f'({(time.perf_counter() - started) * 1000:.0f} ms)')
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import pickle
+
+from file_index import HERE
+
+# Rule analysis results kept across runs.
+#
+# Compiling a pack is mostly analysis: which regex rules can be fused into one
+# alternation (an NFA overlap test per pair), how literal rules split into
+# scans, the prefilter triggers of a pipeline and whether it settles in one
+# pass. The compiled re objects themselves are cheap to rebuild and pickle
+# only as their source anyway, so what is stored is the analysis, keyed by
+# kind and pack, and the matchers are rebuilt from it.
+#
+# Everything is dropped when the source of any rule module changes. Entries are
+# computed on first use and written straight away, so every pack is analysed
+# once per rule change, whichever script or worker asks for it first.
+
+CACHE_FILE = os.path.join(HERE, '.rule_cache.pickle')
+# Every module whose source decides what the rules do to a file; fix_cache.py
+# fingerprints the same list
+RULE_MODULES = ['rule_table.py', 'regex_rules.py', 'regex_overlap.py', 'multi_replace.py', 'rule_optimizer.py',
+                'edit_buffer.py', 'rule_scope.py', 'prefilter.py', 'fixpoint.py', 'transforms.py', 'ts_literals.py']
+
+
+def rules_fingerprint():
+    h = hashlib.sha256()
+    for name in RULE_MODULES:
+        with open(os.path.join(HERE, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+class RuleCache:
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.fingerprint = rules_fingerprint()
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+                data = {}
+            if data.get('version') == 1 and data.get('fingerprint') == self.fingerprint:
+                self.entries = data['entries']
+
+    def get(self, kind, key, build):
+        # The stored result for (kind, key), built and saved on a miss
+        entry = (kind, key)
+        if entry not in self.entries:
+            self.entries[entry] = build()
+            self.save()
+        return self.entries[entry]
+
+    def save(self):
+        if not self.path:
+            return
+        # Workers may save at the same time; each renames its own temp file
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': 1, 'fingerprint': self.fingerprint, 'entries': self.entries},
+                        f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+
+_cache = None
+
+
+def cached(kind, key, build):
+    global _cache
+    if _cache is None:
+        _cache = RuleCache()
+    return _cache.get(kind, key, build)
@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+
+from multi_replace import MultiReplacer, apply_chained, common_substring, overlaps
+from rule_table import CUSTOMER_ORDER, LITERAL_PACKS, PARTNER_ORDER, ordered_rules, rule_names
+
+# Slims a literal rule table without changing what it does.
+#
+# Removed, each with the reason as its proof:
+#   identity     old == new, so the replace is a no-op
+#   duplicate    an earlier rule already replaced every occurrence of old, and
+#   unreachable  nothing since can write it again; more generally, old contains
+#                a pattern an earlier rule removed for good. A rule removes its
+#                pattern for good when its replacement cannot form the pattern
+#                with the text around it, and it stays gone until a later
+#                replacement can (multi_replace.overlaps on both counts).
+#
+# The rules left are then rescheduled: a rule moves up into the earliest scan
+# whose rules it can share a scan with and past every later rule it commutes
+# with (neither can match inside, or create a match for, the other), so the
+# table needs as few scans as the rules allow. Inside a scan the rules keep
+# their relative order: a scan is one trie alternation, which tries every rule
+# at once whatever the order, so there is nothing to gain from sorting them by
+# how often they fire. Nor between scans: each one costs a pass over the text
+# whether it fires or not, unless its anchor is missing, and scans that commute
+# never make each other rebuild the edit buffer, so any order of them costs
+# the same. Chained replaces in the new order give the same text as in the old
+# one, and the scans of the new order are what compile_packs builds.
+#
+# The corpus hit counts (corpus_hits) only feed the report: rules that never
+# fire on the corpus are listed but kept, since a rule is for the broken text
+# that may yet turn up, not only for what is there now.
+#
+#   python rule_optimizer.py                 every pack and both app orders
+#   python rule_optimizer.py --pack partner/fix_all_syntax --emit
+
+ORDERS = {'customer': CUSTOMER_ORDER, 'partner': PARTNER_ORDER}
+GENERATED_PAGES = 300
+
+
+def commute(a, b):
+    (old_a, new_a), (old_b, new_b) = a, b
+    return not (overlaps(old_a, old_b) or overlaps(old_a, new_b) or overlaps(old_b, new_a))
+
+
+def scan_compatible(rule, earlier):
+    # Whether rule can share one left-to-right scan with a rule that precedes it
+    return not (overlaps(rule[0], earlier[0]) or overlaps(rule[0], earlier[1]))
+
+
+def dead_rules(rules, names=None):
+    # {index: reason} for the rules that can never change the text
+    names = names or [f'#{i}' for i in range(len(rules))]
+    dead = {}
+    removed = []
+    for i, (old, new) in enumerate(rules):
+        if old == new:
+            dead[i] = 'identity: replaces the text with itself'
+            continue
+        for pattern, j in removed:
+            if pattern in old:
+                if rules[j] == (old, new):
+                    dead[i] = f'duplicate of {names[j]}, which left no {pattern!r} behind'
+                else:
+                    dead[i] = f'unreachable: {names[j]} left no {pattern!r} behind and nothing since writes one'
+                break
+        if i in dead:
+            continue
+        removed = [(pattern, j) for pattern, j in removed if not overlaps(pattern, new)]
+        if not overlaps(old, new):
+            removed.append((old, i))
+    return dead
+
+
+def schedule(rules, keep):
+    # The kept rule indices regrouped into scans: [[index, ...], ...], each
+    # scan in table order
+    stages = []
+    for i in keep:
+        # i must follow the rules it does not commute with, but may share a scan with them
+        last = len(stages)
+        while last > 0 and all(commute(rules[j], rules[i]) for j in stages[last - 1]):
+            last -= 1
+        for s in range(max(last - 1, 0), len(stages)):
+            if all(scan_compatible(rules[i], rules[j]) for j in stages[s]):
+                stages[s].append(i)
+                break
+        else:
+            stages.append([i])
+    return stages
+
+
+def optimize(rules, names=None):
+    # Returns (scans, dead): scans as lists of rule indices in their new order,
+    # and {index: reason} for the rules dropped
+    dead = dead_rules(rules, names)
+    return schedule(rules, [i for i in range(len(rules)) if i not in dead]), dead
+
+
+def optimized_replacer(rules, names, scans):
+    order = [i for stage in scans for i in stage]
+    plan = [(len(stage), common_substring([rules[i][0] for i in stage])) for stage in scans]
+    return MultiReplacer([rules[i] for i in order], [names[i] for i in order], plan)
+
+
+def corpus():
+    # The app sources plus generated pages seeded with every broken form the rules fix
+    import bench
+    from file_index import ROOT, source_files
+    from trigram_index import APP_DIRECTORIES
+
+    texts = []
+    for directory in APP_DIRECTORIES:
+        for path in source_files(os.path.join(ROOT, directory), ('.ts', '.tsx', '.js', '.jsx'), skip_dts=True):
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                texts.append(f.read())
+    rng = random.Random(0)
+    seeds = bench.corruptions()
+    texts.extend(bench.generate_page(rng, i, seeds, 1.0) for i in range(GENERATED_PAGES))
+    return texts
+
+
+def corpus_hits(rules, texts):
+    # {index: occurrences} of each rule's pattern at its turn in the chain
+    hits = dict.fromkeys(range(len(rules)), 0)
+    for text in texts:
+        for i, (old, new) in enumerate(rules):
+            count = text.count(old)
+            if count:
+                hits[i] += count
+                text = text.replace(old, new)
+    return hits
+
+
+def verify(rules, names, scans, texts):
+    # Runs the old chain, the new chain and the new scans over every text;
+    # returns (differing texts, digest of all the outputs)
+    order = [rules[i] for stage in scans for i in stage]
+    replacer = optimized_replacer(rules, names, scans)
+    digest = hashlib.sha256()
+    differing = 0
+    for text in texts:
+        expected = apply_chained(text, rules)
+        if apply_chained(text, order) != expected or replacer.apply(text) != expected:
+            differing += 1
+        digest.update(hashlib.sha256(expected.encode('utf-8')).digest())
+    return differing, digest.hexdigest()[:16]
+
+
+def emit(label, rules, names, scans):
+    lines = [f'# {label}, optimized: {sum(len(stage) for stage in scans)} of {len(rules)} rules in {len(scans)} scans']
+    lines.append(f'{re.sub(r"[^A-Za-z0-9]+", "_", label).upper()} = [')
+    for s, stage in enumerate(scans):
+        for i in stage:
+            lines.append(f'    ({rules[i][0]!r}, {rules[i][1]!r}),  # {names[i]}, scan {s + 1}')
+    lines.append(']')
+    return '\n'.join(lines)
+
+
+def report(label, packs, texts, show=False):
+    from multi_replace import plan_scans
+
+    rules = ordered_rules(packs)
+    names = rule_names(packs)
+    counted = corpus_hits(rules, texts)
+    scans, dead = optimize(rules, names)
+    differing, digest = verify(rules, names, scans, texts)
+    kept = sum(len(stage) for stage in scans)
+    print(f'{label}: {kept} of {len(rules)} rules, {len(plan_scans(rules))} -> {len(scans)} scans; '
+          f'{len(texts)} corpus texts {"identical" if not differing else f"DIFFER in {differing}"} (outputs {digest})')
+    for i, reason in sorted(dead.items()):
+        print(f'  drop {names[i]} {rules[i][0]!r} -> {rules[i][1]!r}: {reason}')
+    for i in range(len(rules)):
+        if i not in dead and not counted[i]:
+            print(f'  keep {names[i]} {rules[i][0]!r}: never fires on the corpus')
+    if show:
+        print(emit(label, rules, names, scans))
+    return differing
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Drop dead literal rules and regroup the rest into fewer scans')
+    parser.add_argument('--pack', action='append', help='a rule pack to optimize (repeatable); every pack by default')
+    parser.add_argument('--order', choices=sorted(ORDERS), help='the merged table of an app\'s whole-tree scripts')
+    parser.add_argument('--emit', action='store_true', help='print the slimmed packs as rule_table source')
+    args = parser.parse_args()
+
+    tables = []
+    if args.pack:
+        unknown = [name for name in args.pack if name not in LITERAL_PACKS]
+        if unknown:
+            parser.error(f'unknown packs: {", ".join(unknown)}')
+        tables.append((' + '.join(args.pack), args.pack))
+    if args.order:
+        tables.append((f'{args.order} order', ORDERS[args.order]))
+    if not tables:
+        tables = [(name, [name]) for name in LITERAL_PACKS]
+        tables += [(f'{app} order', order) for app, order in ORDERS.items()]
+
+    texts = corpus()
+    failed = 0
+    for label, packs in tables:
+        failed += report(label, packs, texts, args.emit)
+    sys.exit(1 if failed else 0)
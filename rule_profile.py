@@ -0,0 +1,127 @@
+import argparse
+import json
+import time
+
+# Optional instrumentation of rule application.
+#
+# While a Profiler is active (see enable()), the literal stages in
+# multi_replace, the regex stages in regex_rules and transforms.apply_pipeline
+# report into it: per rule the number of matches, the files it fired in and the
+# bytes it replaced and wrote; per scan (one pass of a stage over a file) the
+# wall time and how often the anchor prefilter let it skip the file; per
+# transform the wall time, bytes in and out and files changed. A stage that
+# serves several rules is timed once, and its time is split evenly between its
+# rules. With no active profiler the engines take their normal path.
+
+active = None
+
+COLUMNS = {
+    'rules': ['hits', 'files', 'bytes_in', 'bytes_out', 'seconds'],
+    'scans': ['calls', 'skipped', 'bytes', 'seconds'],
+    'transforms': ['calls', 'changed', 'bytes_in', 'bytes_out', 'seconds'],
+}
+
+
+class Profiler:
+    def __init__(self):
+        self.tables = {name: {} for name in COLUMNS}
+        self.file_serial = 0
+        self.seen = {}
+
+    def begin_file(self):
+        self.file_serial += 1
+
+    def _row(self, table, name):
+        rows = self.tables[table]
+        if name not in rows:
+            rows[name] = dict.fromkeys(COLUMNS[table], 0)
+        return rows[name]
+
+    def rule(self, name, hits, bytes_in, bytes_out, seconds=0.0):
+        row = self._row('rules', name)
+        row['hits'] += hits
+        row['bytes_in'] += bytes_in
+        row['bytes_out'] += bytes_out
+        row['seconds'] += seconds
+        if hits and self.seen.get(name) != self.file_serial:
+            self.seen[name] = self.file_serial
+            row['files'] += 1
+
+    def scan(self, name, size, seconds, skipped=False):
+        row = self._row('scans', name)
+        row['calls'] += 1
+        row['skipped'] += int(skipped)
+        row['bytes'] += size
+        row['seconds'] += seconds
+
+    def transform(self, name, before, after, seconds):
+        row = self._row('transforms', name)
+        row['calls'] += 1
+        row['changed'] += int(before != after)
+        row['bytes_in'] += size(before)
+        row['bytes_out'] += size(after)
+        row['seconds'] += seconds
+
+    def merge(self, data):
+        for table, rows in data.items():
+            for name, values in rows.items():
+                row = self._row(table, name)
+                for column, value in values.items():
+                    row[column] += value
+
+    def to_json(self):
+        return self.tables
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.tables, f, indent=2, sort_keys=True)
+
+    def table(self, table='rules', top=20, sort='seconds'):
+        return format_table(self.tables, table, top, sort)
+
+
+def format_table(tables, table='rules', top=20, sort='seconds'):
+    columns = COLUMNS[table]
+    rows = sorted(tables.get(table, {}).items(), key=lambda item: item[1][sort], reverse=True)[:top]
+    width = max([len(name) for name, _ in rows] + [len(table)])
+    lines = [f'{table:<{width}} ' + ' '.join(f'{column:>10}' for column in columns)]
+    for name, row in rows:
+        cells = [f'{row[c] * 1000:>8.1f}ms' if c == 'seconds' else f'{row[c]:>10}' for c in columns]
+        lines.append(f'{name:<{width}} ' + ' '.join(cells))
+    return '\n'.join(lines)
+
+
+def enable():
+    global active
+    active = Profiler()
+    return active
+
+
+def disable():
+    global active
+    profiler, active = active, None
+    return profiler
+
+
+def clock():
+    return time.perf_counter()
+
+
+def size(content):
+    # Bytes of text or of a file's raw bytes
+    return len(content) if isinstance(content, bytes) else len(content.encode('utf-8'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show a saved rule profile')
+    parser.add_argument('profile', help='JSON written by fix_parallel.py --profile-json')
+    parser.add_argument('--table', choices=sorted(COLUMNS), default='rules')
+    parser.add_argument('--sort', default='seconds', help='column to sort by')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.profile, 'r', encoding='utf-8') as f:
+        tables = json.load(f)
+    if args.sort not in COLUMNS[args.table]:
+        parser.error(f'--sort must be one of {", ".join(COLUMNS[args.table])}')
+    print(format_table(tables, args.table, args.top, args.sort))
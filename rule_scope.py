@@ -0,0 +1,157 @@
+import argparse
+import os
+import re
+
+from file_index import ROOT
+
+# Which files each rule is meant for.
+#
+# A transform in transforms.TRANSFORM_SCOPES, or a literal rule in
+# rule_table.RULE_SCOPES (by its 'pack#index' name), lists globs relative to
+# the checkout. * and ? stay within one path component, a ** component spans
+# any number of directories (partner/src/** is everything below partner/src),
+# and brackets are literal, so partner/src/app/delivery/[id]/page.tsx is that
+# one file. Anything without a scope runs on every file it is given.
+#
+# Each glob is split into a directory part and a file name part. The index
+# matches the directory parts once per directory and keeps, for that
+# directory, the scopes it is outside of and the few whose name part still
+# has to be checked; a file then costs a dictionary lookup, plus a name match
+# when one is left. apply_pipeline with a path drops the transforms out of
+# scope and compiles the literal packs without the rules out of scope, so a
+# partner-only rule is never evaluated against a customer file.
+#
+#   python rule_scope.py customer/src/pages/Home.tsx partner/src/app/hub/drop/page.tsx
+
+ANY_NAME = None
+
+
+def _component(part):
+    return ''.join('[^/]*' if ch == '*' else '[^/]' if ch == '?' else re.escape(ch) for ch in part)
+
+
+def compile_glob(glob):
+    # (directory regex, file name regex or ANY_NAME); the directory is matched
+    # as '/a/b' for a/b and as '' for the checkout root
+    parts = glob.strip('/').split('/')
+    if parts[-1] == '**':
+        directories, name = parts, ANY_NAME
+    else:
+        directories, name = parts[:-1], parts[-1]
+    pattern = ''.join('(?:/[^/]+)*' if part == '**' else '/' + _component(part) for part in directories)
+    if name is not None and name != '*':
+        name = re.compile(_component(name))
+    else:
+        name = ANY_NAME
+    return re.compile(pattern), name
+
+
+class ScopeIndex:
+    def __init__(self, scopes, root=ROOT):
+        # scopes: {key: [glob, ...]}
+        self.root = root
+        self.scopes = {key: [compile_glob(glob) for glob in globs] for key, globs in scopes.items()}
+        self.directories = {}
+
+    def _directory(self, directory):
+        # (keys out of scope for every file in directory, [(key, name regexes)])
+        relative = os.path.relpath(directory, self.root).replace(os.sep, '/')
+        if relative == '..' or relative.startswith('../'):
+            # Outside the checkout no glob matches
+            return frozenset(self.scopes), []
+        target = '' if relative == '.' else '/' + relative
+        outside = []
+        by_name = []
+        for key, globs in self.scopes.items():
+            names = [name for directories, name in globs if directories.fullmatch(target)]
+            if not names:
+                outside.append(key)
+            elif ANY_NAME not in names:
+                by_name.append((key, names))
+        return frozenset(outside), by_name
+
+    def out_of_scope(self, filepath):
+        # The keys whose scope leaves filepath out
+        directory, name = os.path.split(os.path.abspath(filepath))
+        entry = self.directories.get(directory)
+        if entry is None:
+            entry = self.directories[directory] = self._directory(directory)
+        outside, by_name = entry
+        if not by_name:
+            return outside
+        missed = [key for key, names in by_name if not any(regex.fullmatch(name) for regex in names)]
+        return outside.union(missed) if missed else outside
+
+
+_index = None
+_scoped = {}
+_skipped = {}
+
+
+def scope_index():
+    global _index
+    if _index is None:
+        import transforms
+        from rule_table import LITERAL_PACKS, RULE_SCOPES, rule_names
+
+        known = set(rule_names(LITERAL_PACKS))
+        unknown = [name for name in RULE_SCOPES if name not in known]
+        if unknown:
+            raise ValueError(f'rule scopes on rules that do not exist: {", ".join(unknown)}')
+        # Rule scopes are applied where a pack is compiled on its own; a pack
+        # that is one step of a bigger transform runs without them
+        packs = {name.rsplit('#', 1)[0] for name in RULE_SCOPES}
+        unscopable = [f'{step[1]} (in {name})' for name, steps in transforms.TRANSFORM_STEPS.items()
+                      if name not in transforms.LITERAL_TRANSFORMS
+                      for step in steps if step[0] == 'literal' and step[1] in packs]
+        if unscopable:
+            raise ValueError(f'rule scopes on packs run inside other transforms: {", ".join(unscopable)}')
+        _index = ScopeIndex({**transforms.TRANSFORM_SCOPES, **RULE_SCOPES})
+    return _index
+
+
+def skipped_rules(filepath, packs):
+    # The rules of packs ('pack#index') out of scope for filepath, as compile_packs skips them
+    outside = scope_index().out_of_scope(filepath)
+    key = (outside, tuple(packs))
+    if key not in _skipped:
+        from rule_table import rule_names
+
+        _skipped[key] = tuple(name for name in rule_names(packs) if name in outside)
+    return _skipped[key]
+
+
+def scoped(filepath, pipeline):
+    # (the transforms of pipeline in scope for filepath, {literal transform: rules it skips})
+    outside = scope_index().out_of_scope(filepath)
+    key = (outside, tuple(pipeline))
+    if key not in _scoped:
+        import transforms
+
+        names = [name for name in pipeline if name not in outside]
+        skipped = {}
+        for name in names:
+            if name in transforms.LITERAL_TRANSFORMS:
+                rules = skipped_rules(filepath, [transforms.LITERAL_TRANSFORMS[name]])
+                if rules:
+                    skipped[name] = rules
+        _scoped[key] = (names, skipped)
+    return _scoped[key]
+
+
+if __name__ == '__main__':
+    import transforms
+
+    parser = argparse.ArgumentParser(description='Show the transforms and rules in scope for files')
+    parser.add_argument('files', nargs='+', help='paths to look up, relative to the working directory')
+    parser.add_argument('--pipeline', help='comma-separated transforms; every transform by default')
+    args = parser.parse_args()
+
+    pipeline = args.pipeline.split(',') if args.pipeline else list(transforms.TRANSFORMS)
+    for filepath in args.files:
+        names, skipped = scoped(filepath, pipeline)
+        print(f'{filepath}:')
+        print(f'  runs: {", ".join(names) or "nothing"}')
+        print(f'  out of scope: {", ".join(name for name in pipeline if name not in names) or "nothing"}')
+        for name, rules in skipped.items():
+            print(f'  {name} without {", ".join(rules)}')
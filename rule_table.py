@@ -0,0 +1,135 @@
+# Literal replacement rules lifted from the repair scripts, one pack per script.
+# Each pack lists (old, new) pairs in the order the script applied them with
+# chained content.replace calls.
+
+FIX_SYNTAX = [
+    ("useState('`)", "useState('')"),
+    ('useState("`)', 'useState("")'),
+    ("setSelectedVoucherCode('`)", "setSelectedVoucherCode('')"),
+    ("setIssueText('`)", "setIssueText('')"),
+    ("otp.join('`)", "otp.join('')"),
+    ("navigate('/congrats`)", "navigate('/congrats')"),
+    ("navigate('/not-available`)", "navigate('/not-available')"),
+    ("navigate('/profile`)", "navigate('/profile')"),
+    ("replace(/\\D/g, '`)", "replace(/\\D/g, '')"),
+    ("localStorage.getItem('customerId`)", "localStorage.getItem('customerId')"),
+    ("split(', `)", "split(', ')"),
+    ('split(" - `)', 'split(" - ")'),
+    ("', ' + address.addressLine2 : '`)", "', ' + address.addressLine2 : '')"),
+    ("console.log('Service check failed, continuing with save`)", "console.log('Service check failed, continuing with save')"),
+]
+
+FIX_MORE_SYNTAX = [
+    ('digit === "`)', 'digit === "")'),
+    ("digit === '`)", "digit === '')"),
+    ('=== "`', '=== ""'),
+    ("=== '`", "=== ''"),
+    ('!== "`', '!== ""'),
+    ("!== '`", "!== ''"),
+]
+
+FIX_NAVIGATE = [
+    ("navigate('/login`)", "navigate('/login')"),
+    ('navigate("/login`)', 'navigate("/login")'),
+    ("navigate('/login`);", "navigate('/login');"),
+    ('navigate("/login`);', 'navigate("/login");'),
+]
+
+FIX_PARTNER_ALL = [
+    ('`)', "')"),
+    ('"`)', '")'),
+]
+
+FIX_PARTNER_COMPLETE = [
+    ("'`)", "')"),
+    ('"`)', '")'),
+    ("useState(\"')", "useState(\"\")"),
+    ("useState('`)", "useState('')"),
+    ("getItem('partnerId')", "getItem('partnerId')"),
+    ("getItem(\"partnerId')", "getItem(\"partnerId\")"),
+]
+
+FIX_ALL_PARTNER_QUOTES = [
+    ('`}', '`'),
+    ('"}', '`}'),
+    ('\'")', "')"),
+    ('`")', '`)'),
+    ("'`)", "')"),
+    ('(")', "('')"),
+    ("('partnerId`)", "('partnerId')"),
+    ('alert(")', "alert('')"),
+    ('"delivered")', "'delivered')"),
+]
+
+PARTNER_FIX_ALL_SYNTAX = [
+    ('`)', '")'),
+    ("'`)", "'\")"),
+    ('\'")', "')"),
+    ('`}', '"}'),
+    ('`);', '");'),
+    ("'`);", "');"),
+    ('`)', '")'),
+    ('`)', '")'),
+]
+
+PARTNER_FIX_SIMPLE = [
+    ("'partnerId`)", "'partnerId')"),
+    ("'all`)", "'all')"),
+    (".replace('_', ' `)", ".replace('_', ' ')"),
+]
+
+PARTNER_FIX_QUOTES_FINAL = [
+    ("'profile\")", "'profile')"),
+    ("'partnerId\")", "'partnerId')"),
+    ("'react\"", "'react'"),
+    ("'contain\"", "'contain'"),
+    ("useState(''))", "useState('')"),
+    ("useState(''))", "useState('')"),
+]
+
+REPLACE_LOCALHOST = [
+    ("'http://localhost:3000", "`${API_URL}"),
+    ('"http://localhost:3000', '`${API_URL}'),
+    ("')", "`)"),
+    ('")', '`)'),
+]
+
+LITERAL_PACKS = {
+    'fix_syntax': FIX_SYNTAX,
+    'fix_more_syntax': FIX_MORE_SYNTAX,
+    'fix_navigate': FIX_NAVIGATE,
+    'fix_partner_all': FIX_PARTNER_ALL,
+    'fix_partner_complete': FIX_PARTNER_COMPLETE,
+    'fix_all_partner_quotes': FIX_ALL_PARTNER_QUOTES,
+    'partner/fix_all_syntax': PARTNER_FIX_ALL_SYNTAX,
+    'partner/fix_simple': PARTNER_FIX_SIMPLE,
+    'partner/fix_quotes_final': PARTNER_FIX_QUOTES_FINAL,
+    'replace_localhost': REPLACE_LOCALHOST,
+}
+
+# Rules meant for fewer files than their pack, by 'pack#index' name, as globs
+# relative to the checkout (see rule_scope.py). Only packs a literal transform
+# runs on its own can have them; rules that are left out run wherever their
+# transform does. The scripts ran every rule of a pack over the whole tree
+# they walk, which is what the transform scopes already cover, so no rule is
+# narrowed: a rule that only ever fired on one page is still wanted on the
+# next page that breaks the same way
+RULE_SCOPES = {}
+
+# Order the whole-tree scripts are run in for each app. fix_partner_all is
+# left out for the reason fix_parallel leaves it out: it rewrites valid
+# template literals, and only runs when asked for by name
+CUSTOMER_ORDER = ['fix_syntax', 'fix_more_syntax', 'fix_navigate']
+PARTNER_ORDER = ['fix_partner_complete']
+
+
+def ordered_rules(names):
+    rules = []
+    for name in names:
+        rules.extend(LITERAL_PACKS[name])
+    return rules
+
+
+def rule_names(names):
+    # 'pack#index' for every rule ordered_rules returns, in the same order
+    return [f'{name}#{i}' for name in names for i in range(len(LITERAL_PACKS[name]))]
@@ -0,0 +1,162 @@
+import difflib
+import os
+import shutil
+import sys
+import tempfile
+
+import rollback
+import structure
+
+# Shared writer for the repair scripts.
+#
+# A file is only written when its bytes actually change, so a no-op run leaves
+# every mtime alone and the dev servers have nothing to rebuild. Writes go to a
+# temp file in the same directory, fsynced, and only then renamed over the
+# original, so neither an interrupted run nor a crash leaves a half-written
+# source file. The directory fsyncs that make the renames themselves durable
+# are grouped, one per directory at flush time, together with the journal's.
+#
+# In dry-run mode nothing is written; each file that would change is printed
+# as a unified diff the moment it is compared, so only one file's before and
+# after text is held at a time. Callers pass the mode in as dry_run; the
+# scripts take it from their --dry-run option (see script_args.py).
+#
+# Every rewritten source is checked by structure before it replaces the old
+# one. A rewrite that unbalances quotes, brackets or JSX is rolled back: the
+# old bytes stay, the problem is logged with its line and column and kept in
+# rejected, and the file counts as neither written nor unchanged.
+#
+# The fixers read and write raw bytes, so a file keeps its line endings and
+# byte order mark; write_text is for text with no endings of its own.
+#
+# Unless journal is off, the old version of every file written goes into the
+# run journal first (see rollback.py), so the run can be undone.
+
+DIFF_CONTEXT = 3
+
+
+def encode_text(content):
+    # Same bytes a text-mode write with the platform's newline translation produces
+    if os.linesep != '\n':
+        content = content.replace('\n', os.linesep)
+    return content.encode('utf-8')
+
+
+def _replace(filepath, data):
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filepath) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, tmp)
+        os.replace(tmp, filepath)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return directory
+
+
+def diff_lines(filepath, before, after, context=DIFF_CONTEXT):
+    # Unified diff of two byte strings, as a stream of text lines
+    path = filepath.replace(os.sep, '/')
+    a = before.decode('utf-8', 'replace').splitlines(keepends=True) if before is not None else []
+    b = after.decode('utf-8', 'replace').splitlines(keepends=True)
+    for line in difflib.unified_diff(a, b, f'a/{path}', f'b/{path}', n=context):
+        if not line.endswith('\n'):
+            line += '\n\\ No newline at end of file\n'
+        yield line
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BatchWriter:
+    def __init__(self, dry_run=False, out=None, log=sys.stderr, validate=True, journal=None):
+        self.dry_run = dry_run
+        self.out = out
+        self.log = log
+        self.validate = validate
+        self.journal = rollback.ENABLED if journal is None else journal
+        self.journaled = False
+        self.written = []
+        self.unchanged = 0
+        self.rejected = []
+        self.directories = set()
+
+    def write_bytes(self, filepath, data, original=None):
+        # original is the file's bytes as the caller read them, saving a second read
+        before = original
+        if before is None:
+            try:
+                with open(filepath, 'rb') as f:
+                    before = f.read()
+            except FileNotFoundError:
+                before = None
+        if before == data:
+            self.unchanged += 1
+            return False
+        if self.validate and structure.checks(filepath):
+            problem = structure.regression(filepath, before, data)
+            if problem is not None:
+                self.reject(structure.StructureError(filepath, problem))
+                return False
+        if self.dry_run:
+            out = self.out or sys.stdout
+            out.writelines(diff_lines(filepath, before, data))
+            self.written.append(filepath)
+            return True
+        if self.journal:
+            rollback.current().record(filepath, before, data)
+            self.journaled = True
+        self.directories.add(_replace(filepath, data))
+        self.written.append(filepath)
+        return True
+
+    def reject(self, error):
+        self.rejected.append(error)
+        if self.log is not None:
+            self.log.write(f'Rolled back: {error.filepath} {error.problem}\n')
+
+    def skip(self):
+        # A file the caller already knows is unchanged, without reading it
+        self.unchanged += 1
+        return False
+
+    def write_text(self, filepath, content, original=None):
+        # With the original text at hand an unchanged file needs no read at all
+        if original is not None and content == original:
+            self.unchanged += 1
+            return False
+        return self.write_bytes(filepath, encode_text(content))
+
+    def flush(self):
+        if self.journaled:
+            rollback.current().sync()
+            self.journaled = False
+        # Directories cannot be opened for fsync on Windows; the rename is still atomic there
+        if os.name != 'nt':
+            for directory in self.directories:
+                _fsync_path(directory)
+        self.directories = set()
+
+    def summary(self):
+        rejected = f', {len(self.rejected)} rolled back' if self.rejected else ''
+        if self.dry_run:
+            return f'{len(self.written)} files would be written, {self.unchanged} unchanged{rejected} (dry run)'
+        return f'{len(self.written)} files written, {self.unchanged} unchanged{rejected}'
+
+
+def write_text(filepath, content, original=None):
+    writer = BatchWriter()
+    changed = writer.write_text(filepath, content, original)
+    writer.flush()
+    return changed
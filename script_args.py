@@ -0,0 +1,39 @@
+import argparse
+import os
+
+from file_index import ROOT
+from git_changes import GitError, changed_files
+
+# Command line of the standalone repair scripts.
+#
+# The scripts run top to bottom, so each one parses its options first and
+# passes them on to what it calls; nothing is read from sys.argv anywhere
+# else. Every script takes
+#
+#   --dry-run      print what would change as diffs and write nothing
+#                  (LAUNDRY_DRY_RUN=1 sets the default)
+#
+# and one that walks the trees also takes
+#
+#   --since REF    only the files changed since REF, as git reports them,
+#                  plus untracked ones (LAUNDRY_SINCE=REF sets the default)
+#
+# where a ref git cannot resolve is a usage error before any file is read.
+#
+#   python fix_syntax.py --since main --dry-run
+
+
+def parse_args(description, since=True, argv=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--dry-run', action='store_true', default=bool(os.environ.get('LAUNDRY_DRY_RUN')),
+                        help='print the changes as diffs instead of writing them')
+    if since:
+        parser.add_argument('--since', metavar='REF', default=os.environ.get('LAUNDRY_SINCE') or None,
+                            help='only process files changed since this git ref, plus untracked ones')
+    args = parser.parse_args(argv)
+    if getattr(args, 'since', None):
+        try:
+            changed_files(args.since, ROOT)
+        except GitError as e:
+            parser.error(f'--since {args.since}: {e}')
+    return args
@@ -0,0 +1,129 @@
+import argparse
+import os
+import re
+import time
+
+from ts_literals import mask_literals
+
+# Structural check of a TS/TSX/JS source after a rewrite.
+#
+# The quote cascades the old fixers left behind only showed up in a full
+# next/vite build, minutes per app. This finds the same breakage in one linear
+# pass: mask_literals walks strings, templates, comments, regex literals and
+# JSX (reporting any left open or a closing tag that does not match), then the
+# ()[]{} of the masked code are paired on a stack. Text inside literals is
+# already blanked, so a bracket in a string or in JSX text never counts.
+#
+# BatchWriter runs it on every rewritten file and keeps the old bytes when the
+# rewrite breaks the structure, or breaks it earlier in the file than it was
+# already broken.
+
+BRACKET = re.compile(r'[()[\]{}]')
+CLOSERS = {')': '(', ']': '[', '}': '{'}
+EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx', '.mjs')
+
+
+class Problem:
+    def __init__(self, content, offset, message):
+        self.offset = offset
+        self.line = content.count('\n', 0, offset) + 1
+        self.column = offset - content.rfind('\n', 0, offset)
+        self.message = message
+
+    def __str__(self):
+        return f'line {self.line} column {self.column}: {self.message}'
+
+
+class StructureError(ValueError):
+    def __init__(self, filepath, problem, transform=None):
+        blame = f' (after {transform})' if transform else ''
+        super().__init__(f'rolled back, {problem}{blame}')
+        self.filepath = filepath
+        self.problem = problem
+        self.transform = transform
+
+
+def _position(content, offset):
+    return f'{content.count(chr(10), 0, offset) + 1}:{offset - content.rfind(chr(10), 0, offset)}'
+
+
+def _brackets(content, masked, problems):
+    stack = []
+    for found in BRACKET.finditer(masked):
+        i = found.start()
+        ch = found.group()
+        if ch not in CLOSERS:
+            stack.append(i)
+            continue
+        if not stack:
+            problems.append((i, f'unmatched {ch}'))
+            return
+        opened = stack.pop()
+        if masked[opened] != CLOSERS[ch]:
+            problems.append((i, f'{ch} closes {masked[opened]} from {_position(content, opened)}'))
+            return
+    if stack:
+        problems.append((stack[-1], f'{masked[stack[-1]]} is never closed'))
+
+
+def check(content, jsx=True):
+    # The first structural problem of content, or None. A literal or element
+    # left open is the cause of any bracket it swallows, so those come first
+    problems = []
+    masked = mask_literals(content, jsx, problems)
+    if not problems:
+        _brackets(content, masked, problems)
+    if not problems:
+        return None
+    return Problem(content, *problems[0])
+
+
+def checks(filepath):
+    return filepath.endswith(EXTENSIONS)
+
+
+def check_file(filepath, content):
+    return check(content, jsx=not filepath.endswith('.ts'))
+
+
+def _text(content):
+    return content.decode('utf-8', 'replace') if isinstance(content, bytes) else content
+
+
+def regression(filepath, before, after):
+    # The problem a rewrite from before to after (text or bytes) introduces, or
+    # None. A file that was already broken may stay broken, but not from an
+    # earlier line: the rules keep line counts, so an earlier first problem is a new one
+    before = _text(before)
+    after = _text(after)
+    problem = check_file(filepath, after)
+    if problem is None or before is None:
+        return problem
+    old = check_file(filepath, before)
+    if old is not None and old.line <= problem.line:
+        return None
+    return problem
+
+
+if __name__ == '__main__':
+    from file_index import ROOT, source_files
+    from trigram_index import APP_DIRECTORIES
+
+    parser = argparse.ArgumentParser(description='Check the app sources for unbalanced quotes, brackets and JSX')
+    parser.add_argument('paths', nargs='*', help='files to check instead of the app trees')
+    args = parser.parse_args()
+
+    if args.paths:
+        paths = args.paths
+    else:
+        os.chdir(ROOT)
+        paths = [path for directory in APP_DIRECTORIES for path in source_files(directory, EXTENSIONS, skip_dts=True)]
+    started = time.perf_counter()
+    broken = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            problem = check_file(path, f.read())
+        if problem is not None:
+            broken += 1
+            print(f'{path}:{problem.line}:{problem.column}: {problem.message}')
+    print(f'{len(paths)} files checked, {broken} broken ({(time.perf_counter() - started) * 1000:.0f} ms)')
@@ -0,0 +1,162 @@
+import os
+
+import pytest
+
+import file_index
+from api_inventory import PARAM, Inventory, Route, find_route, split_url
+
+# The inventory on a scratch checkout: calls are matched to the most specific
+# route file, URLs are read as the API_URL rules will write them, and each hot
+# spot (a fetch per item, per render, on a timer, to a method the route does
+# not export, or one GET loaded twice as a page comes up) is flagged where it is
+
+ROUTES = {
+    'orders/route.ts': 'export async function GET() {}\nexport async function POST() {}\n',
+    'orders/[id]/route.ts': 'export async function GET() {}\n',
+    'orders/stats/route.ts': 'export const GET = async () => {};\n',
+    '(mobile)/pickups/route.ts': 'export async function GET() {}\n',
+    'files/[...path]/route.ts': 'export async function GET() {}\n',
+    'unused/route.ts': "// export async function PUT() {}\nexport async function GET() { return 'export function POST' }\n",
+}
+
+LAYOUT = '''import { useEffect } from 'react';
+import { API_URL } from '@/config/api';
+
+export default function Layout({ children }) {
+  useEffect(() => {
+    fetch(`${API_URL}/api/orders`);
+  }, []);
+  return children;
+}
+'''
+
+PAGE = '''import { useEffect, useState } from 'react';
+import { API_URL } from '@/config/api';
+import { loadStats } from '@/lib/stats';
+
+export default function OrdersPage({ items }) {
+  const [orders, setOrders] = useState([]);
+
+  useEffect(() => {
+    fetch(`${API_URL}/api/orders`).then(r => r.json()).then(setOrders);
+  }, []);
+
+  useEffect(() => {
+    items.map(item => fetch(`${API_URL}/api/orders/${item.id}`));
+  }, [items]);
+
+  const refresh = () => {
+    fetch('${API_URL}/api/pickups');
+  };
+  useEffect(() => {
+    const timer = setInterval(refresh, 5000);
+    return () => clearInterval(timer);
+  }, []);
+
+  const remove = async (id) => {
+    await fetch(`${API_URL}/api/orders`, { method: 'DELETE' });
+  };
+
+  fetch('http://localhost:3000/api/files/a/b');
+  fetch('https://maps.example.com/api/geocode');
+
+  return <button onClick={() => remove(1)}>{orders.length}</button>;
+}
+'''
+
+STATS = '''import { API_URL } from '@/config/api';
+
+export async function loadStats() {
+  const url = `${API_URL}/api/orders/stats`;
+  return fetch(url);
+}
+'''
+
+
+@pytest.fixture
+def checkout(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_index, '_index', file_index.FileIndex(snapshot=None))
+    files = {os.path.join('admin panel/app/api', path): text for path, text in ROUTES.items()}
+    files.update({
+        'customer/src/app/layout.tsx': LAYOUT,
+        'customer/src/app/orders/page.tsx': PAGE,
+        'customer/src/lib/stats.ts': STATS,
+    })
+    for path, text in files.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return tmp_path
+
+
+def route(path):
+    return Route(path, ['GET'])
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('/api/orders', '/api/orders'),
+    ('/api/orders/stats', '/api/orders/stats'),
+    (f'/api/orders/{PARAM}', '/api/orders/[id]'),
+    ('/api/orders/42', '/api/orders/[id]'),
+    ('/api/files/a/b', '/api/files/[...path]'),
+    ('/api/files', None),
+    ('/api/orders/1/items', None),
+])
+def test_most_specific_route(url, expected):
+    routes = [route(path) for path in ['/api/orders', '/api/orders/[id]', '/api/orders/stats', '/api/files/[...path]']]
+    found = find_route(routes, split_url(url)[1])
+    assert (found.path if found else None) == expected
+
+
+@pytest.mark.parametrize('url, kind', [
+    (f'{PARAM}/api/orders', 'api'),
+    ('http://localhost:3000/api/orders', 'api'),
+    ('https://maps.example.com/api/geocode', 'external'),
+    ('https://example.com/x', 'external'),
+    (f'{PARAM}/health', 'unresolved'),
+])
+def test_split_url(url, kind):
+    assert split_url(url)[0] == kind
+
+
+def sites(inventory, path):
+    return sorted((site.line, site.method, site.route.path if site.route else None, sorted(site.triggers))
+                  for site in inventory.sites if site.path.endswith(path))
+
+
+def test_call_sites(checkout):
+    inventory = Inventory(['customer'])
+    assert {route.path: route.methods for route in inventory.routes} == {
+        '/api/orders': ['GET', 'POST'],
+        '/api/orders/[id]': ['GET'],
+        '/api/orders/stats': ['GET'],
+        '/api/pickups': ['GET'],
+        '/api/files/[...path]': ['GET'],
+        '/api/unused': ['GET'],
+    }
+    assert sites(inventory, 'page.tsx') == [
+        (9, 'GET', '/api/orders', ['mount']),
+        (13, 'GET', '/api/orders/[id]', ['effect [items]']),
+        (17, 'GET', '/api/pickups', ['poll 5s']),
+        (25, 'DELETE', '/api/orders', ['event']),
+        (28, 'GET', '/api/files/[...path]', ['render']),
+        (29, 'GET', None, ['render']),
+    ]
+    # The URL held in a variable is followed to its assignment
+    assert sites(inventory, 'stats.ts') == [(5, 'GET', '/api/orders/stats', ['call'])]
+
+
+def test_hot_spots(checkout):
+    inventory = Inventory(['customer'])
+    smells = sorted((site.line, kind) for site in inventory.sites if site.path.endswith('page.tsx')
+                    for kind, note in site.smells)
+    assert smells == [(13, 'loop'), (17, 'poll'), (25, 'missing'), (28, 'render'), (29, 'render')]
+    # The layout and the page both load the orders as the page comes up
+    assert [(os.path.basename(page), route, len(found)) for page, route, found in inventory.repeated] == \
+        [('page.tsx', '/api/orders', 2)]
+    report = '\n'.join(inventory.report())
+    assert 'Routes no app calls (1)\n  /api/unused' in report
+    assert 'external' in report and 'maps.example.com' in report
+    data = inventory.to_json()
+    assert data['routes']['/api/orders']['sites'] == 3
@@ -0,0 +1,70 @@
+import os
+import random
+
+import pytest
+
+import bench
+import rollback
+import transforms
+
+# The benchmark's corpus and its bookkeeping: a seed gives the same corpus
+# every time, seeded pages carry the broken forms the rules are for, a run
+# times every transform without touching the files, and compare only reports
+# timings slower than the tolerance
+
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+
+
+def corpus(directory):
+    return {os.path.relpath(path, directory): content for path, content in bench.load_corpus(str(directory))}
+
+
+def test_same_seed_same_corpus(tmp_path):
+    bench.generate_corpus(str(tmp_path / 'a'), 12, seed=3)
+    bench.generate_corpus(str(tmp_path / 'b'), 12, seed=3)
+    bench.generate_corpus(str(tmp_path / 'c'), 12, seed=4)
+    a = corpus(tmp_path / 'a')
+    assert len(a) == 12
+    assert a == corpus(tmp_path / 'b')
+    assert a != corpus(tmp_path / 'c')
+    assert {path.split(os.sep)[0] for path in a} == {'customer', 'partner'}
+
+
+def test_corruptions_are_seeded():
+    seeds = bench.corruptions()
+    rng = random.Random(0)
+    clean = [bench.generate_page(rng, i, seeds, 0.0) for i in range(20)]
+    broken = [bench.generate_page(rng, i, seeds, 1.0) for i in range(20)]
+    assert not any(seed in page for page in clean for seed in bench.SEEDED[:6])
+    assert any(seed + ';' in page for page in broken for seed in seeds)
+    # The seeded pages are what the transforms have work on
+    assert any(transforms.apply_pipeline(page, ['fix_all_apis']) != page for page in broken)
+
+
+def test_run_times_every_transform_and_writes_nothing(tmp_path):
+    bench.generate_corpus(str(tmp_path), 4)
+    before = {entry.path: (entry.size, entry.mtime_ns) for entry in bench.scan(str(tmp_path))[0]}
+    run = bench.bench_corpus(str(tmp_path), repeat=1, per_rule=False)
+    assert run['files'] == 4
+    assert run['bytes'] == sum(size for size, _ in before.values())
+    assert set(run['transforms']) == set(transforms.TRANSFORMS)
+    assert run['rules'] == {}
+    assert run['io']['seconds'] > 0
+    assert {entry.path: (entry.size, entry.mtime_ns) for entry in bench.scan(str(tmp_path))[0]} == before
+
+
+def timing(mb_per_s):
+    return {'seconds': 1.0, 'files_per_s': 1.0, 'mb_per_s': mb_per_s}
+
+
+def test_compare_reports_only_slowdowns():
+    baseline = {'runs': {'10': {'io': timing(100), 'transforms': {'fast': timing(10), 'slow': timing(10)}, 'rules': {}}}}
+    results = {'runs': {
+        '10': {'io': timing(90), 'transforms': {'fast': timing(20), 'slow': timing(8), 'new': timing(1)}, 'rules': {}},
+        '20': {'io': timing(1), 'transforms': {}, 'rules': {}},
+    }}
+    assert bench.compare(baseline, results, tolerance=0.15) == ['10 files: slow 10 -> 8 MB/s (20% slower)']
+    assert bench.compare(baseline, results, tolerance=0.25) == []
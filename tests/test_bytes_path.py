@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+import fix_parallel
+import rollback
+import transforms
+from test_rule_engines import TEXTS
+from ts_literals import BOM, BOM_BYTES
+
+# The bytes path against the text path: every transform fixes the raw bytes
+# of a file exactly as it fixes its text, and a CRLF file or one with a byte
+# order mark comes out as the LF file without one would, with its own line
+# endings and mark kept
+
+SAMPLE = [text.replace('\r\n', '\n') for text in random.Random(0).sample(TEXTS, 150)]
+
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+
+
+@pytest.mark.parametrize('name', sorted(transforms.TRANSFORMS))
+def test_bytes_match_text(name):
+    for text in SAMPLE:
+        assert transforms.apply_pipeline(text.encode('utf-8'), [name]) == transforms.apply_pipeline(text, [name]).encode('utf-8')
+
+
+@pytest.mark.parametrize('name', sorted(transforms.TRANSFORMS))
+def test_crlf_kept(name):
+    # A text without a line break has no line ending to keep
+    for text in SAMPLE:
+        if '\n' not in text:
+            continue
+        data = text.encode('utf-8')
+        fixed = transforms.apply_pipeline(data, [name])
+        assert transforms.apply_pipeline(data.replace(b'\n', b'\r\n'), [name]) == fixed.replace(b'\n', b'\r\n')
+
+
+@pytest.mark.parametrize('name', sorted(transforms.TRANSFORMS))
+def test_bom_kept(name):
+    for text in SAMPLE:
+        data = text.encode('utf-8')
+        fixed = transforms.apply_pipeline(data, [name])
+        assert transforms.apply_pipeline(BOM_BYTES + data, [name]) == BOM_BYTES + fixed
+        assert transforms.apply_pipeline(BOM + text, [name]) == BOM + fixed.decode('utf-8')
+
+
+def test_import_uses_the_file_line_ending():
+    data = b"import a from 'a';\r\nconst r = fetch('http://localhost:3000/api/x');\r\n"
+    fixed = transforms.apply_pipeline(data, ['replace_api_url'])
+    assert b"import a from 'a';\r\nimport { API_URL } from '@/config/api';\r\n" in fixed
+    assert fixed.count(b'\n') == fixed.count(b'\r\n')
+
+
+def test_fixed_file_keeps_its_bytes(tmp_path):
+    page = tmp_path / 'page.tsx'
+    page.write_bytes(BOM_BYTES + b"import a from 'a';\r\nconst r = fetch('http://localhost:3000/api/x');\r\n")
+    results, tables, diffs = fix_parallel.fix_chunk([('customer', str(page), 0, ['replace_api_url'])])
+    assert [(result[1], result[3], result[5]) for result in results] == [(str(page), True, None)]
+    data = page.read_bytes()
+    assert data.startswith(BOM_BYTES + b"import a from 'a';\r\nimport { API_URL } from '@/config/api';\r\n")
+    assert b'localhost' not in data and data.count(b'\n') == data.count(b'\r\n')
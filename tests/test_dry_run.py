@@ -0,0 +1,65 @@
+import io
+import shutil
+import subprocess
+
+import pytest
+
+import rollback
+import script_args
+from safe_write import BatchWriter, diff_lines
+
+# Dry runs: the diff a writer prints is a patch that turns the old file into
+# what would have been written, each file's diff is out before the next file
+# is looked at, and --dry-run (or LAUNDRY_DRY_RUN) is what turns it on
+
+BEFORE = ''.join(f'line {i}\n' for i in range(20)).encode()
+
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+
+
+@pytest.mark.skipif(shutil.which('patch') is None, reason='needs patch')
+@pytest.mark.parametrize('after', [
+    BEFORE.replace(b'line 3\n', b'line three\n').replace(b'line 17\n', b''),
+    BEFORE + b'no newline',
+    BEFORE[:-1],
+    b'',
+], ids=['two-hunks', 'adds-unterminated', 'drops-final-newline', 'emptied'])
+def test_diff_applies_as_a_patch(tmp_path, after):
+    page = tmp_path / 'page.tsx'
+    page.write_bytes(BEFORE)
+    diff = ''.join(diff_lines('page.tsx', BEFORE, after))
+    subprocess.run(['patch', '-s', '-p1'], input=diff.encode(), cwd=tmp_path, check=True)
+    assert page.read_bytes() == after
+
+
+def test_new_file_diff():
+    lines = list(diff_lines('src/new.ts', None, b'a\nb\n'))
+    assert lines[:3] == ['--- a/src/new.ts\n', '+++ b/src/new.ts\n', '@@ -0,0 +1,2 @@\n']
+    assert lines[3:] == ['+a\n', '+b\n']
+
+
+def test_each_diff_is_out_before_the_next_file(tmp_path):
+    out = io.StringIO()
+    printed = []
+    writer = BatchWriter(dry_run=True, out=out)
+    pages = [tmp_path / f'page{i}.ts' for i in range(3)]
+    for page in pages:
+        page.write_bytes(BEFORE)
+    for page in pages:
+        printed.append(out.getvalue().count('+++ '))
+        writer.write_bytes(str(page), BEFORE + b'added\n')
+    assert printed == [0, 1, 2]
+    assert out.getvalue().count('+added\n') == 3
+    assert all(page.read_bytes() == BEFORE for page in pages)
+
+
+def test_dry_run_option(monkeypatch):
+    monkeypatch.delenv('LAUNDRY_DRY_RUN', raising=False)
+    monkeypatch.delenv('LAUNDRY_SINCE', raising=False)
+    assert not script_args.parse_args('x', argv=[]).dry_run
+    assert script_args.parse_args('x', argv=['--dry-run']).dry_run
+    monkeypatch.setenv('LAUNDRY_DRY_RUN', '1')
+    assert script_args.parse_args('x', since=False, argv=[]).dry_run
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from edit_buffer import EditBuffer, EditConflict
+
+# The edit buffer against building the text edit by edit: batches merged in
+# any order give the same text as text or bytes, an edit that overlaps one
+# already recorded raises EditConflict naming both rules and leaves the buffer
+# as it was, and a flush starts the offsets over from the built text
+
+
+def random_edits(rng, size):
+    # Non-overlapping (start, end, replacement) edits, insertions included
+    cuts = sorted(rng.sample(range(size + 1), min(size + 1, rng.randint(0, 24))))
+    edits = []
+    for start, end in zip(cuts[::2], cuts[1::2]):
+        if rng.random() < 0.2:
+            end = start
+        edits.append((start, end, rng.choice(['', 'x', 'YY', '${API_URL}', 'é'])))
+    return edits
+
+
+def built(text, edits):
+    for start, end, replacement in sorted(edits, reverse=True):
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def merge(buffer, batch, owner):
+    batch = sorted(batch)
+    buffer.merge([e[0] for e in batch], [e[1] for e in batch], [e[2] for e in batch], owner)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_batches_in_any_order(seed):
+    rng = random.Random(seed)
+    text = ''.join(rng.choice('ab\n') for _ in range(rng.randint(0, 60)))
+    edits = random_edits(rng, len(text))
+    rng.shuffle(edits)
+    as_text = EditBuffer(text)
+    as_bytes = EditBuffer(text.encode('utf-8'))
+    k = 0
+    while k < len(edits):
+        size = rng.randint(1, 4)
+        merge(as_text, edits[k:k + size], f'rule{k}')
+        merge(as_bytes, [(s, e, r.encode('utf-8')) for s, e, r in edits[k:k + size]], f'rule{k}')
+        k += size
+    assert len(as_text) == len(edits)
+    assert as_text.result() == built(text, edits)
+    assert as_bytes.result() == built(text, edits).encode('utf-8')
+
+
+@pytest.mark.parametrize('start, end', [(2, 5), (4, 6), (1, 4), (3, 3), (5, 7), (4, 4)])
+def test_overlap_conflicts(start, end):
+    buffer = EditBuffer('0123456789')
+    merge(buffer, [(3, 6, 'x'), (8, 9, 'y')], 'first')
+    with pytest.raises(EditConflict) as raised:
+        merge(buffer, [(0, 1, 'a'), (start, end, 'b')], 'second')
+    assert (raised.value.owner, raised.value.other_owner) == ('second', 'first')
+    assert raised.value.other_span == (3, 6)
+    assert 'second edits' in str(raised.value) and 'the edit of first at 3:6' in str(raised.value)
+    # Nothing of the failed batch was kept
+    assert buffer.result() == '012x67y9'
+
+
+@pytest.mark.parametrize('start, end', [(0, 3), (6, 8), (9, 9), (6, 6), (10, 10)])
+def test_touching_edits_do_not_conflict(start, end):
+    buffer = EditBuffer('0123456789')
+    merge(buffer, [(3, 6, 'x'), (8, 9, 'y')], 'first')
+    merge(buffer, [(start, end, '_')], 'second')
+    assert buffer.result() == built('0123456789', [(3, 6, 'x'), (8, 9, 'y'), (start, end, '_')])
+
+
+def test_next_start():
+    buffer = EditBuffer('0123456789')
+    assert buffer.next_start(0) == 11
+    merge(buffer, [(3, 6, 'x'), (8, 9, 'y')], 'first')
+    assert [buffer.next_start(offset) for offset in (0, 3, 5, 6, 8, 9)] == [3, 3, 3, 8, 8, 11]
+
+
+def test_flush_and_apply():
+    buffer = EditBuffer('hello world')
+    merge(buffer, [(0, 5, 'HELLO')], 'upper')
+    assert buffer.written == {'HELLO'}
+    assert buffer.apply(lambda text: text.replace('world', 'there')) == 'HELLO there'
+    assert not buffer and buffer.written == set()
+    # Offsets now count in the built text
+    merge(buffer, [(6, 11, 'you')], 'again')
+    assert buffer.result() == 'HELLO you'
+    assert buffer.flush() == 'HELLO you' and buffer.text == 'HELLO you'
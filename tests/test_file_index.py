@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import file_index
+from file_index import FileIndex, changed_entries, scan
+
+# Source enumeration on a scratch tree: ignored directories are never
+# entered, a snapshot is reused until a directory changes, and changed_entries
+# spells paths the way a walk of the same directory does
+
+TREE = [
+    'src/app/page.tsx',
+    'src/app/page.test.ts',
+    'src/types/global.d.ts',
+    'src/lib/api.ts',
+    'src/lib/readme.md',
+    'src/node_modules/pkg/index.ts',
+    'src/android/app/Main.ts',
+    'src/__MACOSX/src/._page.tsx',
+    'src/.next/server/page.ts',
+]
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for relative in TREE:
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('x\n')
+    return tmp_path
+
+
+def names(entries):
+    return sorted(os.path.relpath(entry.path, 'src').replace(os.sep, '/') for entry in entries)
+
+
+def test_scan_skips_ignored_directories(tree):
+    files, directories = scan('src')
+    assert names(files) == ['app/page.test.ts', 'app/page.tsx', 'lib/api.ts', 'lib/readme.md', 'types/global.d.ts']
+    assert not any(part in file_index.IGNORED_DIRS for path in directories for part in path.split(os.sep))
+
+
+def test_files_by_extension(tree):
+    index = FileIndex(snapshot=None)
+    assert names(index.files('src', ('.ts', '.tsx'), skip_dts=True)) == ['app/page.test.ts', 'app/page.tsx', 'lib/api.ts']
+    assert 'types/global.d.ts' in names(index.files('src'))
+
+
+def test_snapshot_reused_until_a_directory_changes(tree, monkeypatch):
+    snapshot = str(tree / 'index.json')
+    first = FileIndex(snapshot)
+    listed = first.files('src')
+    first.save()
+
+    def no_walk(directory, ignored):
+        raise AssertionError('walked a tree the snapshot covers')
+    real_scan = file_index.scan
+    monkeypatch.setattr(file_index, 'scan', no_walk)
+    assert FileIndex(snapshot).files('src') == listed
+
+    (tree / 'src' / 'lib' / 'orders.ts').write_text('x\n')
+    monkeypatch.setattr(file_index, 'scan', real_scan)
+    assert 'lib/orders.ts' in names(FileIndex(snapshot).files('src'))
+
+
+def test_changed_entries_match_the_walk(tree):
+    paths = [str(tree / relative) for relative in TREE] + [str(tree / 'src' / 'gone.ts'), str(tree / 'other.ts')]
+    entries = changed_entries('src', paths, ('.ts', '.tsx'), skip_dts=True)
+    walked = FileIndex(snapshot=None).files('src', ('.ts', '.tsx'), skip_dts=True)
+    assert entries == walked
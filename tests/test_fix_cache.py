@@ -0,0 +1,83 @@
+import os
+import shutil
+
+import pytest
+
+import fix_cache
+import rollback
+from fix_cache import FixCache, fix_cached
+from rule_cache import RULE_MODULES
+
+# The manifest of fixed files: an entry holds while the bytes and the rules
+# are the same, and stops matching when either changes, even within one
+# mtime tick
+
+PIPELINE = ['replace_api_url']
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FixCache(str(tmp_path / 'cache.json'))
+
+
+@pytest.fixture
+def page(tmp_path):
+    path = tmp_path / 'page.ts'
+    path.write_bytes(b'export const x = 1\n')
+    return path
+
+
+def test_fixed_until_the_bytes_change(cache, page):
+    assert not cache.is_fixed(str(page), PIPELINE)
+    cache.mark_fixed(str(page), PIPELINE)
+    assert cache.is_fixed(str(page), PIPELINE)
+    assert not cache.is_fixed(str(page), PIPELINE + ['fix_fetch'])
+    page.write_bytes(b'export const x = 2\n')
+    assert not cache.is_fixed(str(page), PIPELINE)
+
+
+def test_same_size_same_mtime_edit_is_caught(cache, page):
+    cache.mark_fixed(str(page), PIPELINE)
+    mtime = os.stat(page).st_mtime_ns
+    page.write_bytes(b'export const y = 1\n')
+    os.utime(page, ns=(mtime, mtime))
+    assert not cache.is_fixed(str(page), PIPELINE)
+
+
+def test_touched_file_stays_fixed(cache, page):
+    cache.mark_fixed(str(page), PIPELINE)
+    mtime = os.stat(page).st_mtime_ns + 10 ** 9
+    os.utime(page, ns=(mtime, mtime))
+    assert cache.is_fixed(str(page), PIPELINE)
+    assert cache.entries[fix_cache.file_key(str(page))]['mtime_ns'] == mtime
+
+
+def test_entries_survive_a_reload(cache, page):
+    cache.mark_fixed(str(page), PIPELINE)
+    cache.save()
+    assert FixCache(cache.path).is_fixed(str(page), PIPELINE)
+
+
+def test_editing_a_rule_module_changes_the_fingerprint(tmp_path, monkeypatch):
+    for name in RULE_MODULES:
+        shutil.copy(os.path.join(fix_cache.HERE, name), tmp_path / name)
+    monkeypatch.setattr(fix_cache, 'HERE', str(tmp_path))
+    before = fix_cache.rules_fingerprint(PIPELINE)
+    for name in RULE_MODULES:
+        with open(tmp_path / name, 'a', encoding='utf-8') as f:
+            f.write('\n# edited\n')
+        after = fix_cache.rules_fingerprint(PIPELINE)
+        assert after != before, name
+        before = after
+
+
+def test_fix_cached_marks_what_it_fixed(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+    path = tmp_path / 'orders.ts'
+    path.write_bytes(b"fetch('http://localhost:3000/api/orders')\n")
+    assert fix_cached(str(path), PIPELINE, cache)
+    fixed = path.read_bytes()
+    assert b'${API_URL}' in fixed
+    assert cache.is_fixed(str(path), PIPELINE)
+    assert not fix_cached(str(path), PIPELINE, cache)
+    assert path.read_bytes() == fixed
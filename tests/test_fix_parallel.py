@@ -0,0 +1,61 @@
+import os
+
+import bench
+import fix_parallel
+import rollback
+import transforms
+from file_index import FileIndex, scan
+
+# The process-pool driver against the pipelines run one file at a time: the
+# same files come out changed in a dry run of a generated checkout, chunks
+# carry every job once, and a worker's chunk writes what apply_pipeline returns
+
+
+def test_chunks_hold_every_job_once():
+    jobs = [('customer', f'f{i}', size, []) for i, size in enumerate([90, 5, 40, 40, 1, 70, 3, 3])]
+    chunks = fix_parallel.chunk_by_size(jobs, 3)
+    assert sorted(job for chunk in chunks for job in chunk) == sorted(jobs)
+    loads = sorted(sum(job[2] for job in chunk) for chunk in chunks)
+    assert loads[-1] - loads[0] <= 90
+
+
+def files():
+    return {entry.path: (entry.size, entry.mtime_ns) for directory in ('customer/src', 'partner/src')
+            for entry in scan(directory)[0]}
+
+
+def test_dry_run_matches_sequential(tmp_path, capsys, monkeypatch):
+    # A generated checkout, some of whose pages still call localhost:3000; the
+    # targets are relative to it, as the script runs from the checkout
+    bench.generate_corpus(str(tmp_path), 40)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(fix_parallel, 'FileIndex', lambda: FileIndex(snapshot=None))
+    apps = ['customer', 'partner']
+    before = files()
+    results, skipped = fix_parallel.run(apps, 2, dry_run=True, use_index=False)
+    assert skipped == 0
+    assert {result[1] for result in results} == set(before)
+    diffs = capsys.readouterr().out
+    for app, filepath, pipeline, changed, stable, error in results:
+        assert error is None
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        assert changed == (transforms.apply_pipeline(content, pipeline, filepath) != content), filepath
+        assert (f'+++ b/{filepath.replace(os.sep, "/")}' in diffs) == changed
+    assert any(result[3] for result in results)
+    assert files() == before
+
+
+def test_chunk_writes_the_pipeline_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+    pipeline = ['replace_api_url']
+    broken = tmp_path / 'orders.ts'
+    broken.write_bytes(b"fetch('http://localhost:3000/api/orders')\r\n")
+    clean = tmp_path / 'clean.ts'
+    clean.write_bytes(b'export const x = 1\n')
+    expected = transforms.apply_pipeline(broken.read_bytes(), pipeline, str(broken))
+    chunk = [('customer', str(path), 0, pipeline) for path in (broken, clean)]
+    results, tables, diffs = fix_parallel.fix_chunk(chunk)
+    assert [(result[3], result[5]) for result in results] == [(True, None), (False, None)]
+    assert broken.read_bytes() == expected != b"fetch('http://localhost:3000/api/orders')\r\n"
+    assert clean.read_bytes() == b'export const x = 1\n'
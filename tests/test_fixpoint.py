@@ -0,0 +1,91 @@
+import random
+import re
+
+import pytest
+
+import fixpoint
+import transforms
+from regex_rules import REGEX_PACKS
+from rule_table import LITERAL_PACKS
+from test_rule_engines import TEXTS
+
+# The feed analysis behind is_one_pass: packs whose rules only write where
+# no rule reads differently are proven to settle in one pass, a pack that can
+# write its own pattern is not, and every pipeline proven one-pass really
+# leaves nothing for a second pass on the test corpus
+
+
+@pytest.fixture
+def pack(monkeypatch):
+    # Registers a transform made of the given (kind, rules) steps
+    def register(*steps):
+        name = f'test_{len(transforms.TRANSFORM_STEPS)}'
+        plan = []
+        for i, (kind, rules) in enumerate(steps):
+            monkeypatch.setitem(LITERAL_PACKS if kind == 'literal' else REGEX_PACKS, f'{name}#{i}', rules)
+            plan.append((kind, f'{name}#{i}'))
+        monkeypatch.setitem(transforms.TRANSFORM_STEPS, name, plan)
+        return name
+    return register
+
+
+def run(steps, text):
+    for kind, rules in steps:
+        for old, new in rules:
+            text = text.replace(old, new) if kind == 'literal' else re.sub(old, new, text)
+    return text
+
+
+NO_FEEDS = [
+    ('regex', [(r'<b>([^<*]*)</b>', r'**\1**')]),
+    # The regex's group takes the quote the literal writes as readily as the
+    # backtick it replaces, so the regex finds nothing new after the literal
+    ('literal', [("useState('`)", "useState('')"), ("navigate('/login`)", "navigate('/login')")]),
+]
+SELF_FEEDING = [
+    ('literal', [('`}', '`')]),
+]
+
+
+def test_no_feeds_is_one_pass(pack):
+    analysis = fixpoint.Analysis([pack(*NO_FEEDS)])
+    assert analysis.one_pass, analysis.report()
+    assert not analysis.cycles()
+    once = run(NO_FEEDS, "<b>useState('`)</b><b>navigate('/login`)</b>")
+    assert once == "**useState('')****navigate('/login')**"
+    assert run(NO_FEEDS, once) == once
+
+
+def test_self_feeding_is_not_one_pass(pack):
+    analysis = fixpoint.Analysis([pack(*SELF_FEEDING)])
+    assert not analysis.one_pass
+    assert [[step.name for step in group] for group in analysis.cycles()] == [[analysis.steps[0].name]]
+    # `}} loses one brace per pass
+    assert run(SELF_FEEDING, 'x`}}') == 'x`}'
+
+
+def test_backward_feed_is_not_one_pass(pack):
+    # The literal writes the closing quote the regex before it needs
+    steps = [('regex', [(r"'([a-z]+)'", r'"\1"')]), ('literal', [('x`', "x'")])]
+    analysis = fixpoint.Analysis([pack(*steps)])
+    assert not analysis.one_pass
+    assert run(steps, "'abx`") == "'abx'"
+    assert run(steps, "'abx'") == '"abx"'
+
+
+def test_untouched_quotes_do_not_compete(pack):
+    # The backtick the literal rewrites can sit inside the regex's group, but
+    # the group takes the new quote just as well
+    analysis = fixpoint.Analysis([pack(('regex', [(r'"(\$\{API_URL\}[^"]*)"', r'`\1`')]),
+                                       ('literal', [("useState('`)", "useState('')")]))])
+    assert analysis.competing() == []
+
+
+@pytest.mark.parametrize('name', sorted(transforms.TRANSFORM_STEPS))
+def test_one_pass_transforms_settle(name):
+    if not fixpoint.analyze([name]).one_pass:
+        pytest.skip('needs repeated passes')
+    rng = random.Random(name)
+    for text in rng.sample(TEXTS, 200):
+        once = transforms.apply_pipeline(text, [name])
+        assert transforms.apply_pipeline(once, [name]) == once
@@ -0,0 +1,95 @@
+import os
+import subprocess
+
+import pytest
+
+import file_index
+import git_changes
+import script_args
+from git_changes import GitError, changed_files, changed_since
+
+# --since on a scratch repository: the files a branch touched are its commits,
+# its staged and unstaged edits and its untracked files, less deletions,
+# renames and ignored files; the scripts read only those, and a ref git cannot
+# resolve is a usage error
+
+
+def git(repo, *args):
+    subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', *args], cwd=repo, check=True,
+                   capture_output=True)
+
+
+def write(repo, name, text='x\n'):
+    path = repo / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(git_changes, '_changed', {})
+    for name in ['app/src/kept.ts', 'app/src/edited.ts', 'app/src/staged.ts', 'app/src/gone.ts',
+                 'app/src/old.ts', 'app/src/committed.ts', 'app/README.md']:
+        write(tmp_path, name)
+    write(tmp_path, '.gitignore', 'build/\n')
+    git(tmp_path, 'init', '-q', '-b', 'main')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-qm', 'base')
+    git(tmp_path, 'checkout', '-qb', 'feature')
+    write(tmp_path, 'app/src/committed.ts', 'y\n')
+    git(tmp_path, 'commit', '-qam', 'branch')
+    write(tmp_path, 'app/src/staged.ts', 'y\n')
+    git(tmp_path, 'add', 'app/src/staged.ts')
+    write(tmp_path, 'app/src/edited.ts', 'y\n')
+    git(tmp_path, 'rm', '-q', 'app/src/gone.ts')
+    git(tmp_path, 'mv', 'app/src/old.ts', 'app/src/renamed.ts')
+    write(tmp_path, 'app/src/new.tsx')
+    write(tmp_path, 'app/README.md', 'y\n')
+    write(tmp_path, 'build/out.ts')
+    return tmp_path
+
+
+CHANGED = ['app/README.md', 'app/src/committed.ts', 'app/src/edited.ts', 'app/src/new.tsx', 'app/src/renamed.ts',
+           'app/src/staged.ts']
+
+
+def relative(repo, paths):
+    return sorted(os.path.relpath(path, repo).replace(os.sep, '/') for path in paths)
+
+
+def test_changed_since(repo):
+    assert relative(repo, changed_since('main', str(repo))) == CHANGED
+    # From a subdirectory the paths are still the whole repository's
+    assert relative(repo, changed_since('main', str(repo / 'app' / 'src'))) == CHANGED
+    assert changed_since('HEAD', str(repo)) >= {str(repo / 'app' / 'src' / 'edited.ts')}
+
+
+def test_unknown_ref(repo):
+    with pytest.raises(GitError):
+        changed_since('no-such-branch', str(repo))
+
+
+def test_asked_once_per_ref(repo):
+    first = changed_files('main', str(repo))
+    write(repo, 'app/src/later.ts')
+    assert changed_files('main', str(repo)) is first
+
+
+def test_source_files_since(repo, monkeypatch):
+    monkeypatch.setattr(file_index, 'ROOT', str(repo))
+    found = file_index.source_files(str(repo / 'app' / 'src'), ('.ts', '.tsx'), since='main')
+    assert relative(repo, found) == ['app/src/committed.ts', 'app/src/edited.ts', 'app/src/new.tsx',
+                                     'app/src/renamed.ts', 'app/src/staged.ts']
+
+
+def test_since_option(repo, monkeypatch, capsys):
+    monkeypatch.setattr(script_args, 'ROOT', str(repo))
+    monkeypatch.delenv('LAUNDRY_SINCE', raising=False)
+    assert script_args.parse_args('x', argv=['--since', 'main']).since == 'main'
+    assert script_args.parse_args('x', argv=[]).since is None
+    monkeypatch.setenv('LAUNDRY_SINCE', 'main')
+    assert script_args.parse_args('x', argv=[]).since == 'main'
+    with pytest.raises(SystemExit) as raised:
+        script_args.parse_args('x', argv=['--since', 'no-such-branch'])
+    assert raised.value.code == 2
+    assert '--since no-such-branch' in capsys.readouterr().err
@@ -0,0 +1,82 @@
+import subprocess
+
+import pytest
+
+import precommit
+import rollback
+from git_changes import git
+
+# The hook on a scratch repository laid out like the checkout: staged blobs
+# are repaired in the index, all of them stored by one git hash-object, and
+# the working tree is only touched on request
+
+BROKEN = b"fetch('http://localhost:3000/api/orders')\n"
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(precommit, 'ROOT', str(tmp_path))
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+    git(['init', '-q'], str(tmp_path))
+    return tmp_path
+
+
+def stage(repo, relative, data):
+    path = repo / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    git(['add', relative], str(repo))
+    return path
+
+
+def staged(repo, relative):
+    return subprocess.run(['git', 'show', f':{relative}'], cwd=repo, capture_output=True, check=True).stdout
+
+
+def test_repairs_the_index_with_one_hash_object(repo, monkeypatch):
+    calls = []
+
+    def counting(args, cwd, input=None):
+        calls.append(args)
+        return git(args, cwd, input)
+    monkeypatch.setattr(precommit, 'git', counting)
+    first = stage(repo, 'customer/src/orders.ts', BROKEN)
+    stage(repo, 'partner/src/orders.ts', BROKEN)
+    stage(repo, 'customer/src/clean.ts', b"fetch(`${API_URL}/api/orders`)\n")
+    checked, repaired, rolled_back = precommit.run(cwd=str(repo))
+    assert (checked, sorted(repaired), rolled_back) == (3, ['customer/src/orders.ts', 'partner/src/orders.ts'], [])
+    assert len([args for args in calls if args[:2] == ['hash-object', '-w']]) == 1
+    for relative in repaired:
+        assert b'`${API_URL}/api/orders`' in staged(repo, relative)
+    assert first.read_bytes() == BROKEN
+
+
+def test_sync_worktree_only_when_fully_staged(repo):
+    synced = stage(repo, 'customer/src/orders.ts', BROKEN)
+    partial = stage(repo, 'customer/src/partial.ts', BROKEN)
+    partial.write_bytes(BROKEN + b'// not staged\n')
+    precommit.run(sync_worktree=True, cwd=str(repo))
+    assert synced.read_bytes() == staged(repo, 'customer/src/orders.ts') != BROKEN
+    assert partial.read_bytes() == BROKEN + b'// not staged\n'
+
+
+def test_cat_file_stops_when_a_repair_fails(repo, monkeypatch):
+    for i in range(3):
+        stage(repo, f'customer/src/page{i}.ts', BROKEN)
+    started = []
+    popen = subprocess.Popen
+
+    def recording(args, **kwargs):
+        process = popen(args, **kwargs)
+        if args[:2] == ['git', 'cat-file']:
+            started.append(process)
+        return process
+    monkeypatch.setattr(subprocess, 'Popen', recording)
+
+    def failing(data, path, pipeline):
+        raise RuntimeError('repair failed')
+    monkeypatch.setattr(precommit, 'repair', failing)
+    with pytest.raises(RuntimeError):
+        precommit.run(cwd=str(repo))
+    assert [process.poll() is not None for process in started] == [True]
+    assert staged(repo, 'customer/src/page0.ts') == BROKEN
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+import prefilter
+import transforms
+from prefilter import Prefilter, required_literals
+from regex_overlap import parse
+from test_rule_engines import TEXTS
+
+# The quick reject never loses a fix: a text the prefilter turns away is one
+# the transform leaves as it is, whether the file is read or mapped; and the
+# literal a regex is reduced to really is in every one of its matches
+
+
+@pytest.mark.parametrize('pattern, required', [
+    (r'x*y+z', ['y']),
+    (r'a(?:bc|de)f', ['bc', 'de']),
+    (r'ab+c', ['a']),
+    (r'fetch\(`([^`]*)"\)', ['fetch(`']),
+    (r'(?:a|.)', None),
+    (r'\w+', None),
+])
+def test_required_literals(pattern, required):
+    assert required_literals(parse(pattern)) == required
+
+
+def texts():
+    # The engine corpus, and its texts cut short at random, which drops and halves triggers
+    rng = random.Random(1)
+    cut = [text[:rng.randrange(len(text) + 1)] for text in TEXTS]
+    return [text.encode('utf-8') for text in TEXTS + cut]
+
+
+TEXT_BYTES = texts()
+
+
+@pytest.mark.parametrize('name', sorted(transforms.TRANSFORMS))
+def test_rejected_texts_are_left_alone(name):
+    check = Prefilter([name])
+    if check.triggers is None:
+        pytest.skip('no prefilter')
+    rejected = [data for data in TEXT_BYTES if not check.matches(data)]
+    for data in rejected:
+        assert transforms.apply_pipeline(data, [name]) == data
+    assert len(rejected) < len(TEXT_BYTES)
+
+
+def test_pipeline_rejects_only_what_every_transform_rejects():
+    pipeline = [name for name in sorted(transforms.TRANSFORMS) if Prefilter([name]).triggers is not None]
+    check = Prefilter(pipeline)
+    assert check.triggers is not None
+    for data in TEXT_BYTES:
+        if not check.matches(data):
+            assert all(not Prefilter([name]).matches(data) for name in pipeline)
+
+
+@pytest.mark.parametrize('threshold', [1, prefilter.MMAP_THRESHOLD], ids=['mapped', 'read'])
+def test_file_check(tmp_path, monkeypatch, threshold):
+    monkeypatch.setattr(prefilter, 'MMAP_THRESHOLD', threshold)
+    check = Prefilter(['replace_api_url'])
+    page = tmp_path / 'page.tsx'
+    filler = b'const a = 1;\n' * 10000
+    page.write_bytes(filler)
+    assert not check.may_change(str(page))
+    page.write_bytes(filler + b"fetch('http://localhost:3000/api')\n")
+    assert check.may_change(str(page))
+    page.write_bytes(b'')
+    assert not check.may_change(str(page))
+
+
+def test_untriggered_transform_turns_the_prefilter_off(tmp_path):
+    names = [name for name in sorted(transforms.TRANSFORMS) if Prefilter([name]).triggers is None]
+    if not names:
+        pytest.skip('every transform has triggers')
+    page = tmp_path / 'page.tsx'
+    page.write_bytes(b'const a = 1;\n')
+    assert Prefilter(['replace_api_url', names[0]]).may_change(str(page))
@@ -0,0 +1,74 @@
+import random
+import re
+
+import pytest
+
+import rule_cache
+from regex_overlap import backtracking_risk, linear_rewrite
+from regex_rules import REGEX_PACKS, compile_pack
+
+
+@pytest.mark.parametrize('pattern', [
+    r'(?:a|a)*b',
+    r'(a|aa)+b',
+    r'(?:\\.|[^"])*"',
+    r'(a+)+b',
+])
+def test_exponential(pattern):
+    assert backtracking_risk(pattern)[0] == 'exponential'
+
+
+@pytest.mark.parametrize('pattern', [
+    r'(?:ab|cd)*x',
+    r'(?:\\.|[^"\\])*"',
+    r'replace\(([^,]+),',
+])
+def test_not_exponential(pattern):
+    risk = backtracking_risk(pattern)
+    assert risk is None or risk[0] != 'exponential'
+
+
+def test_packs_compile():
+    for name in REGEX_PACKS:
+        compile_pack(name)
+
+
+QUADRATIC = [(pattern, replacement) for rules in REGEX_PACKS.values() for pattern, replacement in rules
+             if backtracking_risk(pattern) is not None]
+
+
+def test_quadratic_rules_rewritten():
+    assert QUADRATIC
+    for pattern, replacement in QUADRATIC:
+        rewritten = linear_rewrite(pattern, replacement)
+        assert rewritten is not None, pattern
+        assert backtracking_risk(rewritten) is None
+
+
+@pytest.mark.parametrize('pattern, replacement', QUADRATIC)
+def test_rewrite_matches_original(pattern, replacement):
+    rewritten = linear_rewrite(pattern, replacement)
+    rng = random.Random(pattern)
+    parts = ['replace(', 'x', ' ', ', ', ',', "'`)", '"`)', "'\\s`)", '\n', 'é', 'replace(,']
+    for _ in range(5000):
+        text = ''.join(rng.choice(parts) for _ in range(rng.randint(1, 24)))
+        assert re.sub(rewritten, replacement, text) == re.sub(pattern, replacement, text), text
+
+
+@pytest.mark.parametrize('pattern, replacement', [
+    # The group is used again, so the text before the last start would change
+    (r'replace\(([^,]+), `\)', r'replace(\1, \1)'),
+    # The head is not written back in front of the group
+    (r'replace\(([^,]+), `\)', r'swap(\1, \'\')'),
+    # What follows the run can start inside it
+    (r'replace\(([^,]+)x', r'replace(\1y'),
+])
+def test_no_rewrite_when_output_would_change(pattern, replacement):
+    assert linear_rewrite(pattern, replacement) is None
+
+
+def test_unrewritable_quadratic_rule_refused(monkeypatch):
+    monkeypatch.setattr(rule_cache, 'cached', lambda kind, key, build: build())
+    monkeypatch.setitem(REGEX_PACKS, 'test', [(r'\w+x', 'y')])
+    with pytest.raises(ValueError):
+        compile_pack('test')
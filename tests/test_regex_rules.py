@@ -0,0 +1,80 @@
+import signal
+import threading
+import time
+import warnings
+
+import pytest
+
+import regex_rules
+import transforms
+from regex_rules import RuleTimeout, rule_budget, within_budget
+
+# The rule budget: armed once for the whole pipeline over a file, a stage that
+# runs over it fails the file naming its rules, and where no timer can cut a
+# scan short the run is told so once
+
+
+class Stage:
+    def __init__(self, name):
+        self.rules = [regex_rules.Rule(name, 0, 'x', 'y')]
+
+
+def slow(seconds):
+    def run(content):
+        time.sleep(seconds)
+        return content
+    return run
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(regex_rules, 'RULE_BUDGET', 0.2)
+
+
+def test_armed_once_per_pipeline(budget, monkeypatch):
+    armed = []
+    setitimer = signal.setitimer
+    monkeypatch.setattr(signal, 'setitimer', lambda which, seconds: armed.append(seconds) or setitimer(which, seconds))
+    pipeline = ['fix_all_apis', 'replace_api_url', 'fix_fetch']
+    content = "fetch('http://localhost:3000/api/x')\nfetch(`${API_URL}/y')\n"
+    fixed = transforms.apply_pipeline(content, pipeline)
+    assert fixed != content
+    assert [seconds for seconds in armed if seconds] == [0.2]
+    assert armed[-1] == 0
+
+
+def test_stage_over_budget_names_its_rules(budget):
+    with pytest.raises(RuleTimeout) as e:
+        within_budget(Stage('slow'), slow(5), 'text')
+    assert 'slow#0' in str(e.value)
+
+
+def test_later_stage_fails_once_budget_is_spent(budget):
+    with rule_budget():
+        within_budget(Stage('first'), lambda content: content, 'text')
+        time.sleep(0.3)
+        with pytest.raises(RuleTimeout) as e:
+            within_budget(Stage('second'), lambda content: content, 'text')
+    assert 'second#0' in str(e.value)
+
+
+def test_off_main_thread_warns_once(budget, monkeypatch):
+    monkeypatch.setattr(regex_rules, '_warned', False)
+    caught = []
+    outcomes = []
+
+    def work():
+        with warnings.catch_warnings(record=True) as found:
+            warnings.simplefilter('always')
+            for _ in range(3):
+                within_budget(Stage('fast'), lambda content: content, 'text')
+            try:
+                within_budget(Stage('slow'), slow(0.3), 'text')
+            except RuleTimeout as e:
+                outcomes.append(e)
+        caught.extend(found)
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    assert len([w for w in caught if issubclass(w.category, RuntimeWarning)]) == 1
+    assert len(outcomes) == 1
@@ -0,0 +1,103 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+import regex_rules
+import repair
+import rule_cache
+import transforms
+from rule_cache import RuleCache
+
+# The unified entry point and the rule cache behind it: every pack names real
+# transforms, listing packs loads no rule module, bad names are usage errors,
+# and a cached analysis is reused until a rule module changes and compiles to
+# the same matchers as a fresh one
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_packs_name_real_transforms():
+    for name, pack in repair.RULE_PACKS.items():
+        assert pack.transforms and all(t in transforms.TRANSFORMS for t in pack.transforms), name
+        assert set(pack.apps) <= set(repair.APPS), name
+
+
+def test_pack_apps():
+    assert repair.pack_apps(['api-url']) == list(repair.APPS)
+    assert repair.pack_apps(['api-url', 'navigate']) == ['customer']
+    assert repair.pack_apps(['navigate', 'partner-quotes']) == []
+
+
+def repair_cli(*argv):
+    return subprocess.run([sys.executable, 'repair.py', *argv], cwd=HERE, capture_output=True, text=True)
+
+
+def test_list_loads_no_rules():
+    code = ("import runpy, sys; sys.argv = ['repair.py', 'list']; runpy.run_path('repair.py', run_name='__main__'); "
+            "print(sorted(m for m in ('transforms', 'regex_rules', 'rule_table', 'multi_replace') if m in sys.modules))")
+    done = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True)
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.splitlines()[-1] == '[]'
+    assert 'partner-quotes' in done.stdout
+
+
+@pytest.mark.parametrize('argv, error', [
+    (['run', 'api-url,nope'], 'unknown rule packs: nope'),
+    (['run', 'navigate', '--apps', 'customer,shop'], 'unknown apps: shop'),
+    (['run', 'navigate,partner-quotes'], 'not all meant for any one app'),
+])
+def test_usage_errors(argv, error):
+    done = repair_cli(*argv)
+    assert done.returncode == 2 and error in done.stderr
+
+
+def test_rules_command():
+    done = repair_cli('rules', 'navigate')
+    assert done.returncode == 0
+    assert "fix_navigate  \"navigate('/login`)\" -> \"navigate('/login')\"" in done.stdout
+
+
+def test_cache_builds_once(tmp_path):
+    path = str(tmp_path / 'rules.pickle')
+    built = []
+
+    def build():
+        built.append(1)
+        return {'plan': [1, 2]}
+    assert RuleCache(path).get('bundle', 'pack', build) == {'plan': [1, 2]}
+    assert RuleCache(path).get('bundle', 'pack', build) == {'plan': [1, 2]}
+    assert len(built) == 1
+
+
+def test_rule_change_drops_the_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'rules.pickle')
+    RuleCache(path).get('bundle', 'pack', lambda: 'old')
+    monkeypatch.setattr(rule_cache, 'rules_fingerprint', lambda: 'changed')
+    assert RuleCache(path).get('bundle', 'pack', lambda: 'new') == 'new'
+    with open(path, 'wb') as f:
+        f.write(b'not a pickle')
+    assert RuleCache(path).entries == {}
+    with open(path, 'wb') as f:
+        pickle.dump({'version': 0, 'fingerprint': 'changed', 'entries': {('bundle', 'pack'): 'stale'}}, f)
+    assert RuleCache(path).entries == {}
+
+
+def stages(bundle):
+    return [[rule.name for rule in stage.rules] for stage in bundle.stages]
+
+
+@pytest.mark.parametrize('name', sorted(regex_rules.REGEX_PACKS))
+def test_cached_plan_compiles_the_same(name, tmp_path, monkeypatch):
+    cache = RuleCache(str(tmp_path / 'rules.pickle'))
+    monkeypatch.setattr(rule_cache, '_cache', cache)
+    first = regex_rules.compile_pack(name)
+    monkeypatch.setattr(rule_cache, '_cache', RuleCache(cache.path))
+    assert rule_cache._cache.entries
+    cached = regex_rules.compile_pack(name)
+    monkeypatch.setattr(rule_cache, 'cached', lambda kind, key, build: build())
+    fresh = regex_rules.compile_pack(name)
+    assert stages(first) == stages(cached) == stages(fresh)
+    assert [rule.regex.pattern for rule in cached.rules] == [rule.regex.pattern for rule in fresh.rules]
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import rollback
+from safe_write import BatchWriter
+
+# Runs journaled by BatchWriter and undone by roll_back, and the order runs
+# are listed in
+
+
+@pytest.fixture
+def runs_dir(tmp_path, monkeypatch):
+    directory = tmp_path / '.rollback'
+    monkeypatch.setattr(rollback, 'ROLLBACK_DIR', str(directory))
+    monkeypatch.setattr(rollback, 'ENABLED', True)
+    monkeypatch.setattr(rollback, '_current', None)
+    # begin() sets LAUNDRY_RUN for the workers; setenv puts it back afterwards
+    monkeypatch.setenv('LAUNDRY_RUN', '')
+    return directory
+
+
+def write(path, data):
+    writer = BatchWriter(validate=False, log=None)
+    writer.write_bytes(str(path), data)
+    writer.flush()
+
+
+def test_roll_back_restores_what_the_run_replaced(runs_dir, tmp_path):
+    old, new = tmp_path / 'old.ts', tmp_path / 'new.ts'
+    old.write_bytes(b'before\n')
+    run_id = rollback.begin().run_id
+    write(old, b'after\n')
+    write(old, b'after again\n')
+    write(new, b'created\n')
+    restored, conflicts = rollback.roll_back(run_id)
+    assert conflicts == []
+    assert old.read_bytes() == b'before\n'
+    assert not new.exists()
+    assert sorted(restored) == sorted([str(old), str(old), str(new)])
+    assert rollback.runs() == []
+
+
+def test_file_edited_since_is_left_alone(runs_dir, tmp_path):
+    path = tmp_path / 'page.ts'
+    path.write_bytes(b'before\n')
+    run_id = rollback.begin().run_id
+    write(path, b'after\n')
+    path.write_bytes(b'edited by hand\n')
+    restored, conflicts = rollback.roll_back(run_id)
+    assert restored == []
+    assert conflicts == [(str(path), 'changed since the run')]
+    assert path.read_bytes() == b'edited by hand\n'
+    rollback.roll_back(run_id, force=True)
+    assert path.read_bytes() == b'before\n'
+
+
+def test_runs_in_one_second_keep_their_order(runs_dir, tmp_path):
+    path = tmp_path / 'page.ts'
+    started = []
+    for i in range(5):
+        started.append(rollback.begin().run_id)
+        write(path, f'version {i}\n'.encode())
+    assert rollback.runs() == started
+    assert len(set(started)) == 5
+
+
+def test_ids_sort_by_time_then_pid(runs_dir):
+    ids = ['20260412-101502-4242', '20260412-101502-000000005-999', '20260412-101502-000000005-1000',
+           '20260412-101502-120000000-7', '20260412-101503-000000000-7']
+    for run_id in reversed(ids):
+        os.makedirs(os.path.join(rollback.ROLLBACK_DIR, run_id))
+    assert rollback.runs() == ids
@@ -0,0 +1,71 @@
+import random
+import re
+
+import pytest
+
+import bench
+import multi_replace
+from multi_replace import apply_chained, apply_packs
+from regex_rules import REGEX_PACKS, apply_bundle, apply_sequential
+from rule_table import CUSTOMER_ORDER, LITERAL_PACKS, PARTNER_ORDER, ordered_rules
+
+# The engines against the chained calls the scripts used to make: every
+# literal pack through apply_packs against chained str.replace, every regex
+# pack through its fused bundle against re.sub rule by rule, on text and on
+# the UTF-8 bytes of the same text
+
+TABLES = [[name] for name in LITERAL_PACKS] + [CUSTOMER_ORDER, PARTNER_ORDER]
+NOISE = ['a', ' ', '\n', '\r\n', "'", '"', '`', '(', ')', ',', '/', '${API_URL}', 'é', '→', '😀']
+
+
+def pieces():
+    found = set(NOISE)
+    for rules in LITERAL_PACKS.values():
+        for old, new in rules:
+            found.update((old, new, old[:len(old) // 2], old[len(old) // 2:]))
+    for text in bench.SEEDED:
+        found.add(text)
+    return sorted(found)
+
+
+def corpus():
+    # Generated pages plus dense runs of rule patterns, halves of them and
+    # their replacements, where matches of different rules meet and overlap
+    rng = random.Random(0)
+    seeds = bench.corruptions()
+    texts = [bench.generate_page(rng, i, seeds, 1.0) for i in range(40)]
+    parts = pieces()
+    texts += [''.join(rng.choice(parts) for _ in range(rng.randint(1, 60))) for _ in range(400)]
+    return texts
+
+
+TEXTS = corpus()
+
+
+@pytest.fixture(params=[None, 1, 10 ** 9], ids=['default', 'edit-every-match', 'replace-every-stage'])
+def edit_cost(request, monkeypatch):
+    # 1 keeps every match as an edit in the buffer; 10 ** 9 rebuilds the text
+    # for every stage that fires
+    if request.param is not None:
+        monkeypatch.setattr(multi_replace, 'EDIT_COST', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('packs', TABLES, ids=['+'.join(packs) for packs in TABLES])
+def test_literal_packs_match_chained(packs, edit_cost):
+    rules = ordered_rules(packs)
+    for text in TEXTS:
+        expected = apply_chained(text, rules)
+        assert apply_packs(text, packs) == expected
+        assert apply_packs(text.encode('utf-8'), packs) == expected.encode('utf-8')
+
+
+@pytest.mark.parametrize('name', sorted(REGEX_PACKS))
+def test_regex_bundles_match_sequential(name):
+    for text in TEXTS:
+        expected = text
+        for pattern, replacement in REGEX_PACKS[name]:
+            expected = re.sub(pattern, replacement, expected)
+        assert apply_sequential(text, name) == expected
+        assert apply_bundle(text, name) == expected
+        assert apply_bundle(text.encode('utf-8'), name) == expected.encode('utf-8')
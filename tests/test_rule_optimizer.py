@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from multi_replace import plan_scans
+from rule_optimizer import dead_rules, emit, optimize, verify
+from rule_table import CUSTOMER_ORDER, LITERAL_PACKS, PARTNER_ORDER, ordered_rules, rule_names
+from test_rule_engines import TEXTS
+
+# The optimizer's proofs against running the rules: a rule it drops really
+# never changes a text, and the slimmed table, in its new order and as its
+# new scans, gives the text the original chain gives, on random tables over a
+# tiny alphabet and on every real pack
+
+TABLES = [[name] for name in LITERAL_PACKS] + [CUSTOMER_ORDER, PARTNER_ORDER]
+
+
+def test_dead_rules():
+    rules = [
+        ('a', 'a'),      # identity
+        ('ab', 'x'),
+        ('ab', 'x'),     # duplicate of #1
+        ('zab', 'y'),    # unreachable: #1 took every ab
+        ('q', 'ab'),     # writes ab again
+        ('zab', 'w'),    # so this one is alive
+    ]
+    dead = dead_rules(rules)
+    assert sorted(dead) == [0, 2, 3]
+    assert dead[0].startswith('identity')
+    assert dead[2].startswith('duplicate of #1')
+    assert dead[3].startswith('unreachable: #1')
+
+
+def random_table(rng):
+    rules = []
+    for _ in range(rng.randint(1, 7)):
+        old = ''.join(rng.choice('abc') for _ in range(rng.randint(1, 3)))
+        new = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 3)))
+        rules.append((old, new))
+    return rules
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_random_tables_keep_their_output(seed):
+    rng = random.Random(seed)
+    rules = random_table(rng)
+    names = [f'#{i}' for i in range(len(rules))]
+    texts = [''.join(rng.choice('abcx') for _ in range(rng.randint(0, 30))) for _ in range(60)]
+    scans, dead = optimize(rules, names)
+    assert sorted([i for scan in scans for i in scan] + list(dead)) == list(range(len(rules)))
+    assert verify(rules, names, scans, texts)[0] == 0
+
+
+@pytest.mark.parametrize('packs', TABLES, ids=['+'.join(packs) for packs in TABLES])
+def test_real_packs_keep_their_output(packs):
+    rules = ordered_rules(packs)
+    names = rule_names(packs)
+    scans, dead = optimize(rules, names)
+    assert verify(rules, names, scans, TEXTS)[0] == 0
+    assert len(scans) <= len(plan_scans(rules))
+    # What --emit prints is the slimmed table
+    namespace = {}
+    exec(emit('table', rules, names, scans), namespace)
+    assert namespace['TABLE'] == [rules[i] for scan in scans for i in scan]
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+import rule_profile
+import transforms
+from multi_replace import MultiReplacer
+from regex_rules import Bundle, Rule
+from test_rule_engines import TEXTS
+
+# The profiler's counts against what the rules did: per rule hits, files and
+# bytes, per scan its calls and anchor skips, per transform its calls and
+# changed files; and a profiled run changes nothing in the output
+
+
+@pytest.fixture
+def profiler():
+    profiler = rule_profile.enable()
+    try:
+        yield profiler
+    finally:
+        rule_profile.disable()
+
+
+def test_literal_hits_and_bytes(profiler):
+    replacer = MultiReplacer([('aa', 'b'), ('c', 'dd')], ['double', 'see'])
+    profiler.begin_file()
+    assert replacer.apply('aaaa c aa') == 'bb dd b'
+    profiler.begin_file()
+    assert replacer.apply('aa') == 'b'
+    rules = profiler.tables['rules']
+    assert {name: (row['hits'], row['files'], row['bytes_in'], row['bytes_out']) for name, row in rules.items()} == {
+        'double': (4, 2, 8, 4),
+        'see': (1, 1, 1, 2),
+    }
+
+
+def test_anchor_skip_is_counted(profiler):
+    replacer = MultiReplacer([("useState('`)", "useState('')"), ("useState(\"`)", "useState(\"\")")])
+    assert replacer.apply('const a = 1;') == 'const a = 1;'
+    assert replacer.apply("useState('`)") == "useState('')"
+    scans = profiler.tables['scans']
+    assert [(row['calls'], row['skipped']) for row in scans.values()] == [(2, 1)]
+    assert sum(row['hits'] for row in profiler.tables['rules'].values()) == 1
+
+
+def test_regex_hits_and_bytes(profiler):
+    bundle = Bundle([Rule('t', 0, r'a(b+)', r'<\1>'), Rule('t', 1, r'x', 'yy')])
+    profiler.begin_file()
+    assert bundle.apply('abb x ab') == '<bb> yy <b>'
+    rules = profiler.tables['rules']
+    assert (rules['t#0']['hits'], rules['t#0']['bytes_in'], rules['t#0']['bytes_out']) == (2, 5, 7)
+    assert (rules['t#1']['hits'], rules['t#1']['bytes_in'], rules['t#1']['bytes_out']) == (1, 1, 2)
+
+
+@pytest.mark.parametrize('names', [['fix_all_apis'], ['fix_syntax', 'fix_more_syntax', 'final_fix']])
+def test_profiled_pipeline_matches(names):
+    texts = random.Random(0).sample(TEXTS, 60)
+    expected = [transforms.apply_pipeline(text, names) for text in texts]
+    profiler = rule_profile.enable()
+    try:
+        assert [transforms.apply_pipeline(text, names) for text in texts] == expected
+    finally:
+        rule_profile.disable()
+    rows = profiler.tables['transforms']
+    assert {name: rows[name]['calls'] for name in names} == dict.fromkeys(names, len(texts))
+    if len(names) == 1:
+        assert rows[names[0]]['changed'] == sum(text != fixed for text, fixed in zip(texts, expected))
+
+
+def test_merge_and_table():
+    first, second = rule_profile.Profiler(), rule_profile.Profiler()
+    first.rule('slow', 1, 2, 3, 0.5)
+    second.rule('slow', 2, 4, 6, 0.25)
+    second.rule('fast', 5, 5, 5, 0.001)
+    first.merge(second.to_json())
+    assert first.tables['rules']['slow'] == {'hits': 3, 'files': 2, 'bytes_in': 6, 'bytes_out': 9, 'seconds': 0.75}
+    lines = first.table('rules', top=1).splitlines()
+    assert len(lines) == 2 and lines[1].startswith('slow ')
+    assert first.table('rules', sort='hits').splitlines()[1].startswith('fast ')
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import transforms
+from file_index import ROOT, source_files
+from rule_scope import ScopeIndex, scoped
+
+# Scope lookups on made-up paths, and the scoped pipeline against the
+# unscoped one on the real trees: a transform given a file in its scope has to
+# change it exactly as it does with no path at all
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ScopeIndex({
+        'pages': ['app/src/pages/*.tsx'],
+        'tree': ['app/src/**'],
+        'one': ['app/src/delivery/[id]/page.tsx'],
+        'any': ['app/src/*/page.tsx'],
+    }, root=str(tmp_path))
+
+
+def path(index, relative):
+    return os.path.join(index.root, *relative.split('/'))
+
+
+@pytest.mark.parametrize('relative, inside', [
+    ('app/src/pages/Home.tsx', {'pages', 'tree'}),
+    ('app/src/pages/Home.ts', {'tree'}),
+    ('app/src/pages/nested/Home.tsx', {'tree'}),
+    ('app/src/delivery/[id]/page.tsx', {'tree', 'one'}),
+    ('app/src/delivery/i/page.tsx', {'tree'}),
+    ('app/src/login/page.tsx', {'tree', 'any'}),
+    ('app/src/Root.tsx', {'tree'}),
+    ('app/Other.tsx', set()),
+])
+def test_out_of_scope(index, relative, inside):
+    assert index.out_of_scope(path(index, relative)) == {'pages', 'tree', 'one', 'any'} - inside
+
+
+def test_outside_the_checkout(index):
+    assert index.out_of_scope(os.path.join(os.path.dirname(index.root), 'app', 'src', 'x.tsx')) == set(index.scopes)
+
+
+def tree_files():
+    return [path for directory in ('customer/src', 'partner/src')
+            for path in source_files(os.path.join(ROOT, directory), ('.ts', '.tsx'))]
+
+
+@pytest.mark.parametrize('name', sorted(transforms.TRANSFORM_SCOPES))
+def test_scoped_matches_unscoped_in_scope(name):
+    checked = 0
+    for filepath in tree_files():
+        if name not in scoped(filepath, [name])[0]:
+            continue
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        assert transforms.apply_pipeline(content, [name], filepath) == transforms.apply_pipeline(content, [name])
+        checked += 1
+    assert checked
+
+
+def test_no_rule_narrower_than_its_transform():
+    # The scripts ran every rule of a pack over all of the tree they walked
+    names = [name for name in transforms.LITERAL_TRANSFORMS if name in transforms.TRANSFORM_SCOPES]
+    for filepath in tree_files():
+        assert scoped(filepath, names)[1] == {}, filepath
@@ -0,0 +1,96 @@
+import io
+import os
+import stat
+
+import pytest
+
+import rollback
+import safe_write
+from safe_write import BatchWriter
+
+# The shared writer: nothing is written for unchanged bytes, a changed file is
+# fsynced before the rename that replaces it, each directory is synced once at
+# flush, and a dry run or a rejected rewrite leaves the old bytes
+
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+
+
+@pytest.fixture
+def page(tmp_path):
+    path = tmp_path / 'page.tsx'
+    path.write_bytes(b'const a = (1);\r\n')
+    os.chmod(path, 0o640)
+    return path
+
+
+def test_unchanged_bytes_are_not_written(page):
+    mtime = os.stat(page).st_mtime_ns
+    writer = BatchWriter()
+    assert not writer.write_bytes(str(page), page.read_bytes())
+    writer.flush()
+    assert os.stat(page).st_mtime_ns == mtime
+    assert (len(writer.written), writer.unchanged) == (0, 1)
+
+
+def test_fsync_before_rename_and_one_directory_sync(page, tmp_path, monkeypatch):
+    events = []
+    fsync, replace = os.fsync, os.replace
+
+    def recording_fsync(fd):
+        events.append(('fsync', stat.S_ISDIR(os.fstat(fd).st_mode)))
+        fsync(fd)
+
+    def recording_replace(source, target):
+        events.append(('replace', target))
+        replace(source, target)
+    monkeypatch.setattr(os, 'fsync', recording_fsync)
+    monkeypatch.setattr(os, 'replace', recording_replace)
+    other = tmp_path / 'other.tsx'
+    other.write_bytes(b'x\n')
+    writer = BatchWriter()
+    assert writer.write_bytes(str(page), b'const a = (2);\r\n')
+    assert writer.write_bytes(str(other), b'y\n')
+    assert events == [('fsync', False), ('replace', str(page)), ('fsync', False), ('replace', str(other))]
+    writer.flush()
+    if os.name != 'nt':
+        assert events[4:] == [('fsync', True)]
+    assert page.read_bytes() == b'const a = (2);\r\n'
+    assert stat.S_IMODE(os.stat(page).st_mode) == 0o640
+    assert sorted(os.listdir(tmp_path)) == ['other.tsx', 'page.tsx']
+
+
+def test_failed_rename_keeps_the_old_file(page, tmp_path, monkeypatch):
+    def fail(a, b):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        BatchWriter().write_bytes(str(page), b'const a = (2);\r\n')
+    assert page.read_bytes() == b'const a = (1);\r\n'
+    assert os.listdir(tmp_path) == ['page.tsx']
+
+
+def test_dry_run_prints_a_diff_and_writes_nothing(page):
+    out = io.StringIO()
+    writer = BatchWriter(dry_run=True, out=out)
+    assert writer.write_bytes(str(page), b'const a = (2);\r\n')
+    writer.flush()
+    assert page.read_bytes() == b'const a = (1);\r\n'
+    assert '-const a = (1);' in out.getvalue() and '+const a = (2);' in out.getvalue()
+    assert writer.summary() == '1 files would be written, 0 unchanged (dry run)'
+
+
+def test_broken_rewrite_is_rolled_back(page):
+    writer = BatchWriter(log=None)
+    assert not writer.write_bytes(str(page), b'const a = (2;\r\n')
+    assert page.read_bytes() == b'const a = (1);\r\n'
+    assert [error.filepath for error in writer.rejected] == [str(page)]
+    assert writer.written == [] and writer.unchanged == 0
+
+
+def test_write_text_uses_the_platform_line_ending(tmp_path):
+    path = tmp_path / 'new.ts'
+    assert safe_write.write_text(str(path), 'a\nb\n')
+    assert path.read_bytes() == ('a' + os.linesep + 'b' + os.linesep).encode('utf-8')
@@ -0,0 +1,87 @@
+import os
+import random
+
+import pytest
+
+import structure
+from file_index import ROOT, source_files
+from trigram_index import APP_DIRECTORIES
+
+# The structural check: brackets inside literals, comments, regexes and JSX
+# text never count, each kind of breakage is reported where it starts, and a
+# rewrite only counts as a regression when it breaks a file earlier than it
+# already was
+
+CLEAN = '''const re = /[(]+/g; // a ( in a comment
+const s = "a ) b" + 'c ] d';
+const t = `x ${items.map((i) => `(${i}`).join(')')} y`;
+/* { never closed in here */
+export default function Page() {
+  return <div className="p-4">Total: (3 items] {count}</div>;
+}
+'''
+
+
+def test_clean():
+    assert structure.check(CLEAN) is None
+
+
+@pytest.mark.parametrize('content, line, column, message', [
+    ('const a = (1;', 1, 11, '( is never closed'),
+    ('const a = 1);', 1, 12, 'unmatched )'),
+    ('f([1)];', 1, 5, ') closes [ from 1:3'),
+    ('ok();\nconst s = "abc;\nx()', 2, 11, 'unterminated string'),
+    ('const t = `a ${b`;', 1, 17, 'unterminated template literal'),
+    ('const x = <div><span></div>;', 1, 22, '</div> closes <span> from line 1'),
+])
+def test_first_problem(content, line, column, message):
+    problem = structure.check(content)
+    assert (problem.line, problem.column, problem.message) == (line, column, message)
+
+
+def test_jsx_only_where_it_can_be():
+    # In a .ts file a < is a comparison, not a tag
+    assert structure.check_file('a.ts', 'const b = a <div;') is None
+    assert structure.check_file('a.tsx', 'const b = <div>{x}</span>;') is not None
+
+
+def test_regression():
+    broken_late = CLEAN + 'const z = (1;\n'
+    assert structure.regression('p.tsx', CLEAN, CLEAN.replace('"a ) b"', '"a ) b')) is not None
+    assert structure.regression('p.tsx', CLEAN.encode(), broken_late.encode()).line == 8
+    # Still broken from the same line, or only further down, is not new
+    assert structure.regression('p.tsx', broken_late, broken_late + 'x(\n') is None
+    assert structure.regression('p.tsx', 'ok(;\n' + CLEAN, 'ok(;\n' + broken_late) is None
+    # Broken earlier than before is
+    assert structure.regression('p.tsx', broken_late, 'f(;\n' + CLEAN).line == 1
+    # A new file has nothing to compare with
+    assert structure.regression('p.tsx', None, broken_late) is not None
+
+
+def app_sources():
+    return [path for directory in APP_DIRECTORIES
+            for path in source_files(os.path.join(ROOT, directory), structure.EXTENSIONS, skip_dts=True)]
+
+
+def test_dropped_bracket_is_caught():
+    # Every clean source of the app trees, with one paren or square bracket
+    # of its code removed, is reported. A brace can go with no harm done (the
+    # ${ of a template without its brace is just text), and so can a paren
+    # that leaves a quote straight after a word: join', ') reads as the
+    # apostrophe of JSX text, as it must for "Don't"
+    rng = random.Random(0)
+    checked = 0
+    for path in app_sources():
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+        jsx = not path.endswith('.ts')
+        if structure.check(content, jsx) is not None:
+            continue
+        masked = structure.mask_literals(content, jsx)
+        brackets = [m.start() for m in structure.BRACKET.finditer(masked) if m.group() in '()[]'
+                    and not (content[m.end():m.end() + 1] in ('"', "'") and content[m.start() - 1:m.start()].isidentifier())]
+        for i in rng.sample(brackets, min(3, len(brackets))):
+            assert structure.check(content[:i] + content[i + 1:], jsx) is not None, (path, i)
+        checked += 1
+    if not checked:
+        pytest.skip('no clean app sources here')
@@ -0,0 +1,108 @@
+import os
+import random
+import re
+
+import pytest
+
+import transforms
+import trigram_index
+from rule_table import LITERAL_PACKS
+from test_rule_engines import TEXTS
+from trigram_index import TrigramIndex
+
+# The index against brute force on a scratch checkout: the files it returns
+# for a literal, a regex or a pipeline always include every file that really
+# has a match, before and after edits, deletions and reloads
+
+DIRECTORIES = ['customer/src', 'partner/src']
+
+
+@pytest.fixture
+def checkout(tmp_path, monkeypatch):
+    monkeypatch.setattr(trigram_index, 'ROOT', str(tmp_path))
+    rng = random.Random(2)
+    for i, text in enumerate(rng.sample(TEXTS, 80)):
+        path = tmp_path / DIRECTORIES[i % 2] / f'page{i}.tsx'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(text.encode('utf-8'))
+    (tmp_path / 'elsewhere.tsx').write_bytes(TEXTS[0].encode('utf-8'))
+    return tmp_path
+
+
+def contents(root):
+    found = {}
+    for directory in DIRECTORIES:
+        for name in os.listdir(root / directory):
+            found[os.path.join(str(root), directory, name)] = (root / directory / name).read_bytes()
+    return found
+
+
+def queries():
+    # Rule patterns, and pieces of the corpus that run across lines and characters
+    rng = random.Random(3)
+    literals = sorted({old for rules in LITERAL_PACKS.values() for old, new in rules})
+    for _ in range(200):
+        text = rng.choice(TEXTS)
+        start = rng.randrange(len(text))
+        literals.append(text[start:start + rng.randint(1, 12)])
+    return literals
+
+
+QUERIES = queries()
+
+
+def check(index, root):
+    files = contents(root)
+    for literal in QUERIES:
+        expected = {path for path, data in files.items() if literal.encode('utf-8') in data}
+        assert expected <= index.containing([literal], DIRECTORIES), literal
+
+
+def test_literals_found(checkout):
+    index = TrigramIndex(path=None)
+    assert index.update(DIRECTORIES) == 80
+    check(index, checkout)
+    # and the index does narrow things down
+    assert len(index.containing(["useState('`)"], DIRECTORIES)) < 80
+
+
+def test_regexes_and_pipelines_found(checkout):
+    index = TrigramIndex(path=None)
+    index.update(DIRECTORIES)
+    files = contents(checkout)
+    for pattern in [r'fetch\(`\$\{API_URL\}[^`]*"', r"getItem\('\w+`\)", r'\w+']:
+        expected = {path for path, data in files.items() if re.search(pattern, data.decode('utf-8'))}
+        assert expected <= index.matching(pattern, DIRECTORIES)
+    for name in ['fix_all_apis', 'fix_fetch', 'replace_api_url']:
+        expected = {path for path, data in files.items() if transforms.apply_pipeline(data, [name]) != data}
+        assert expected <= index.for_pipeline([name], DIRECTORIES)
+
+
+def test_edits_and_deletions(checkout):
+    index = TrigramIndex(path=None)
+    index.update(DIRECTORIES)
+    rng = random.Random(4)
+    for n in range(6):
+        files = rng.sample(sorted(contents(checkout)), 20)
+        for path in files[:10]:
+            os.remove(path)
+        for path in files[10:]:
+            with open(path, 'ab') as f:
+                f.write(f"\nrouter.push('/round{n}`);\n".encode())
+        assert index.update(DIRECTORIES) == 20
+        check(index, checkout)
+        assert len(index.files) == len(contents(checkout))
+        assert index.next_id <= 2 * len(index.files) + 64
+
+
+def test_snapshot_reload(checkout, monkeypatch):
+    path = str(checkout / 'index.pickle')
+    index = TrigramIndex(path)
+    index.update(DIRECTORIES)
+    index.save()
+    reloaded = TrigramIndex(path)
+    assert reloaded.update(DIRECTORIES) == 0
+    check(reloaded, checkout)
+    # A snapshot of another checkout is not used
+    monkeypatch.setattr(trigram_index, 'ROOT', str(checkout / 'customer'))
+    assert TrigramIndex(path).files == {}
@@ -0,0 +1,64 @@
+import os
+import random
+
+import pytest
+
+from file_index import ROOT, source_files
+from ts_literals import MIXED_QUOTES, find_mismatches, repair_literals
+
+# The quote scanner: what it repairs, what it must leave alone, and the
+# MIXED_QUOTES gate, which has to pass every text the scanner would change
+
+
+@pytest.mark.parametrize('broken, fixed', [
+    ("getItem('partnerId`)", "getItem('partnerId')"),
+    ('useState(\'all")', "useState('all')"),
+    ('fetch(`${API_URL}/x", {', 'fetch(`${API_URL}/x`, {'),
+    ("a = 'x\\\ny\")", "a = 'x\\\ny')"),
+])
+def test_repairs(broken, fixed):
+    assert repair_literals(broken) == fixed
+    assert repair_literals(broken.encode('utf-8')) == fixed.encode('utf-8')
+
+
+@pytest.mark.parametrize('text', [
+    "<p>Don't \"panic\"</p>",
+    "const s = `it's ${a}\nok`",
+    "x = `a${\nb}')",
+    "x = `a${ /*\n*/ b}')",
+    "x = `a${ 'p\\\nq' }')",
+    "// 'a\" )",
+    "const r = /'\"/;",
+])
+def test_left_alone(text):
+    assert find_mismatches(text) == []
+
+
+PIECES = ["'", '"', '`', '\n', '\r\n', '\\\n', '\\', '${', '}', '/*', '*/', '//', '/', 'a', ' ', ')', ',', ';',
+          'x = ', '(', "'a'", '`${b}`', "Don't", 'é']
+
+
+def test_gate_passes_every_repair():
+    rng = random.Random(0)
+    repaired = 0
+    for _ in range(50000):
+        text = ''.join(rng.choice(PIECES) for _ in range(rng.randint(1, 16)))
+        if find_mismatches(text):
+            repaired += 1
+            assert MIXED_QUOTES.search(text), text
+    assert repaired
+
+
+def test_gate_on_corrupted_sources():
+    # Real files with one quote swapped for another kind
+    rng = random.Random(1)
+    paths = [path for directory in ('customer/src', 'partner/src')
+             for path in source_files(os.path.join(ROOT, directory), ('.ts', '.tsx'))]
+    for path in rng.sample(paths, min(40, len(paths))):
+        with open(path, 'r', encoding='latin-1') as f:
+            content = f.read()
+        quotes = [i for i, ch in enumerate(content) if ch in '\'"`']
+        for i in rng.sample(quotes, min(10, len(quotes))):
+            text = content[:i] + rng.choice('\'"`'.replace(content[i], '')) + content[i + 1:]
+            if find_mismatches(text):
+                assert MIXED_QUOTES.search(text), (path, i)
@@ -0,0 +1,126 @@
+import os
+import time
+
+import pytest
+
+import rollback
+import transforms
+import watch_api
+from safe_write import BatchWriter
+from watch_api import PollingWatcher, fix_file, wanted
+
+# Watch mode on a scratch tree: only source files are picked up, a save is
+# fixed once and its own rewrite comes back as a no-op, the pollers see a
+# write, and each debounced batch is a rollback run of its own
+
+PAGE = b"const r = await fetch('http://localhost:3000/api/orders');\n"
+
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(rollback, 'ENABLED', False)
+
+
+@pytest.fixture
+def page(tmp_path):
+    path = tmp_path / 'src' / 'page.tsx'
+    path.parent.mkdir()
+    path.write_bytes(PAGE)
+    return path
+
+
+@pytest.mark.parametrize('path, picked', [
+    ('app/src/page.tsx', True),
+    ('app/src/api.ts', True),
+    ('app/src/types.d.ts', False),
+    ('app/src/config/api.ts', False),
+    ('app/src/page.js', False),
+    ('app/src/page.tsx.swp', False),
+])
+def test_wanted(path, picked):
+    assert wanted(path.replace('/', os.sep)) == picked
+
+
+def test_fix_file_once(page):
+    writer = BatchWriter()
+    assert fix_file(str(page), watch_api.DEFAULT_PIPELINE, writer)
+    writer.flush()
+    fixed = page.read_bytes()
+    assert fixed == transforms.apply_pipeline(PAGE, watch_api.DEFAULT_PIPELINE)
+    assert b'localhost:3000' not in fixed
+
+    # The event for our own rewrite
+    writer = BatchWriter()
+    assert not fix_file(str(page), watch_api.DEFAULT_PIPELINE, writer)
+    writer.flush()
+    assert page.read_bytes() == fixed
+
+
+def test_fix_file_gone(tmp_path):
+    assert not fix_file(str(tmp_path / 'gone.tsx'), watch_api.DEFAULT_PIPELINE, BatchWriter())
+
+
+def test_polling_sees_a_write(page):
+    watcher = PollingWatcher([str(page.parent)], interval=0)
+    assert watcher.wait(0) == []
+    page.write_bytes(PAGE + b'// saved\n')
+    assert watcher.wait(0) == [str(page)]
+    assert watcher.wait(0) == []
+
+
+def test_inotify_sees_a_write_and_a_new_directory(page):
+    try:
+        watcher = watch_api.InotifyWatcher([str(page.parent)])
+    except (OSError, AttributeError):
+        pytest.skip('no inotify here')
+    try:
+        page.write_bytes(PAGE)
+        nested = page.parent / 'nested'
+        nested.mkdir()
+        (nested / 'child.tsx').write_bytes(PAGE)
+        changed = set()
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and not {str(page), str(nested / 'child.tsx')} <= changed:
+            changed.update(watcher.wait(0.1))
+        assert {str(page), str(nested / 'child.tsx')} <= changed
+    finally:
+        watcher.close()
+
+
+class Scripted:
+    # A watcher that reports the given batches of saves, then Ctrl+C
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.closed = False
+
+    def wait(self, timeout):
+        if not self.batches:
+            raise KeyboardInterrupt
+        return self.batches.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+def test_each_batch_is_one_run(page, tmp_path, monkeypatch):
+    other = tmp_path / 'src' / 'other.tsx'
+    other.write_bytes(PAGE)
+    watcher = Scripted([[str(page), str(page), str(tmp_path / 'src' / 'notes.md')], [str(other)]])
+    runs = []
+    fixed = []
+    monkeypatch.setattr(watch_api, 'open_watcher', lambda directories, polling: watcher)
+    monkeypatch.setattr(watch_api, 'warm', lambda directories, pipeline: None)
+    monkeypatch.setattr(rollback, 'begin', lambda: runs.append(len(fixed)))
+    real_fix = watch_api.fix_file
+
+    def fix(path, pipeline, writer):
+        fixed.append(path)
+        return real_fix(path, pipeline, writer)
+    monkeypatch.setattr(watch_api, 'fix_file', fix)
+
+    watch_api.watch([str(tmp_path / 'src')], watch_api.DEFAULT_PIPELINE, debounce=0)
+    # The burst of two saves is fixed once; the markdown file is not looked at
+    assert fixed == [str(page), str(other)]
+    assert runs == [0, 1]
+    assert watcher.closed
+    assert b'localhost:3000' not in page.read_bytes() + other.read_bytes()
@@ -0,0 +1,368 @@
+import re
+
+import rule_profile
+import rule_scope
+import structure
+from edit_buffer import EditBuffer
+from multi_replace import apply_packs, compile_packs
+from regex_rules import apply_bundle, bundle, rule_budget
+from ts_literals import repair_literals
+
+# The per-file work of every repair script as a plain content -> content
+# function, so the scripts and the drivers share one implementation.
+#
+# apply_pipeline also takes the raw bytes of a file and returns bytes. The rule
+# engines scan bytes as they are, so only the code steps that add the API_URL
+# import have a bytes form of their own (inserting it with the file's own line
+# ending), and a transform without one decodes just for its own step. Line
+# endings and a byte order mark come out exactly as they went in.
+#
+# Between the other transforms, a run of literal ones (fix_syntax,
+# fix_more_syntax, fix_navigate) shares one EditBuffer, so the file is built
+# once for the run rather than once per rule stage.
+#
+# Given the path of the file, apply_pipeline runs only the transforms and
+# literal rules whose scope (TRANSFORM_SCOPES, rule_table.RULE_SCOPES) takes it
+# in; rule_scope.py works that out once per directory.
+
+API_IMPORT = "import { API_URL } from '@/config/api';"
+API_IMPORT_BYTES = API_IMPORT.encode('utf-8')
+
+
+def add_api_import(content):
+    if "from '@/config/api'" in content or "from \"@/config/api\"" in content:
+        return content
+
+    # Insert after last import line
+    lines = content.split('\n')
+    last_import = 0
+    for i, line in enumerate(lines):
+        if line.strip().startswith('import '):
+            last_import = i
+    lines.insert(last_import + 1, API_IMPORT)
+    return '\n'.join(lines)
+
+
+def insert_import_bytes(data, stripped=True):
+    # After the last import line, with the line ending the file already uses
+    newline = b'\r\n' if b'\r\n' in data else b'\n'
+    lines = data.split(b'\n')
+    last_import = 0
+    for i, line in enumerate(lines):
+        if (line.strip() if stripped else line).startswith(b'import '):
+            last_import = i
+    line = API_IMPORT_BYTES + newline[:-1]
+    if last_import + 1 == len(lines):
+        # The import goes last, after a line that had no line break of its own
+        lines[-1] += newline[:-1]
+        line = API_IMPORT_BYTES
+    lines.insert(last_import + 1, line)
+    return b'\n'.join(lines)
+
+
+def add_api_import_bytes(data):
+    if b"from '@/config/api'" in data or b'from "@/config/api"' in data:
+        return data
+    return insert_import_bytes(data)
+
+
+def fix_all_apis(content):
+    if 'localhost:3000' not in content:
+        return content
+    content = add_api_import(content)
+    return apply_bundle(content, 'fix_all_apis')
+
+
+def replace_api_url(content):
+    if 'localhost:3000' not in content:
+        return content
+    content = add_api_import(content)
+    content = content.replace('http://localhost:3000', '${API_URL}')
+    return apply_bundle(content, 'replace_api_properly')
+
+
+def replace_localhost(content):
+    if 'http://localhost:3000' not in content:
+        return content
+
+    if 'API_URL' not in content:
+        lines = content.split('\n')
+        last_import_idx = 0
+        for i, line in enumerate(lines):
+            if line.startswith('import '):
+                last_import_idx = i
+        lines.insert(last_import_idx + 1, API_IMPORT)
+        content = '\n'.join(lines)
+
+    return apply_packs(content, ['replace_localhost'])
+
+
+def fix_all_apis_bytes(data):
+    if b'localhost:3000' not in data:
+        return data
+    data = add_api_import_bytes(data)
+    return apply_bundle(data, 'fix_all_apis')
+
+
+def replace_api_url_bytes(data):
+    if b'localhost:3000' not in data:
+        return data
+    data = add_api_import_bytes(data)
+    data = data.replace(b'http://localhost:3000', b'${API_URL}')
+    return apply_bundle(data, 'replace_api_properly')
+
+
+def replace_localhost_bytes(data):
+    if b'http://localhost:3000' not in data:
+        return data
+    if b'API_URL' not in data:
+        data = insert_import_bytes(data, stripped=False)
+    return apply_packs(data, ['replace_localhost'])
+
+
+def fix_syntax(content):
+    return apply_packs(content, ['fix_syntax'])
+
+
+def fix_more_syntax(content):
+    return apply_packs(content, ['fix_more_syntax'])
+
+
+def fix_navigate(content):
+    return apply_packs(content, ['fix_navigate'])
+
+
+def fix_fetch(content):
+    return apply_bundle(content, 'fix_fetch_quotes')
+
+
+def final_fix(content):
+    return repair_literals(content)
+
+
+def fix_partner_all(content):
+    return apply_packs(content, ['fix_partner_all'])
+
+
+def fix_partner_complete(content):
+    return apply_packs(content, ['fix_partner_complete'])
+
+
+def fix_all_partner_quotes(content):
+    return apply_packs(content, ['fix_all_partner_quotes'])
+
+
+def fix_partner_syntax(content):
+    return repair_literals(content)
+
+
+def partner_fix_all_syntax(content):
+    content = apply_packs(content, ['partner/fix_all_syntax'])
+    return apply_bundle(content, 'partner/fix_all_syntax')
+
+
+def partner_fix_all_syntax2(content):
+    content = repair_literals(content)
+    return apply_bundle(content, 'partner/fix_all_syntax2')
+
+
+def partner_fix_comprehensive(content):
+    return apply_bundle(content, 'partner/fix_comprehensive')
+
+
+def partner_fix_simple(content):
+    return apply_packs(content, ['partner/fix_simple'])
+
+
+def partner_fix_quotes_final(content):
+    content = apply_packs(content, ['partner/fix_quotes_final'])
+
+    # Fix template literals with wrong ending
+    lines = content.split('\n')
+    for i, line in enumerate(lines):
+        if ('`http://localhost:3000' in line or '`${API_URL}' in line) and line.strip().endswith('");'):
+            lines[i] = line.replace('");', '`);')
+    return '\n'.join(lines)
+
+
+TRANSFORMS = {
+    'fix_all_apis': fix_all_apis,
+    'replace_api_url': replace_api_url,
+    'replace_localhost': replace_localhost,
+    'fix_syntax': fix_syntax,
+    'fix_more_syntax': fix_more_syntax,
+    'fix_navigate': fix_navigate,
+    'fix_fetch': fix_fetch,
+    'final_fix': final_fix,
+    'fix_partner_all': fix_partner_all,
+    'fix_partner_complete': fix_partner_complete,
+    'fix_all_partner_quotes': fix_all_partner_quotes,
+    'fix_partner_syntax': fix_partner_syntax,
+    'partner/fix_all_syntax': partner_fix_all_syntax,
+    'partner/fix_all_syntax2': partner_fix_all_syntax2,
+    'partner/fix_comprehensive': partner_fix_comprehensive,
+    'partner/fix_simple': partner_fix_simple,
+    'partner/fix_quotes_final': partner_fix_quotes_final,
+}
+
+
+# What each transform can rewrite, for the static checks in fixpoint.py, in the
+# order it rewrites: ('literal', pack) and ('regex', pack) name rule packs, and
+# ('code', pattern, output) stands for a step done in code, as a regex for the
+# text that can make it fire and a regex for the text it writes
+QUOTE = '[\'"`]'
+ANY_TEXT = '[\\s\\S]'
+IMPORT_OUTPUT = re.escape('\n' + API_IMPORT + '\n')
+
+TRANSFORM_STEPS = {
+    'fix_all_apis': [('code', 'localhost:3000', IMPORT_OUTPUT), ('regex', 'fix_all_apis')],
+    'replace_api_url': [
+        ('code', 'localhost:3000', IMPORT_OUTPUT),
+        ('code', re.escape('http://localhost:3000'), re.escape('${API_URL}')),
+        ('regex', 'replace_api_properly'),
+    ],
+    'replace_localhost': [('code', 'http://localhost:3000', IMPORT_OUTPUT), ('literal', 'replace_localhost')],
+    'fix_syntax': [('literal', 'fix_syntax')],
+    'fix_more_syntax': [('literal', 'fix_more_syntax')],
+    'fix_navigate': [('literal', 'fix_navigate')],
+    'fix_fetch': [('regex', 'fix_fetch_quotes')],
+    'final_fix': [('code', ANY_TEXT, QUOTE)],
+    'fix_partner_all': [('literal', 'fix_partner_all')],
+    'fix_partner_complete': [('literal', 'fix_partner_complete')],
+    'fix_all_partner_quotes': [('literal', 'fix_all_partner_quotes')],
+    'fix_partner_syntax': [('code', ANY_TEXT, QUOTE)],
+    'partner/fix_all_syntax': [('literal', 'partner/fix_all_syntax'), ('regex', 'partner/fix_all_syntax')],
+    'partner/fix_all_syntax2': [('code', ANY_TEXT, QUOTE), ('regex', 'partner/fix_all_syntax2')],
+    'partner/fix_comprehensive': [('regex', 'partner/fix_comprehensive')],
+    'partner/fix_simple': [('literal', 'partner/fix_simple')],
+    'partner/fix_quotes_final': [
+        ('literal', 'partner/fix_quotes_final'),
+        ('code', '"\\);|`http://localhost:3000|`\\$\\{API_URL\\}', '`\\);'),
+    ],
+}
+
+# Text whose presence gates the whole transform; a step that can write it can
+# wake up every rule behind the guard
+TRANSFORM_GUARDS = {
+    'fix_all_apis': 'localhost:3000',
+    'replace_api_url': 'localhost:3000',
+    'replace_localhost': 'http://localhost:3000',
+}
+
+# The files each transform is meant for, as globs relative to the checkout (see
+# rule_scope.py); a transform that is not listed runs on any file. The app
+# packs were written against one app's sources, and partner/fix_comprehensive
+# against the pages it used to list by hand
+CUSTOMER = 'customer/src/**'
+PARTNER = 'partner/src/**'
+
+TRANSFORM_SCOPES = {
+    'replace_localhost': [CUSTOMER, PARTNER],
+    'fix_syntax': [CUSTOMER],
+    'fix_more_syntax': [CUSTOMER],
+    'fix_navigate': [CUSTOMER],
+    'fix_fetch': [CUSTOMER],
+    'fix_partner_all': [PARTNER],
+    'fix_partner_complete': [PARTNER],
+    'fix_all_partner_quotes': [PARTNER],
+    'fix_partner_syntax': [PARTNER],
+    'partner/fix_all_syntax': [PARTNER],
+    'partner/fix_all_syntax2': [PARTNER],
+    'partner/fix_comprehensive': [
+        'partner/src/app/check-availability/page.tsx',
+        'partner/src/app/delivery/[id]/page.tsx',
+        'partner/src/app/delivery/history/page.tsx',
+        'partner/src/app/delivery/pick/page.tsx',
+        'partner/src/app/hub/delivered/page.tsx',
+        'partner/src/app/hub/drop/page.tsx',
+        'partner/src/app/login/page.tsx',
+        'partner/src/app/pickups/confirm/[id]/page.tsx',
+        'partner/src/app/pickups/page.tsx',
+        'partner/src/components/BottomNav.tsx',
+    ],
+    'partner/fix_simple': [PARTNER],
+    'partner/fix_quotes_final': [PARTNER],
+}
+
+
+# Every transform has a bytes form but the one that strips lines with
+# str.strip, which knows Unicode whitespace
+BYTES_TRANSFORMS = {name: transform for name, transform in TRANSFORMS.items() if name != 'partner/fix_quotes_final'}
+BYTES_TRANSFORMS.update({
+    'fix_all_apis': fix_all_apis_bytes,
+    'replace_api_url': replace_api_url_bytes,
+    'replace_localhost': replace_localhost_bytes,
+})
+
+
+# The transforms that only apply a literal pack
+LITERAL_TRANSFORMS = {name: steps[0][1] for name, steps in TRANSFORM_STEPS.items()
+                      if len(steps) == 1 and steps[0][0] == 'literal'}
+
+
+def apply_transform(name, content, skip=()):
+    if skip:
+        # A literal transform without the rules out of scope for the file
+        return apply_packs(content, [LITERAL_TRANSFORMS[name]], skip)
+    if not isinstance(content, bytes):
+        return TRANSFORMS[name](content)
+    if name in BYTES_TRANSFORMS:
+        return BYTES_TRANSFORMS[name](content)
+    return TRANSFORMS[name](content.decode('utf-8')).encode('utf-8')
+
+
+def apply_pipeline(content, names, path=None):
+    # Text in, text out; bytes in, bytes out. Given the file's path, only the
+    # transforms and rules in scope for it run. The regex stages share one
+    # rule budget
+    with rule_budget():
+        return _apply_pipeline(content, names, path)
+
+
+def _apply_pipeline(content, names, path):
+    skipped = {}
+    if path is not None:
+        names, skipped = rule_scope.scoped(path, names)
+    profiler = rule_profile.active
+    if profiler is None:
+        # A run of literal transforms records into one edit buffer, built
+        # before the next other transform or at the end
+        buffer = None
+        for name in names:
+            if name in LITERAL_TRANSFORMS:
+                if buffer is None:
+                    buffer = EditBuffer(content)
+                compile_packs([LITERAL_TRANSFORMS[name]], skipped.get(name, ())).record(buffer)
+                continue
+            if buffer is not None:
+                content = buffer.result()
+                buffer = None
+            content = apply_transform(name, content)
+        return content if buffer is None else buffer.result()
+    for name in names:
+        started = rule_profile.clock()
+        fixed = apply_transform(name, content, skipped.get(name, ()))
+        profiler.transform(name, content, fixed, rule_profile.clock() - started)
+        content = fixed
+    return content
+
+
+def compile_pipeline(names):
+    # Builds the matchers of every rule pack the transforms use, ahead of the first file
+    for name in names:
+        for step in TRANSFORM_STEPS[name]:
+            if step[0] == 'literal':
+                compile_packs([step[1]])
+            elif step[0] == 'regex':
+                bundle(step[1])
+
+
+def breaking_transform(filepath, content, names):
+    # The first transform of names that breaks the structure of content, or None
+    names, skipped = rule_scope.scoped(filepath, names)
+    for name in names:
+        fixed = apply_transform(name, content, skipped.get(name, ()))
+        if structure.regression(filepath, content, fixed) is not None:
+            return name
+        content = fixed
+    return None
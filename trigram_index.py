@@ -0,0 +1,265 @@
+import argparse
+import os
+import pickle
+import re
+import time
+
+from file_index import HERE, ROOT, SOURCE_EXTENSIONS, changed_entries, scan
+from git_changes import changed_files
+from prefilter import prefilter, required_literals
+from regex_overlap import parse
+from rule_scope import scoped
+
+# Persistent inverted trigram index over the app sources.
+#
+# Every three-byte run of a file's raw bytes (within a line, counting the line
+# breaks on either side) maps to the files it occurs in, kept as a bitmap (an
+# int with one bit per file id). A file contains a literal only if it contains
+# every trigram of the literal, so ANDing their bitmaps
+# gives a superset of the files to visit; the rule itself still decides. A
+# regex is looked up through the literal runs every match has to contain, the
+# same ones the prefilter triggers on.
+#
+# The index is brought up to date from the size and mtime of each file before
+# every query. A changed file gets a new id and its old bits are simply masked
+# out; when dead ids outnumber live ones the index is rebuilt from scratch. The
+# snapshot is a pickle, since parsing the bitmaps back out of JSON cost more
+# than the index saved on a run over the real trees.
+
+INDEX_FILE = os.path.join(HERE, '.trigram_index.pickle')
+APP_DIRECTORIES = ['customer/src', 'partner/src', 'admin panel/app']
+GRAM = 3
+
+
+def _padded_trigrams(lines, grams):
+    for padded in lines:
+        grams.update(padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1))
+    return grams
+
+
+def trigrams(data):
+    # Bytes are decoded as latin-1 so every byte is one character. Source
+    # files repeat many lines, so each distinct line is taken once, with the
+    # line breaks around it
+    return _padded_trigrams((f'\n{line}\n' for line in set(data.decode('latin-1').split('\n'))), set())
+
+
+def literal_trigrams(literal):
+    # A literal spanning lines is looked up by its lines, each with the line
+    # breaks it really has on either side
+    lines = literal.encode('utf-8').decode('latin-1').split('\n')
+    last = len(lines) - 1
+    return _padded_trigrams((('\n' if i else '') + line + ('\n' if i < last else '')
+                             for i, line in enumerate(lines)), set())
+
+
+def regex_literals(pattern):
+    # Literals one of which every match contains, or None when the regex has none
+    if re.compile(pattern).flags & re.IGNORECASE:
+        return None
+    return required_literals(parse(pattern))
+
+
+class TrigramIndex:
+    def __init__(self, path=INDEX_FILE, extensions=SOURCE_EXTENSIONS):
+        self.path = path
+        self.extensions = extensions
+        self.files = {}
+        self.postings = {}
+        self.next_id = 0
+        self.dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, ValueError):
+                data = {}
+            if data.get('version') == 1 and data.get('root') == ROOT:
+                self.files = data['files']
+                self.postings = data['postings']
+                self.next_id = data['next_id']
+
+    def _add(self, key, entry, added):
+        file_id = self.next_id
+        self.next_id += 1
+        with open(entry.path, 'rb') as f:
+            data = f.read()
+        for gram in trigrams(data):
+            if gram in added:
+                added[gram].append(file_id)
+            else:
+                added[gram] = [file_id]
+        self.files[key] = (file_id, entry.size, entry.mtime_ns)
+
+    def _merge(self, added):
+        # Each touched bitmap is rebuilt once, not grown one bit per file
+        size = self.next_id // 8 + 1
+        postings = self.postings
+        for gram, ids in added.items():
+            bitmap = bytearray(size)
+            for file_id in ids:
+                bitmap[file_id >> 3] |= 1 << (file_id & 7)
+            postings[gram] = postings.get(gram, 0) | int.from_bytes(bitmap, 'little')
+
+    def update(self, directories=APP_DIRECTORIES):
+        # Reindexes new and changed files below directories; returns how many
+        seen = set()
+        added = {}
+        changed = 0
+        for directory in directories:
+            for entry in scan(os.path.join(ROOT, directory))[0]:
+                if not entry.path.endswith(self.extensions):
+                    continue
+                key = os.path.relpath(entry.path, ROOT).replace(os.sep, '/')
+                seen.add(key)
+                known = self.files.get(key)
+                if known is not None and known[1:] == (entry.size, entry.mtime_ns):
+                    continue
+                self._add(key, entry, added)
+                changed += 1
+            prefix = directory.rstrip('/') + '/'
+            for key in [key for key in self.files if key.startswith(prefix) and key not in seen]:
+                del self.files[key]
+                changed += 1
+        if changed:
+            self._merge(added)
+            self.dirty = True
+            if self.next_id > 2 * len(self.files) + 64:
+                self.rebuild(directories)
+        return changed
+
+    def rebuild(self, directories=APP_DIRECTORIES):
+        self.files = {}
+        self.postings = {}
+        self.next_id = 0
+        self.dirty = True
+        self.update(directories)
+
+    def _mask(self, directories):
+        prefixes = tuple(directory.rstrip('/') + '/' for directory in directories)
+        mask = 0
+        for key, (file_id, size, mtime_ns) in self.files.items():
+            if key.startswith(prefixes):
+                mask |= 1 << file_id
+        return mask
+
+    def _paths(self, bits):
+        return {os.path.join(ROOT, key) for key, (file_id, size, mtime_ns) in self.files.items()
+                if bits >> file_id & 1}
+
+    def containing(self, literals, directories=APP_DIRECTORIES):
+        # Absolute paths of the files below directories that may contain one of
+        # literals; None for literals means every file
+        mask = self._mask(directories)
+        if literals is None:
+            return self._paths(mask)
+        found = 0
+        for literal in literals:
+            grams = literal_trigrams(literal)
+            if not grams:
+                # Too short to look up
+                return self._paths(mask)
+            bits = mask
+            for gram in grams:
+                bits &= self.postings.get(gram, 0)
+                if not bits:
+                    break
+            found |= bits
+        return self._paths(found)
+
+    def matching(self, pattern, directories=APP_DIRECTORIES):
+        return self.containing(regex_literals(pattern), directories)
+
+    def for_pipeline(self, pipeline, directories=APP_DIRECTORIES):
+        # Files some transform of pipeline may change, by the prefilter's triggers
+        return self.containing(prefilter(pipeline).triggers, directories)
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({
+                'version': 1,
+                'root': ROOT,
+                'next_id': self.next_id,
+                'files': self.files,
+                'postings': self.postings,
+            }, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+_index = None
+
+
+def open_index(directories=APP_DIRECTORIES):
+    # The shared index, brought up to date for directories and saved
+    global _index
+    if _index is None:
+        _index = TrigramIndex()
+    _index.update(directories)
+    _index.save()
+    return _index
+
+
+def pipeline_candidates(directories, pipeline, since=None):
+    if since:
+        # Only the changed files are wanted, and indexing the trees to narrow
+        # them down would cost more than the prefilter reading them
+        changed = changed_files(since, ROOT)
+        return {path for path in (os.path.abspath(entry.path) for directory in directories
+                                  for entry in changed_entries(os.path.join(ROOT, directory), changed))
+                if scoped(path, pipeline)[0]}
+    index = open_index(directories)
+    found = index.for_pipeline(pipeline, directories)
+    # A file stays a candidate if the transforms in scope for it can change
+    # it; files share a handful of subsets, each looked up once
+    subsets = {tuple(pipeline): found}
+    candidates = set()
+    for path in found:
+        names = tuple(scoped(path, pipeline)[0])
+        if names not in subsets:
+            subsets[names] = index.for_pipeline(names, directories) if names else set()
+        if path in subsets[names]:
+            candidates.add(path)
+    return candidates
+
+
+def relative(paths):
+    # Paths relative to the working directory, sorted, for scripts that chdir
+    return sorted(os.path.relpath(path) for path in paths)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the app sources that may contain a literal or regex')
+    parser.add_argument('queries', nargs='*', help='literals (or regexes with --regex) to look up')
+    parser.add_argument('--regex', action='store_true', help='treat the queries as regexes')
+    parser.add_argument('--pipeline', help='comma-separated transforms to look up the triggers of instead')
+    parser.add_argument('--directories', default=','.join(APP_DIRECTORIES), help='comma-separated trees, relative to the checkout')
+    parser.add_argument('--rebuild', action='store_true', help='reindex every file')
+    args = parser.parse_args()
+
+    directories = args.directories.split(',')
+    started = time.perf_counter()
+    index = TrigramIndex()
+    if args.rebuild:
+        index.rebuild(directories)
+    changed = index.update(directories)
+    index.save()
+    print(f'{len(index.files)} files, {len(index.postings)} trigrams, {changed} reindexed '
+          f'({(time.perf_counter() - started) * 1000:.1f} ms)')
+
+    lookups = [(name, lambda name=name: index.for_pipeline([name], directories))
+               for name in args.pipeline.split(',')] if args.pipeline else []
+    for query in args.queries:
+        if args.regex:
+            lookups.append((query, lambda query=query: index.matching(query, directories)))
+        else:
+            lookups.append((query, lambda query=query: index.containing([query], directories)))
+    for query, lookup in lookups:
+        started = time.perf_counter()
+        found = lookup()
+        print(f'\n{query!r}: {len(found)} candidates ({(time.perf_counter() - started) * 1000:.2f} ms)')
+        for path in relative(found):
+            print(f'  {path}')
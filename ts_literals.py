@@ -0,0 +1,446 @@
+import re
+import string
+
+# Single-pass scanner for the string literals of a TS/TSX file.
+#
+# The old quote repairs were regexes run over the whole file, so they could not
+# tell a string from a template literal, a comment or JSX text. This walks the
+# source once, tracking '...' and "..." strings, `...` templates with their
+# ${...} nesting, comments and regex literals, and reports literals that were
+# opened with one quote and closed with another:
+#
+#   getItem('partnerId`)      ->  getItem('partnerId')
+#   useState('all")           ->  useState('all')
+#   fetch(`${API_URL}/x", {   ->  fetch(`${API_URL}/x`, {
+#
+# A quoted string cannot span lines, so one left open at the end of its line
+# is closed at the first other quote inside it that is followed by a closer
+# (or the line end). A template may span lines, so it is only repaired when its
+# first line has such a quote after the last ${...} and the template does not
+# close on that line. Anything else is left exactly as it is.
+#
+# Every repair reads a quote and then a different kind of quote, with no line
+# break between them other than one escaped with a backslash. The rules have
+# no trigger text the prefilter could look for (any quote can start one), so
+# MIXED_QUOTES looks for such a line instead, in one regex search from each
+# line start, and a file without one is returned as it is before the scan.
+
+CLOSERS = ')],;}\r\n'
+MIXED_QUOTES = re.compile(r'''(?m)^(?:[^\n'"`]|\\\n)*'''
+                          r'''(?:'(?:[^\n"`]|\\\n)*["`]|"(?:[^\n'`]|\\\n)*['`]|`(?:[^\n'"]|\\\n)*['"])''')
+IDENT_CHARS = set(string.ascii_letters + string.digits + '_$')
+# A byte order mark is whitespace to JS, but not to str.isspace
+BOM = '\ufeff'
+BOM_BYTES = BOM.encode('utf-8')
+
+# A '/' after one of these (or at the start) begins a regex literal, not a division
+REGEX_PREFIX = set('(,=:[!&|?{};+-*%~^')
+
+# A '<' after one of these (or after return) begins a JSX element
+JSX_PREFIX = set('(,=:[!&|?{}>')
+TAG_NAME = re.compile(r'[\w$.:-]*')
+
+# What each masking mode stops at; everything in between is skipped or blanked
+CODE_STOP = re.compile(r'[\'"`/<{}]')
+TEMPLATE_STOP = re.compile(r'[`\\$]')
+TAG_STOP = re.compile(r'[{\'"/>]')
+CHILDREN_STOP = re.compile(r'[{<]')
+NOT_NEWLINE = re.compile(r'[^\n]')
+# The body of a quoted string, keyed by quote and whether it may span lines
+QUOTED = {
+    ('\'', False): re.compile(r"[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*"),
+    ('\'', True): re.compile(r"[^'\\]*(?:\\[\s\S][^'\\]*)*"),
+    ('"', False): re.compile(r'[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*'),
+    ('"', True): re.compile(r'[^"\\]*(?:\\[\s\S][^"\\]*)*'),
+}
+
+
+def _closes(content, i):
+    return i >= len(content) or content[i] in CLOSERS
+
+
+def _scan_string(content, i, fixes):
+    # i is at the opening quote; returns where code resumes
+    quote = content[i]
+    n = len(content)
+    candidate = None
+    j = i + 1
+    while j < n:
+        ch = content[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == quote:
+            return j + 1
+        if ch == '\n':
+            break
+        if ch in '\'"`' and candidate is None and _closes(content, j + 1):
+            candidate = j
+        j += 1
+
+    if candidate is None:
+        # Unterminated with nothing to close it on: JSX text or not ours to guess
+        return min(j, n)
+    fixes.append((candidate, quote))
+    return candidate + 1
+
+
+def _past_first_line(stack):
+    # A newline inside ${...} ends the first line of every template around it
+    for frame in stack:
+        frame[0] = False
+
+
+def _scan_template(content, i, frame, stack, fixes):
+    # i is just inside the template (after the backtick or a closing '}');
+    # frame is [on_first_line, candidate, brace_depth]. Returns where code resumes.
+    n = len(content)
+    while i < n:
+        ch = content[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '`':
+            return i + 1
+        if ch == '$' and content.startswith('{', i + 1):
+            frame[1] = None
+            frame[2] = 0
+            stack.append(frame)
+            return i + 2
+        if ch == '\n':
+            if frame[0] and frame[1] is not None:
+                fixes.append((frame[1], '`'))
+                return frame[1] + 1
+            frame[0] = False
+            _past_first_line(stack)
+        elif ch in '\'"' and frame[0] and frame[1] is None and _closes(content, i + 1):
+            frame[1] = i
+        i += 1
+
+    if frame[0] and frame[1] is not None:
+        fixes.append((frame[1], '`'))
+        return frame[1] + 1
+    return n
+
+
+def _regex_end(content, i):
+    # End of the regex literal starting at i, or None if it does not close on its line
+    n = len(content)
+    in_class = False
+    j = i + 1
+    while j < n:
+        ch = content[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == '\n':
+            return None
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            return j + 1
+        j += 1
+    return None
+
+
+def find_mismatches(content):
+    # Returns [(offset, quote)]: each offset holds a closing quote that should be quote
+    fixes = []
+    stack = []
+    n = len(content)
+    prev = ''
+    i = 0
+    while i < n:
+        ch = content[i]
+
+        if ch == '\'' or ch == '"':
+            # An apostrophe straight after a word is JSX text ("Don't"), never a string
+            if i > 0 and content[i - 1] in IDENT_CHARS:
+                i += 1
+                continue
+            start = i
+            i = _scan_string(content, i, fixes)
+            if stack and content.find('\n', start, i) != -1:
+                # A line continued inside the string
+                _past_first_line(stack)
+            prev = ch
+            continue
+
+        if ch == '`':
+            i = _scan_template(content, i + 1, [True, None, 0], stack, fixes)
+            prev = ch
+            continue
+
+        if ch == '/' and i + 1 < n:
+            nxt = content[i + 1]
+            if nxt == '/':
+                end = content.find('\n', i)
+                i = n if end == -1 else end
+                continue
+            if nxt == '*':
+                end = content.find('*/', i + 2)
+                end = n if end == -1 else end + 2
+                if stack and content.find('\n', i, end) != -1:
+                    _past_first_line(stack)
+                i = end
+                continue
+            if prev == '' or prev in REGEX_PREFIX:
+                end = _regex_end(content, i)
+                if end is not None:
+                    i = end
+                    prev = '/'
+                    continue
+
+        if stack:
+            if ch == '{':
+                stack[-1][2] += 1
+            elif ch == '}':
+                if stack[-1][2] == 0:
+                    i = _scan_template(content, i + 1, stack.pop(), stack, fixes)
+                    prev = '`'
+                    continue
+                stack[-1][2] -= 1
+            elif ch == '\n':
+                _past_first_line(stack)
+
+        if not ch.isspace():
+            prev = ch
+        i += 1
+    return fixes
+
+
+def _jsx_starts(content, i, prev):
+    # Whether the '<' at i opens a JSX element rather than comparing or a type argument
+    nxt = content[i + 1:i + 2]
+    if not (nxt == '>' or nxt.isalpha() or nxt == '_'):
+        return False
+    if prev == '' or prev in JSX_PREFIX:
+        return True
+    return content[max(0, i - 12):i].rstrip().endswith('return')
+
+
+def mask_literals(content, jsx=True, problems=None):
+    # The content with the text of every string, template, comment, regex
+    # literal and (with jsx) JSX text blanked to spaces. Quotes, tags, braces
+    # and line breaks stay, so offsets and line numbers still match and code
+    # can be searched without hitting anything quoted or written for the page.
+    # Literals and elements left open are appended to problems as (offset, message)
+    out = list(content)
+    n = len(content)
+
+    def problem(offset, message):
+        if problems is not None:
+            problems.append((offset, message))
+
+    def blank(start, end):
+        if start < end:
+            out[start:end] = NOT_NEWLINE.sub(' ', content[start:end])
+
+    def quoted(i, multiline):
+        # i is at the opening quote; returns just past the closing one
+        quote = content[i]
+        j = QUOTED[quote, multiline].match(content, i + 1).end()
+        blank(i + 1, j)
+        if j < n and content[j] == quote:
+            return j + 1
+        problem(i, 'unterminated string')
+        return j
+
+    def stop(pattern, i):
+        # Each mode only has to look at a few characters; the rest is skipped by regex
+        found = pattern.search(content, i)
+        return found.start() if found else n
+
+    # Each frame is [mode, depth, start, tag name]: code (depth counts open
+    # braces), template, tag (depth 1 for a closing tag) or children
+    stack = [['code', 0, 0, None]]
+    prev = ''
+    i = 0
+    while i < n:
+        frame = stack[-1]
+        mode = frame[0]
+
+        if mode == 'template':
+            j = stop(TEMPLATE_STOP, i)
+            blank(i, j)
+            i = j
+            if i == n:
+                break
+            ch = content[i]
+            if ch == '\\':
+                blank(i, i + 2)
+                i += 2
+            elif ch == '`':
+                stack.pop()
+                prev = ch
+                i += 1
+            elif content.startswith('{', i + 1):
+                stack.append(['code', 0, i, None])
+                prev = '{'
+                i += 2
+            else:
+                blank(i, i + 1)
+                i += 1
+            continue
+
+        if mode == 'tag':
+            i = stop(TAG_STOP, i)
+            if i == n:
+                break
+            ch = content[i]
+            if ch == '{':
+                stack.append(['code', 0, i, None])
+                prev = ch
+            elif ch == '\'' or ch == '"':
+                i = quoted(i, True)
+                continue
+            elif ch == '/' and content.startswith('>', i + 1):
+                stack.pop()
+                i += 2
+                prev = ')'
+                continue
+            elif ch == '>':
+                stack.pop()
+                if frame[1]:
+                    # A closing tag ends the element whose children we were in
+                    if stack[-1][0] == 'children':
+                        opened = stack.pop()
+                        if opened[3] != frame[3]:
+                            problem(frame[2], f'</{frame[3]}> closes <{opened[3]}> from line {content.count(chr(10), 0, opened[2]) + 1}')
+                else:
+                    stack.append(['children', 0, frame[2], frame[3]])
+                prev = ')'
+            i += 1
+            continue
+
+        if mode == 'children':
+            j = stop(CHILDREN_STOP, i)
+            blank(i, j)
+            i = j
+            if i == n:
+                break
+            if content[i] == '{':
+                stack.append(['code', 0, i, None])
+                prev = '{'
+                i += 1
+            else:
+                closing = content.startswith('/', i + 1)
+                name = TAG_NAME.match(content, i + 1 + closing).group()
+                stack.append(['tag', int(closing), i, name])
+                i += 2 if closing else 1
+            continue
+
+        j = stop(CODE_STOP, i)
+        if j > i:
+            skipped = content[i:j].rstrip()
+            if skipped:
+                prev = skipped[-1]
+            i = j
+            if i == n:
+                break
+        ch = content[i]
+
+        if ch == '\'' or ch == '"':
+            if i > 0 and content[i - 1] in IDENT_CHARS:
+                i += 1
+                continue
+            i = quoted(i, False)
+            prev = ch
+            continue
+
+        if ch == '`':
+            stack.append(['template', 0, i, None])
+            i += 1
+            continue
+
+        if ch == '/' and i + 1 < n:
+            nxt = content[i + 1]
+            if nxt == '/':
+                end = content.find('\n', i)
+                end = n if end == -1 else end
+                blank(i, end)
+                i = end
+                continue
+            if nxt == '*':
+                end = content.find('*/', i + 2)
+                if end == -1:
+                    problem(i, 'unterminated comment')
+                end = n if end == -1 else end + 2
+                blank(i, end)
+                i = end
+                continue
+            if prev == '' or prev in REGEX_PREFIX:
+                end = _regex_end(content, i)
+                if end is not None:
+                    blank(i + 1, end - 1)
+                    i = end
+                    prev = '/'
+                    continue
+
+        if jsx and ch == '<' and _jsx_starts(content, i, prev):
+            stack.append(['tag', 0, i, TAG_NAME.match(content, i + 1).group()])
+            i += 1
+            continue
+
+        if ch == '{':
+            frame[1] += 1
+        elif ch == '}' and len(stack) > 1:
+            if frame[1] == 0:
+                # The end of a ${...} or a JSX {...}: back to what held it
+                stack.pop()
+                prev = ')' if stack[-1][0] != 'template' else '`'
+                i += 1
+                continue
+            frame[1] -= 1
+
+        prev = ch
+        i += 1
+
+    # Braces left open are the bracket check's to report
+    for mode, depth, start, name in reversed(stack):
+        if mode == 'template':
+            problem(start, 'unterminated template literal')
+        elif mode == 'tag':
+            problem(start, f'unclosed tag <{"/" if depth else ""}{name}')
+        elif mode == 'children':
+            problem(start, f'<{name}> is never closed')
+    return ''.join(out)
+
+
+def repair_literals(content):
+    if content[:1] == BOM or content[:3] == BOM_BYTES:
+        # Scanned from past the mark, so the first token starts the file as it would without one
+        skip = len(BOM) if isinstance(content, str) else len(BOM_BYTES)
+        return content[:skip] + repair_literals(content[skip:])
+    if isinstance(content, bytes):
+        # The scanner only acts on ASCII, which never occurs inside a UTF-8
+        # sequence, so it runs on the bytes seen through latin-1 (one character
+        # per byte, no decoding) and finds the same offsets
+        return repair_literals(content.decode('latin-1')).encode('latin-1')
+    if not MIXED_QUOTES.search(content):
+        return content
+    fixes = find_mismatches(content)
+    if not fixes:
+        return content
+
+    parts = []
+    last = 0
+    for offset, quote in fixes:
+        parts.append(content[last:offset])
+        parts.append(quote)
+        last = offset + 1
+    parts.append(content[last:])
+    return ''.join(parts)
+
+
+if __name__ == '__main__':
+    import sys
+
+    for filepath in sys.argv[1:]:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+        for offset, quote in find_mismatches(content):
+            line = content.count('\n', 0, offset) + 1
+            print(f'{filepath}:{line}: {content[offset]} should be {quote}')
@@ -0,0 +1,236 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+import rollback
+import transforms
+from file_index import IGNORED_DIRS, ROOT, scan
+from fix_parallel import EXTENSIONS, SKIP_FILES, TARGETS
+from multi_replace import compile_packs
+from prefilter import may_change, prefilter
+from regex_rules import RuleTimeout
+from rule_scope import scoped
+from safe_write import BatchWriter
+
+# Long-running watch mode: rewrites localhost:3000 API calls in a file as soon
+# as it is saved, instead of rerunning replace_localhost.py / fix_all_apis.py
+# over the whole tree. The rules are compiled once at start-up, and a burst of
+# saves to a file (editors often write it two or three times) is handled once,
+# after DEBOUNCE_SECONDS of quiet.
+#
+# On Linux the trees are watched with inotify; elsewhere, or when inotify is not
+# available, they are polled with the same scandir walk file_index uses.
+#
+# Each batch of saves fixed together is a run of its own for rollback.py.
+
+DEBOUNCE_SECONDS = 0.05
+POLL_SECONDS = 0.5
+DEFAULT_PIPELINE = ['replace_api_url']
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def wanted(filepath):
+    path = filepath.replace(os.sep, '/')
+    return path.endswith(EXTENSIONS) and not path.endswith('.d.ts') and not path.endswith(SKIP_FILES)
+
+
+class InotifyWatcher:
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError('libc not found')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = {}
+        for directory in directories:
+            self.add_tree(directory)
+
+    def add_tree(self, directory):
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                continue
+            self.paths[wd] = current
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and entry.name not in IGNORED_DIRS:
+                            stack.append(entry.path)
+            except OSError:
+                pass
+
+    def wait(self, timeout):
+        # Returns the files written since the last call, waiting up to timeout seconds
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            directory = self.paths.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self.paths.pop(wd, None)
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and os.path.basename(path) not in IGNORED_DIRS:
+                    # Files can land in a new directory before its watch exists
+                    self.add_tree(path)
+                    changed.extend(entry.path for entry in scan(path)[0])
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, directories, interval=POLL_SECONDS):
+        self.directories = directories
+        self.interval = interval
+        self.stats = self.snapshot()
+
+    def snapshot(self):
+        stats = {}
+        for directory in self.directories:
+            for entry in scan(directory)[0]:
+                stats[entry.path] = (entry.size, entry.mtime_ns)
+        return stats
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval) if timeout is not None else self.interval)
+        stats = self.snapshot()
+        changed = [path for path, stat in stats.items() if self.stats.get(path) != stat]
+        self.stats = stats
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories, polling=False):
+    if not polling and hasattr(select, 'select') and os.name == 'posix':
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories)
+
+
+def fix_file(filepath, pipeline, writer):
+    try:
+        if not may_change(filepath, pipeline):
+            return writer.skip()
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        fixed = transforms.apply_pipeline(content, pipeline, filepath)
+    except (FileNotFoundError, UnicodeDecodeError):
+        return False
+    except RuleTimeout as e:
+        print(f'Skipped: {filepath} ({e})')
+        return False
+    return writer.write_bytes(filepath, fixed, content)
+
+
+def warm(directories, pipeline):
+    # Builds the matchers and prefilters of the pipeline, and of each subset of
+    # it the files in the trees are scoped to, so no save pays for a compile
+    transforms.compile_pipeline(pipeline)
+    prefilter(pipeline)
+    seen = set()
+    for directory in directories:
+        for entry in scan(directory)[0]:
+            if not wanted(entry.path):
+                continue
+            names, skipped = scoped(entry.path, pipeline)
+            key = (tuple(names), tuple(skipped.items()))
+            if key in seen:
+                continue
+            seen.add(key)
+            prefilter(names)
+            for name, rules in skipped.items():
+                compile_packs([transforms.LITERAL_TRANSFORMS[name]], rules)
+
+
+def watch(directories, pipeline, debounce=DEBOUNCE_SECONDS, polling=False, dry_run=False):
+    warm(directories, pipeline)
+    watcher = open_watcher(directories, polling)
+    print(f'Watching {", ".join(directories)} ({type(watcher).__name__}), Ctrl+C to stop')
+    pending = {}
+    try:
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, min(pending.values()) + debounce - time.monotonic())
+            for path in watcher.wait(timeout):
+                if wanted(path):
+                    pending[path] = time.monotonic()
+
+            now = time.monotonic()
+            due = [path for path, seen in pending.items() if now - seen >= debounce]
+            if not due:
+                continue
+            # Each batch is a run of its own, rolled back on its own
+            rollback.begin()
+            writer = BatchWriter(dry_run)
+            for path in due:
+                del pending[path]
+                started = time.perf_counter()
+                # Our own rewrite comes back as an event too; by then the file is
+                # already fixed and nothing is written
+                if fix_file(path, pipeline, writer):
+                    print(f'Fixed: {path} ({(time.perf_counter() - started) * 1000:.1f} ms)')
+            writer.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rewrite localhost:3000 API calls as files are saved')
+    parser.add_argument('--apps', default='customer,partner,admin', help='comma-separated apps to watch')
+    parser.add_argument('--pipeline', default=','.join(DEFAULT_PIPELINE), help='comma-separated transforms to run on each save')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS, help='seconds of quiet before a file is fixed')
+    parser.add_argument('--poll', action='store_true', help='poll for changes instead of using inotify')
+    parser.add_argument('--dry-run', action='store_true', help='print the diff of each save instead of rewriting it')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    directories = [TARGETS[app][0] for app in args.apps.split(',') if os.path.isdir(TARGETS[app][0])]
+    pipeline = args.pipeline.split(',')
+    unknown = [name for name in pipeline if name not in transforms.TRANSFORMS]
+    if unknown:
+        parser.error(f'unknown transforms: {", ".join(unknown)}')
+    watch(directories, pipeline, args.debounce, args.poll, args.dry_run)